@@ -0,0 +1,398 @@
+#! /usr/bin/env python
+
+"""Benchmarks the end-to-end ingestion of a synthetic archive.
+
+For each scale point (a number of rootnames), a synthetic archive is
+created (see ``acsql.benchmarks.make_synthetic_archive``) and ingested
+with ``acsql.scripts.ingest_production`` into a fresh local database,
+and the following are reported:
+
+    - ``rootnames_per_s`` - The number of rootnames ingested per second
+    - ``rows_per_s`` - The number of database rows written per second
+    - ``archive_mb`` - The size of the FITS files of the archive
+    - ``read_mb`` - The bytes read by the ingestion, as counted by the
+      kernel (``rchar`` of ``/proc/self/io``, which includes the
+      ingestion processes but not memory-mapped image data)
+    - ``peak_rss_mb`` - The peak resident memory of the main process
+      and of the largest ingestion process
+
+Each scale point is run in a separate process, so that the peak memory
+of one does not carry over to the next, and so that the ``acsql``
+config file settings (the ``connection_string``, ``filesystem``,
+``log_dir``, etc.) can be pointed at the benchmark's own directory
+before any ``acsql`` database module is imported.  By default, the database is a
+SQLite file in that directory, so no database server is needed.  The
+log file of each run and the per-stage timings (see
+``acsql.utils.timing``) are kept in its directory as well.
+
+Authors
+-------
+    Matthew Bourque
+
+Use
+---
+    This script is inteneded to be executed from the command line as
+    such:
+    ::
+
+        python benchmark_ingest.py [-s|--scales] [-d|--directory]
+            [-c|--connection_string] [-p|--pipeline] [-n|--ncores]
+            [--image_size] [-o|--output]
+
+    Parameters:
+    (Optional) [-s|--scales] - A comma-separated list of the numbers
+        of rootnames to benchmark.  ``10,100,1000`` is the default
+        value.
+    (Optional) [-d|--directory] - The directory to create the archives,
+        databases, and log files in.  A temporary directory is used if
+        not supplied.
+    (Optional) [-c|--connection_string] - The connection string of the
+        database to ingest into.  Its tables are dropped and created
+        again before each scale point.  If not supplied, a new SQLite
+        database is used for each scale point.
+    (Optional) [-p|--pipeline] - Ingest using the staged pipeline (see
+        ``acsql.ingest.pipeline``).
+    (Optional) [-n|--ncores] - The number of ingestion processes.  The
+        ``ncores`` config file setting is the default value.
+    (Optional) [--image_size] - The width in pixels of a ``WFC``
+        science extension.  256 is the default value.
+    (Optional) [-o|--output] - A JSON file to write the results to.
+
+Dependencies
+------------
+    External library dependencies include:
+
+    - ``acsql``
+    - ``astropy``
+    - ``numpy``
+    - ``sqlalchemy``
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import resource
+import tempfile
+import time
+
+from acsql.benchmarks.make_synthetic_archive import make_synthetic_archive
+from acsql.utils.utils import SETTINGS
+
+
+def _read_bytes():
+    """Return the number of bytes read by this process and its
+    finished child processes, or ``None`` if this is not known (e.g.
+    not on Linux).
+
+    Returns
+    -------
+    read_bytes : int or None
+        The ``rchar`` count of ``/proc/self/io``.
+    """
+
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def count_rows():
+    """Return the total number of rows in the tables of the ``acsql``
+    database.
+
+    Returns
+    -------
+    num_rows : int
+        The number of rows.
+    """
+
+    from sqlalchemy import func, select
+    from acsql.database.database_interface import base, get_engine
+
+    num_rows = 0
+    with get_engine().connect() as connection:
+        for table in base.metadata.sorted_tables:
+            num_rows += connection.execute(
+                select([func.count()]).select_from(table)).scalar()
+
+    return num_rows
+
+
+def run_scale_point(directory, num_rootnames, connection_string=None,
+                    pipeline=False, ncores=None, image_size=256):
+    """Create a synthetic archive of the given number of rootnames in
+    the given ``directory``, ingest it, and return the results.
+
+    This function configures the ``acsql`` settings for the run, and
+    so must be called in a process that has not imported the
+    ``acsql`` database modules yet.
+
+    Parameters
+    ----------
+    directory : str
+        The directory to create the archive, database, and log file in.
+    num_rootnames : int
+        The number of rootnames to ingest.
+    connection_string : str, optional
+        The connection string of the database to ingest into.  If not
+        provided, a SQLite database in ``directory`` is used.
+    pipeline : bool, optional
+        If ``True``, ingest using the staged pipeline.
+    ncores : int, optional
+        The number of ingestion processes.
+    image_size : int, optional
+        The width in pixels of a ``WFC`` science extension.
+
+    Returns
+    -------
+    results : dict
+        The results of the scale point.
+    """
+
+    filesystem = os.path.join(directory, 'filesystem')
+    os.makedirs(filesystem, exist_ok=True)
+    rootname_paths = make_synthetic_archive(filesystem, num_rootnames,
+                                            image_size=image_size)
+    file_paths = [entry.path for rootname_path in rootname_paths
+                  for entry in os.scandir(rootname_path)]
+    archive_bytes = sum([os.path.getsize(item) for item in file_paths])
+
+    SETTINGS.update({
+        'connection_string': connection_string or 'sqlite:///{}'.format(
+            os.path.join(directory, 'acsql.db')),
+        'filesystem': filesystem,
+        'log_dir': directory,
+        'jpeg_dir': os.path.join(directory, 'jpegs'),
+        'thumbnail_dir': os.path.join(directory, 'thumbnails'),
+        'proposal_resolver': 'file',
+        'proposal_type_file': os.path.join(filesystem, 'proposal_types.txt'),
+        'proposal_cache': os.path.join(directory, 'proposal_types.db'),
+        'scan_manifest': os.path.join(directory, 'scan_manifest.json')})
+    if ncores:
+        SETTINGS['ncores'] = ncores
+
+    logging.basicConfig(
+        filename=os.path.join(directory, 'benchmark_ingest.log'),
+        format='%(asctime)s %(levelname)s: %(message)s',
+        datefmt='%m/%d/%Y %H:%M:%S',
+        level=logging.INFO)
+
+    # Only import the database modules now that they will connect to
+    # the benchmark's database
+    from acsql.database.database_interface import base, build_all_orms
+    from acsql.database.database_interface import get_engine
+    from acsql.scripts.ingest_production import ingest_production
+
+    build_all_orms()
+    base.metadata.drop_all(get_engine())
+    base.metadata.create_all(get_engine())
+
+    read_bytes = _read_bytes()
+    start = time.time()
+    ingest_production('all', None, pipeline=pipeline,
+                      timing_file=os.path.join(directory, 'timings.json'))
+    seconds = time.time() - start
+    if read_bytes is not None:
+        read_bytes = _read_bytes() - read_bytes
+
+    num_rows = count_rows()
+
+    # ru_maxrss is in kilobytes on Linux
+    results = {
+        'rootnames': num_rootnames,
+        'files': len(file_paths),
+        'seconds': seconds,
+        'rootnames_per_s': num_rootnames / seconds,
+        'rows': num_rows,
+        'rows_per_s': num_rows / seconds,
+        'archive_mb': archive_bytes / 1024.**2,
+        'read_mb': read_bytes / 1024.**2 if read_bytes is not None else None,
+        'peak_rss_mb': resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss / 1024.,
+        'peak_worker_rss_mb': resource.getrusage(
+            resource.RUSAGE_CHILDREN).ru_maxrss / 1024.}
+
+    return results
+
+
+def _run_scale_point(queue, *args):
+    """Run ``run_scale_point()`` with the given arguments and put its
+    results on the given ``queue``.
+
+    Parameters
+    ----------
+    queue : obj
+        The ``multiprocessing`` ``Queue`` to put the results on.
+    *args
+        The arguments of ``run_scale_point()``.
+    """
+
+    queue.put(run_scale_point(*args))
+
+
+def benchmark_ingest(scales, directory=None, connection_string=None,
+                     pipeline=False, ncores=None, image_size=256,
+                     output=None):
+    """Benchmark the ingestion of synthetic archives of the given
+    ``scales``, and print and return the results.
+
+    Parameters
+    ----------
+    scales : list
+        The numbers of rootnames to benchmark.
+    directory : str, optional
+        The directory to run the benchmark in.  A temporary directory
+        is used if not provided.
+    connection_string : str, optional
+        The connection string of the database to ingest into.  If not
+        provided, a new SQLite database is used for each scale point.
+    pipeline : bool, optional
+        If ``True``, ingest using the staged pipeline.
+    ncores : int, optional
+        The number of ingestion processes.
+    image_size : int, optional
+        The width in pixels of a ``WFC`` science extension.
+    output : str, optional
+        The path to a JSON file to write the results to.
+
+    Returns
+    -------
+    all_results : list
+        The results of each scale point.
+    """
+
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix='acsql_benchmark_')
+
+    # Each scale point runs in its own process, forked before the
+    # database modules are imported.  (A spawned process would make
+    # the ingestion processes spawned as well, and they would not see
+    # the benchmark's settings.)
+    context = multiprocessing.get_context('fork')
+
+    all_results = []
+    for num_rootnames in scales:
+        scale_directory = os.path.join(directory, str(num_rootnames))
+        results_queue = context.Queue()
+        process = context.Process(
+            target=_run_scale_point,
+            args=(results_queue, scale_directory, num_rootnames,
+                  connection_string, pipeline, ncores, image_size))
+        process.start()
+
+        # Stop waiting if the scale point fails before giving results
+        results = None
+        while results is None and process.is_alive():
+            try:
+                results = results_queue.get(timeout=1)
+            except queue.Empty:
+                pass
+        process.join()
+        if results is None:
+            results = results_queue.get(timeout=1)
+        all_results.append(results)
+
+    print('{:>9}{:>7}{:>9}{:>12}{:>8}{:>10}{:>11}{:>9}{:>11}{:>12}'.format(
+        'rootnames', 'files', 'time (s)', 'rootnames/s', 'rows', 'rows/s',
+        'archive MB', 'read MB', 'peak RSS', 'worker RSS'))
+    for results in all_results:
+        print('{rootnames:>9}{files:>7}{seconds:>9.1f}{rootnames_per_s:>12.1f}'
+              '{rows:>8}{rows_per_s:>10.0f}{archive_mb:>11.1f}{read_mb:>9.1f}'
+              '{peak_rss_mb:>11.0f}{peak_worker_rss_mb:>12.0f}'.format(
+                  **dict(results, read_mb=results['read_mb'] or 0.)))
+    print('Results, log files, and timings are in {}'.format(directory))
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(all_results, f, indent=4)
+
+    return all_results
+
+
+def parse_args():
+    """Parse command line arguments. Returns ``args`` object
+
+    Returns
+    -------
+    args : obj
+        An argparse object containing all of the arguments
+    """
+
+    # Create help strings
+    scales_help = 'A comma-separated list of the numbers of rootnames to '
+    scales_help += 'benchmark.'
+    directory_help = 'The directory to create the archives, databases, and '
+    directory_help += 'log files in.'
+    connection_string_help = 'The connection string of the database to '
+    connection_string_help += 'ingest into. Its tables are dropped and '
+    connection_string_help += 'created again. If not provided, a new SQLite '
+    connection_string_help += 'database is used for each scale point.'
+    pipeline_help = 'Ingest using the staged pipeline.'
+    ncores_help = 'The number of ingestion processes.'
+    image_size_help = 'The width in pixels of a WFC science extension.'
+    output_help = 'A JSON file to write the results to.'
+
+    # Add arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--scales',
+                        dest='scales',
+                        action='store',
+                        required=False,
+                        default='10,100,1000',
+                        help=scales_help)
+    parser.add_argument('-d', '--directory',
+                        dest='directory',
+                        action='store',
+                        required=False,
+                        default=None,
+                        help=directory_help)
+    parser.add_argument('-c', '--connection_string',
+                        dest='connection_string',
+                        action='store',
+                        required=False,
+                        default=None,
+                        help=connection_string_help)
+    parser.add_argument('-p', '--pipeline',
+                        dest='pipeline',
+                        action='store_true',
+                        required=False,
+                        help=pipeline_help)
+    parser.add_argument('-n', '--ncores',
+                        dest='ncores',
+                        action='store',
+                        type=int,
+                        required=False,
+                        default=None,
+                        help=ncores_help)
+    parser.add_argument('--image_size',
+                        dest='image_size',
+                        action='store',
+                        type=int,
+                        required=False,
+                        default=256,
+                        help=image_size_help)
+    parser.add_argument('-o', '--output',
+                        dest='output',
+                        action='store',
+                        required=False,
+                        default=None,
+                        help=output_help)
+
+    # Parse args
+    args = parser.parse_args()
+    args.scales = [int(item) for item in args.scales.split(',')]
+
+    return args
+
+
+if __name__ == '__main__':
+
+    args = parse_args()
+    benchmark_ingest(args.scales, args.directory, args.connection_string,
+                     args.pipeline, args.ncores, args.image_size, args.output)
@@ -0,0 +1,354 @@
+#! /usr/bin/env python
+
+"""Creates a synthetic, MAST-like archive of HST/ACS data to benchmark
+the ingestion against.
+
+The archive is laid out like the MAST cache (see the ``filesystem``
+config file setting), as ``<directory>/jXXX/jXXXXXXXq/`` rootname
+directories holding ``raw``, ``flt``, ``flc``, ``drz``, ``spt``,
+``jit``, and ``asn`` files of the ``WFC``, ``HRC``, and ``SBC``
+detectors.  The files have the extensions given by the ``FILE_EXTS``
+of ``acsql.utils.utils``, and the headers of each extension hold every
+keyword of the corresponding ``table_definitions/*.txt`` file, with
+random values of the keyword's type.  The science extensions of
+``raw``, ``flt``, ``flc``, and ``drz`` files hold random images, so
+that JPEGs and Thumbnails can be made of them.
+
+The archive is reproducible: the same ``seed`` always gives the same
+rootnames, detectors, and header values.  A ``proposal_types.txt``
+file is also written to the directory, for use with the ``file``
+``proposal_resolver``, so that no network access is needed.
+
+Authors
+-------
+    Matthew Bourque
+
+Use
+---
+    This script is inteneded to be executed from the command line as
+    such:
+    ::
+
+        python make_synthetic_archive.py <directory> <num_rootnames>
+            [-s|--seed] [--image_size]
+
+    Or imported and used by ``acsql.benchmarks.benchmark_ingest.py``
+    as such:
+    ::
+
+        from acsql.benchmarks.make_synthetic_archive import make_synthetic_archive
+        make_synthetic_archive(directory, num_rootnames)
+
+    Parameters:
+    (Required) <directory> - The directory to create the archive in.
+    (Required) <num_rootnames> - The number of rootnames to create.
+    (Optional) [-s|--seed] - The seed of the random number generator.
+        0 is the default value.
+    (Optional) [--image_size] - The width in pixels of a ``WFC``
+        science extension.  256 is the default value.
+
+Dependencies
+------------
+    External library dependencies include:
+
+    - ``acsql``
+    - ``astropy``
+    - ``numpy``
+"""
+
+import argparse
+import os
+import re
+import string
+
+from astropy.io import fits
+import numpy as np
+
+from acsql.utils import utils
+from acsql.utils.utils import read_table_definitions
+
+# The share of rootnames of each detector, and the filetypes created
+# for each rootname
+DETECTOR_WEIGHTS = {'wfc': 0.8, 'hrc': 0.1, 'sbc': 0.1}
+FILETYPES = ['raw', 'flt', 'flc', 'drz', 'spt', 'jit', 'asn']
+IMAGE_FILETYPES = ['raw', 'flt', 'flc', 'drz']
+
+# The number of rootnames in each proposal directory
+ROOTNAMES_PER_PROPOSAL = 20
+
+# The names of the extensions after the primary extension
+EXTNAMES = {'raw': ['SCI', 'ERR', 'DQ', 'SCI', 'ERR', 'DQ'],
+            'flt': ['SCI', 'ERR', 'DQ', 'SCI', 'ERR', 'DQ'],
+            'flc': ['SCI', 'ERR', 'DQ', 'SCI', 'ERR', 'DQ'],
+            'drz': ['SCI', 'WHT', 'CTX'],
+            'spt': ['UDL'],
+            'jit': ['JIT', 'JIT', 'JIT', 'JIT', 'JIT', 'JIT'],
+            'asn': ['ASN']}
+
+# Keywords that astropy writes itself, or that are not valid in a
+# header as they are spelled in the table definitions
+STRUCTURAL_KEYWORDS = re.compile(
+    r'^(SIMPLE|BITPIX|NAXIS\d*|EXTEND|XTENSION|PCOUNT|GCOUNT|BSCALE|BZERO|'
+    r'EXTNAME|EXTVER|TFIELDS|THEAP|(TTYPE|TFORM|TUNIT|TDIM|TNULL|TSCAL|'
+    r'TZERO|TDISP)\d+|END)$')
+
+STRING_VALUES = ['PERFORM', 'OMIT', 'COMPLETE', 'N/A', 'NONE', 'UNKNOWN',
+                 'F606W', 'CLEAR1L', 'WFCENTER', 'ACCUM']
+
+
+def _random_value(rng, column_type):
+    """Return a random header value of the given ``column_type``.
+
+    Parameters
+    ----------
+    rng : obj
+        The ``numpy`` ``RandomState`` to draw from.
+    column_type : str
+        The type of the column (e.g. ``Float``).
+
+    Returns
+    -------
+    value : bool or int or float or str
+        The header value.
+    """
+
+    if column_type == 'Bool':
+        value = bool(rng.randint(2))
+    elif column_type == 'Integer':
+        value = int(rng.randint(0, 10000))
+    elif column_type == 'Float':
+        value = round(float(rng.uniform(-1000, 1000)), 6)
+    else:
+        value = STRING_VALUES[rng.randint(len(STRING_VALUES))]
+
+    return value
+
+
+def make_header_templates(seed=0):
+    """Return a header for each detector/filetype/extension
+    configuration, holding random values for every keyword of its
+    table definition.
+
+    Parameters
+    ----------
+    seed : int, optional
+        The seed of the random number generator.
+
+    Returns
+    -------
+    templates : dict
+        A dictionary whose keys are configurations (e.g.
+        ``wfc_flt_0``) and whose values are ``astropy.io.fits``
+        ``Header`` objects.
+    """
+
+    rng = np.random.RandomState(seed)
+
+    templates = {}
+    table_definitions = read_table_definitions()
+    for configuration in sorted(table_definitions):
+        header = fits.Header()
+        for keyword, column_type in table_definitions[configuration]:
+            if STRUCTURAL_KEYWORDS.match(keyword) or len(keyword) > 8 or \
+                    '.' in keyword:
+                continue
+            header[keyword] = _random_value(rng, column_type)
+        templates[configuration] = header
+
+    return templates
+
+
+def make_rootnames(num_rootnames, seed=0):
+    """Return the given number of unique rootnames, grouped into
+    proposal directories, and the detector and proposal ID of each.
+
+    Parameters
+    ----------
+    num_rootnames : int
+        The number of rootnames to create.
+    seed : int, optional
+        The seed of the random number generator.
+
+    Returns
+    -------
+    rootnames : list
+        A list of ``(rootname, detector, proposid)`` tuples, where
+        ``rootname`` is the 9-character name of the rootname directory
+        (e.g. ``jabc01a2q``).
+    """
+
+    rng = np.random.RandomState(seed)
+    detectors = sorted(DETECTOR_WEIGHTS)
+    weights = [DETECTOR_WEIGHTS[detector] for detector in detectors]
+    characters = string.ascii_lowercase + string.digits
+
+    rootnames = []
+    for index in range(num_rootnames):
+        proposal, exposure = divmod(index, ROOTNAMES_PER_PROPOSAL)
+        proposal_code = ''.join([characters[(proposal // 36**power) % 36]
+                                 for power in (2, 1, 0)])
+        rootname = 'j{}{:02d}{}{}q'.format(proposal_code, exposure // 10,
+                                           characters[exposure % 10],
+                                           characters[rng.randint(36)])
+        detector = detectors[rng.choice(len(detectors), p=weights)]
+        rootnames.append((rootname, detector, 10000 + proposal))
+
+    return rootnames
+
+
+def make_file(filename, detector, filetype, proposid, templates, images):
+    """Write a single synthetic FITS file.
+
+    Parameters
+    ----------
+    filename : str
+        The path to the file to write.
+    detector : str
+        The detector (e.g. ``wfc``).
+    filetype : str
+        The filetype (e.g. ``flt``).
+    proposid : int
+        The proposal ID.
+    templates : dict
+        The header templates, as returned by
+        ``make_header_templates()``.
+    images : dict
+        The science image of each detector.
+    """
+
+    basename = os.path.basename(filename)
+    rootname = basename.split('_')[0]
+    file_exts = getattr(utils, '{}_FILE_EXTS'.format(detector.upper()))
+
+    hdus = []
+    for ext in file_exts[filetype]:
+        header = templates['{}_{}_{}'.format(detector, filetype, ext)].copy()
+        header['ROOTNAME'] = rootname
+        if ext == 0:
+            header['FILENAME'] = basename
+            header['PROPOSID'] = proposid
+            if 'DETECTOR' in header:
+                header['DETECTOR'] = detector.upper()
+            if 'CONFIG' in header:
+                header['CONFIG'] = 'ACS/{}'.format(detector.upper())
+            hdus.append(fits.PrimaryHDU(header=header))
+            continue
+
+        extname = EXTNAMES[filetype][(ext - 1) % len(EXTNAMES[filetype])]
+        header['EXTNAME'] = extname
+        header['EXTVER'] = (ext - 1) // 3 + 1
+        data = None
+        if extname == 'SCI' and filetype in IMAGE_FILETYPES:
+            data = images[detector]
+        hdus.append(fits.ImageHDU(data=data, header=header))
+
+    fits.HDUList(hdus).writeto(filename, overwrite=True)
+
+
+def make_synthetic_archive(directory, num_rootnames, seed=0, image_size=256):
+    """Create a synthetic archive of the given number of rootnames in
+    the given ``directory``.
+
+    Parameters
+    ----------
+    directory : str
+        The directory to create the archive in.
+    num_rootnames : int
+        The number of rootnames to create.
+    seed : int, optional
+        The seed of the random number generator.
+    image_size : int, optional
+        The width in pixels of a ``WFC`` science extension.  ``HRC``
+        and ``SBC`` science extensions are a quarter as wide, as they
+        are in real data.
+
+    Returns
+    -------
+    rootname_paths : list
+        The paths to the rootname directories that were created.
+    """
+
+    templates = make_header_templates(seed)
+
+    rng = np.random.RandomState(seed)
+    images = {'wfc': rng.normal(100, 10, (image_size // 2, image_size)),
+              'hrc': rng.normal(100, 10, (image_size // 4, image_size // 4)),
+              'sbc': rng.normal(100, 10, (image_size // 4, image_size // 4))}
+    images = {detector: image.astype(np.float32)
+              for detector, image in images.items()}
+
+    rootname_paths = []
+    proposal_types = {}
+    for rootname, detector, proposid in make_rootnames(num_rootnames, seed):
+        rootname_path = os.path.join(directory, rootname[:4], rootname)
+        os.makedirs(rootname_path, exist_ok=True)
+        for filetype in FILETYPES:
+            if filetype not in getattr(
+                    utils, '{}_FILE_EXTS'.format(detector.upper())):
+                continue
+            filename = os.path.join(rootname_path,
+                                    '{}_{}.fits'.format(rootname, filetype))
+            make_file(filename, detector, filetype, proposid, templates,
+                      images)
+        rootname_paths.append(rootname_path)
+        proposal_types[proposid] = 'GO'
+
+    with open(os.path.join(directory, 'proposal_types.txt'), 'w') as f:
+        for proposid, proposal_type in sorted(proposal_types.items()):
+            f.write('{}, {}\n'.format(proposid, proposal_type))
+
+    return rootname_paths
+
+
+def parse_args():
+    """Parse command line arguments. Returns ``args`` object
+
+    Returns
+    -------
+    args : obj
+        An argparse object containing all of the arguments
+    """
+
+    # Create help strings
+    directory_help = 'The directory to create the archive in.'
+    num_rootnames_help = 'The number of rootnames to create.'
+    seed_help = 'The seed of the random number generator.'
+    image_size_help = 'The width in pixels of a WFC science extension.'
+
+    # Add arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('directory',
+                        action='store',
+                        help=directory_help)
+    parser.add_argument('num_rootnames',
+                        action='store',
+                        type=int,
+                        help=num_rootnames_help)
+    parser.add_argument('-s', '--seed',
+                        dest='seed',
+                        action='store',
+                        type=int,
+                        required=False,
+                        default=0,
+                        help=seed_help)
+    parser.add_argument('--image_size',
+                        dest='image_size',
+                        action='store',
+                        type=int,
+                        required=False,
+                        default=256,
+                        help=image_size_help)
+
+    # Parse args
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == '__main__':
+
+    args = parse_args()
+    rootname_paths = make_synthetic_archive(args.directory, args.num_rootnames,
+                                            args.seed, args.image_size)
+    print('Created {} rootnames in {}'.format(len(rootname_paths),
+                                              args.directory))
@@ -18,6 +18,12 @@ The ``session`` object manages operations on ORM-mapped objects, as
 construced by the base.  These operations include querying, for
 example.
 
+Neither the ``engine`` nor the ``session`` is created when this module
+is imported.  Both are created on first use, once per process, so that
+processes that never touch the database do not pay for a connection,
+and so that ``multiprocessing`` workers never share the connections of
+the process they were forked from.
+
 Authors
 -------
     Matthew Bourque
@@ -30,12 +36,29 @@ Use
     ::
 
         from acsql.database.database_interface import base
+        from acsql.database.database_interface import build_all_orms
         from acsql.database.database_interface import engine
+        from acsql.database.database_interface import get_engine
+        from acsql.database.database_interface import get_orm
+        from acsql.database.database_interface import get_session
         from acsql.database.database_interface import session
         from acsql.database.database_interface import Master
         from acsql.database.database_interface import Datasets
+        from acsql.database.database_interface import Fingerprints
         from acsql.database.database_interface import <header_table>
 
+    The ORMs of the header tables (e.g. ``WFC_flt_1``) are only created
+    when they are first used, either through ``get_orm()`` or by
+    importing them as above.  ``build_all_orms()`` creates all of them
+    at once, e.g. before creating or dropping all tables.
+
+    The ``acsql`` database may be ``MySQL`` (as in production) or a
+    single ``SQLite`` file (e.g. for local use, CI, or benchmarks), as
+    given by the ``connection_string`` config file setting.  ``SQLite``
+    connections are put in ``WAL`` mode and tuned for bulk loading with
+    the pragmas of ``SQLITE_PRAGMAS``, which may be overridden with the
+    ``sqlite_pragmas`` config file setting.
+
 Dependencies
 ------------
     External library dependencies include:
@@ -46,7 +69,9 @@ Dependencies
 """
 
 import os
+import threading
 
+from sqlalchemy import BigInteger
 from sqlalchemy import Boolean
 from sqlalchemy import Column
 from sqlalchemy import create_engine
@@ -54,20 +79,50 @@ from sqlalchemy import Date
 from sqlalchemy import DateTime
 from sqlalchemy import Index
 from sqlalchemy import Enum
+from sqlalchemy import event
 from sqlalchemy import ForeignKey
 from sqlalchemy import ForeignKeyConstraint
 from sqlalchemy import Integer
+from sqlalchemy.orm import scoped_session
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import String
 from sqlalchemy import Time
+from sqlalchemy.dialects import mysql
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.types import Float
 
+from acsql.utils.utils import DEFAULT_STRING_LENGTH
+from acsql.utils.utils import HRC_FILE_EXTS
+from acsql.utils.utils import read_table_definitions
+from acsql.utils.utils import SBC_FILE_EXTS
 from acsql.utils.utils import SETTINGS
+from acsql.utils.utils import SPECIAL_STRING_LENGTHS
+from acsql.utils.utils import WFC_FILE_EXTS
+
+# The engines created by get_engine(), and the process that created them
+_ENGINES = {}
+_ENGINES_PID = None
+
+# The header table ORMs created by get_orm()
+_ORMS = {}
+_ORMS_LOCK = threading.Lock()
+
+# The pragmas that are set on every SQLite connection: WAL mode so that
+# the web application can read while the ingestion writes, fewer syncs,
+# a larger page cache, a wait for the locks of other ingestion
+# processes rather than an error, and the foreign keys that MySQL
+# enforces
+SQLITE_PRAGMAS = {'journal_mode': 'WAL',
+                  'synchronous': 'NORMAL',
+                  'cache_size': -65536,
+                  'temp_store': 'MEMORY',
+                  'busy_timeout': 60000,
+                  'foreign_keys': 'ON'}
 
 
 def define_columns(data_dict, class_name):
-    """Dynamically define the class attributes for the ORM
+    """Dynamically define the class attributes for the ORM, from the
+    table definitions of ``acsql.database.schema``.
 
     Parameters
     ----------
@@ -86,10 +141,7 @@ def define_columns(data_dict, class_name):
     special_keywords = ['RULEFILE', 'FWERROR', 'FW2ERROR', 'PROPTTL1',
                         'TARDESCR', 'QUALCOM2']
 
-    with open(os.path.join(os.path.split(__file__)[0], 'table_definitions',
-                           class_name.lower() + '.txt'), 'r') as f:
-        data = f.readlines()
-    keywords = [item.strip().split(', ') for item in data]
+    keywords = read_table_definitions()[class_name.lower()]
     for keyword in keywords:
         if keyword[0] in special_keywords:
             data_dict[keyword[0].lower()] = get_special_column(keyword[0])
@@ -100,7 +152,8 @@ def define_columns(data_dict, class_name):
         elif keyword[1] == 'Float':
             data_dict[keyword[0].lower()] = Column(Float(precision=32))
         elif keyword[1] == 'Decimal':
-            data_dict[keyword[0].lower()] = Column(Float(precision='13,8'))
+            data_dict[keyword[0].lower()] = Column(Float().with_variant(
+                mysql.FLOAT(precision=13, scale=8), 'mysql'))
         elif keyword[1] == 'Date':
             data_dict[keyword[0].lower()] = Column(Date())
         elif keyword[1] == 'Time':
@@ -133,22 +186,136 @@ def get_special_column(keyword):
         A SQLAlchemy Column object for the given ``keyword``.
     """
 
-    if keyword in ['RULEFILE', 'PROPTTL1', 'TARDESCR', 'QUALCOM2']:
-        return Column(String(500))
-    elif keyword in ['FWERROR', 'FW2ERROR']:
-        return Column(String(100))
-    else:
-        return Column(String(50))
+    length = SPECIAL_STRING_LENGTHS.get(keyword, DEFAULT_STRING_LENGTH)
+
+    return Column(String(length))
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Set the pragmas of ``SQLITE_PRAGMAS`` (updated with the
+    ``sqlite_pragmas`` config file setting) on a new ``SQLite``
+    connection.
+
+    This function is called by ``sqlalchemy`` for every connection of
+    a ``SQLite`` engine (see ``get_engine()``).
+
+    Parameters
+    ----------
+    dbapi_connection : obj
+        The ``sqlite3`` connection.
+    connection_record : obj
+        The ``sqlalchemy`` record of the connection.
+    """
+
+    pragmas = dict(SQLITE_PRAGMAS)
+    pragmas.update(SETTINGS.get('sqlite_pragmas') or {})
+
+    cursor = dbapi_connection.cursor()
+    for pragma, value in pragmas.items():
+        cursor.execute('PRAGMA {} = {}'.format(pragma, value))
+    cursor.close()
+
+
+def get_engine(connection_string=None):
+    """Return the ``engine`` object of this process for the given
+    ``connection_string``.
+
+    Engines are created once per process and connection string and are
+    then reused, so that connections are pooled rather than opened for
+    every write.  The pool is configured with the ``pool_size``,
+    ``pool_recycle``, and ``pool_pre_ping`` config file settings.
+    The connections of ``SQLite`` engines are configured by
+    ``set_sqlite_pragmas()``.
+
+    If the process has been forked (e.g. a ``multiprocessing`` worker),
+    the engines inherited from the parent process are discarded and
+    new ones are created, since the parent's connections cannot be
+    shared across processes.
+
+    Parameters
+    ----------
+    connection_string : str, optional
+        The connection string to connect to the ``acsql`` database.  If
+        not provided, the ``connection_string`` of the config file is
+        used.
+
+    Returns
+    -------
+    engine : engine object
+        Provides a source of database connectivity and behavior.
+    """
+
+    global _ENGINES_PID
+
+    if connection_string is None:
+        connection_string = SETTINGS['connection_string']
+
+    if _ENGINES_PID != os.getpid():
+        reset_engines()
+
+    if connection_string not in _ENGINES:
+        kwargs = {'echo': False,
+                  'pool_pre_ping': SETTINGS.get('pool_pre_ping', True)}
+        if not connection_string.startswith('sqlite'):
+            kwargs['pool_size'] = SETTINGS.get('pool_size', 5)
+            kwargs['pool_recycle'] = SETTINGS.get('pool_recycle', 3600)
+            kwargs['pool_timeout'] = 100000
+        _ENGINES[connection_string] = create_engine(connection_string,
+                                                    **kwargs)
+        if connection_string.startswith('sqlite'):
+            event.listen(_ENGINES[connection_string], 'connect',
+                         set_sqlite_pragmas)
+
+    return _ENGINES[connection_string]
+
+
+def get_session(connection_string=None):
+    """Return a new ``session`` object that uses the ``engine`` of this
+    process (see ``get_engine()``).
+
+    Parameters
+    ----------
+    connection_string : str, optional
+        The connection string to connect to the ``acsql`` database.  If
+        not provided, the ``connection_string`` of the config file is
+        used.
+
+    Returns
+    -------
+    session : sesson object
+        Provides a holding zone for all objects loaded or associated
+        with the database.
+    """
+
+    Session = sessionmaker(bind=get_engine(connection_string))
+    session = Session()
+
+    return session
+
+
+def reset_engines():
+    """Discard the engines created by ``get_engine()`` so that new ones
+    are created on next use.
+
+    The discarded engines are not disposed of, since after a fork their
+    connections still belong to the parent process.  This function can
+    be used as the ``initializer`` of a ``multiprocessing.Pool``.
+    """
+
+    global _ENGINES_PID
+
+    _ENGINES.clear()
+    _ENGINES_PID = os.getpid()
 
 
 def load_connection(connection_string):
     """Return ``session``, ``base``, and ``engine`` objects for
     connecting to the ``acsql`` database.
 
-    Create an ``engine`` using an given ``connection_string``. Create a
-    ``base`` class and ``session`` class from the ``engine``. Create an
-    instance of the ``session`` class. Return the ``session``,
-    ``base``, and ``engine`` instances.
+    Get the ``engine`` of this process for the given
+    ``connection_string`` (see ``get_engine()``) and a new ``session``
+    that uses it (see ``get_session()``).  Return them along with the
+    ``base`` of the ORMs of this module.
 
     Parameters
     ----------
@@ -168,15 +335,17 @@ def load_connection(connection_string):
         Provides a source of database connectivity and behavior.
     """
 
-    engine = create_engine(connection_string, echo=False, pool_timeout=100000)
-    base = declarative_base(engine)
-    Session = sessionmaker(bind=engine)
-    session = Session()
+    engine = get_engine(connection_string)
+    session = get_session(connection_string)
 
     return session, base, engine
 
 
-session, base, engine = load_connection(SETTINGS['connection_string'])
+# The base is not bound to an engine, so that none is created at import
+base = declarative_base()
+
+# The session of this process, created by get_session() on first use
+session = scoped_session(get_session, scopefunc=os.getpid)
 
 
 def orm_factory(class_name):
@@ -252,146 +421,132 @@ class Datasets(base):
     # __table_args__ = foreign_keys
 
 
-# WFC tables
-WFC_raw_0 = orm_factory('WFC_raw_0')
-WFC_raw_1 = orm_factory('WFC_raw_1')
-WFC_raw_2 = orm_factory('WFC_raw_2')
-WFC_raw_3 = orm_factory('WFC_raw_3')
-WFC_raw_4 = orm_factory('WFC_raw_4')
-WFC_raw_5 = orm_factory('WFC_raw_5')
-WFC_raw_6 = orm_factory('WFC_raw_6')
-
-WFC_flt_0 = orm_factory('WFC_flt_0')
-WFC_flt_1 = orm_factory('WFC_flt_1')
-WFC_flt_2 = orm_factory('WFC_flt_2')
-WFC_flt_3 = orm_factory('WFC_flt_3')
-WFC_flt_4 = orm_factory('WFC_flt_4')
-WFC_flt_5 = orm_factory('WFC_flt_5')
-WFC_flt_6 = orm_factory('WFC_flt_6')
-
-WFC_flc_0 = orm_factory('WFC_flc_0')
-WFC_flc_1 = orm_factory('WFC_flc_1')
-WFC_flc_2 = orm_factory('WFC_flc_2')
-WFC_flc_3 = orm_factory('WFC_flc_3')
-WFC_flc_4 = orm_factory('WFC_flc_4')
-WFC_flc_5 = orm_factory('WFC_flc_5')
-WFC_flc_6 = orm_factory('WFC_flc_6')
-
-WFC_spt_0 = orm_factory('WFC_spt_0')
-WFC_spt_1 = orm_factory('WFC_spt_1')
-
-WFC_drz_0 = orm_factory('WFC_drz_0')
-WFC_drz_1 = orm_factory('WFC_drz_1')
-WFC_drz_2 = orm_factory('WFC_drz_2')
-WFC_drz_3 = orm_factory('WFC_drz_3')
-
-WFC_drc_0 = orm_factory('WFC_drc_0')
-WFC_drc_1 = orm_factory('WFC_drc_1')
-WFC_drc_2 = orm_factory('WFC_drc_2')
-WFC_drc_3 = orm_factory('WFC_drc_3')
-
-WFC_crj_0 = orm_factory('WFC_crj_0')
-WFC_crj_1 = orm_factory('WFC_crj_1')
-WFC_crj_2 = orm_factory('WFC_crj_2')
-WFC_crj_3 = orm_factory('WFC_crj_3')
-WFC_crj_4 = orm_factory('WFC_crj_4')
-WFC_crj_5 = orm_factory('WFC_crj_5')
-WFC_crj_6 = orm_factory('WFC_crj_6')
-
-WFC_crc_0 = orm_factory('WFC_crc_0')
-WFC_crc_1 = orm_factory('WFC_crc_1')
-WFC_crc_2 = orm_factory('WFC_crc_2')
-WFC_crc_3 = orm_factory('WFC_crc_3')
-WFC_crc_4 = orm_factory('WFC_crc_4')
-WFC_crc_5 = orm_factory('WFC_crc_5')
-WFC_crc_6 = orm_factory('WFC_crc_6')
-
-WFC_jif_0 = orm_factory('WFC_jif_0')
-WFC_jif_1 = orm_factory('WFC_jif_1')
-WFC_jif_2 = orm_factory('WFC_jif_2')
-WFC_jif_3 = orm_factory('WFC_jif_3')
-WFC_jif_4 = orm_factory('WFC_jif_4')
-WFC_jif_5 = orm_factory('WFC_jif_5')
-WFC_jif_6 = orm_factory('WFC_jif_6')
-
-WFC_jit_0 = orm_factory('WFC_jit_0')
-WFC_jit_1 = orm_factory('WFC_jit_1')
-WFC_jit_2 = orm_factory('WFC_jit_2')
-WFC_jit_3 = orm_factory('WFC_jit_3')
-WFC_jit_4 = orm_factory('WFC_jit_4')
-WFC_jit_5 = orm_factory('WFC_jit_5')
-WFC_jit_6 = orm_factory('WFC_jit_6')
-
-WFC_asn_0 = orm_factory('WFC_asn_0')
-WFC_asn_1 = orm_factory('WFC_asn_1')
-
-
-# HRC tables
-HRC_raw_0 = orm_factory('HRC_raw_0')
-HRC_raw_1 = orm_factory('HRC_raw_1')
-HRC_raw_2 = orm_factory('HRC_raw_2')
-HRC_raw_3 = orm_factory('HRC_raw_3')
-
-HRC_flt_0 = orm_factory('HRC_flt_0')
-HRC_flt_1 = orm_factory('HRC_flt_1')
-HRC_flt_2 = orm_factory('HRC_flt_2')
-HRC_flt_3 = orm_factory('HRC_flt_3')
-
-HRC_spt_0 = orm_factory('HRC_spt_0')
-HRC_spt_1 = orm_factory('HRC_spt_1')
-
-HRC_drz_0 = orm_factory('HRC_drz_0')
-HRC_drz_1 = orm_factory('HRC_drz_1')
-HRC_drz_2 = orm_factory('HRC_drz_2')
-HRC_drz_3 = orm_factory('HRC_drz_3')
-
-HRC_crj_0 = orm_factory('HRC_crj_0')
-HRC_crj_1 = orm_factory('HRC_crj_1')
-HRC_crj_2 = orm_factory('HRC_crj_2')
-HRC_crj_3 = orm_factory('HRC_crj_3')
-
-HRC_jif_0 = orm_factory('HRC_jif_0')
-HRC_jif_1 = orm_factory('HRC_jif_1')
-HRC_jif_2 = orm_factory('HRC_jif_2')
-
-HRC_jit_0 = orm_factory('HRC_jit_0')
-HRC_jit_1 = orm_factory('HRC_jit_1')
-HRC_jit_2 = orm_factory('HRC_jit_2')
-
-HRC_asn_0 = orm_factory('HRC_asn_0')
-HRC_asn_1 = orm_factory('HRC_asn_1')
-
-
-# SBC tables
-SBC_raw_0 = orm_factory('SBC_raw_0')
-SBC_raw_1 = orm_factory('SBC_raw_1')
-SBC_raw_2 = orm_factory('SBC_raw_2')
-SBC_raw_3 = orm_factory('SBC_raw_3')
-
-SBC_flt_0 = orm_factory('SBC_flt_0')
-SBC_flt_1 = orm_factory('SBC_flt_1')
-SBC_flt_2 = orm_factory('SBC_flt_2')
-SBC_flt_3 = orm_factory('SBC_flt_3')
-
-SBC_spt_0 = orm_factory('SBC_spt_0')
-SBC_spt_1 = orm_factory('SBC_spt_1')
-
-SBC_drz_0 = orm_factory('SBC_drz_0')
-SBC_drz_1 = orm_factory('SBC_drz_1')
-SBC_drz_2 = orm_factory('SBC_drz_2')
-SBC_drz_3 = orm_factory('SBC_drz_3')
-
-SBC_jif_0 = orm_factory('SBC_jif_0')
-SBC_jif_1 = orm_factory('SBC_jif_1')
-SBC_jif_2 = orm_factory('SBC_jif_2')
-
-SBC_jit_0 = orm_factory('SBC_jit_0')
-SBC_jit_1 = orm_factory('SBC_jit_1')
-SBC_jit_2 = orm_factory('SBC_jit_2')
-
-SBC_asn_0 = orm_factory('SBC_asn_0')
-SBC_asn_1 = orm_factory('SBC_asn_1')
+class Fingerprints(base):
+    """ORM for the fingerprints table, which records the state of each
+    ingested file so that unchanged files can be skipped."""
+    def __init__(self, data_dict):
+        self.__dict__.update(data_dict)
+
+    __tablename__ = 'fingerprints'
+    filename = Column(String(18), primary_key=True, nullable=False)
+    rootname = Column(String(8), ForeignKey('master.rootname'), index=True,
+                      nullable=False)
+    size = Column(BigInteger(), nullable=False)
+    mtime = Column(Float(precision=53), nullable=False)
+    datasum = Column(String(16), nullable=True)
+    checksum = Column(String(16), nullable=True)
+
+
+def _get_orm_names():
+    """Return the names of the ORMs of the header tables, one for each
+    detector/filetype/extension combination of the ``FILE_EXTS``.
+
+    Returns
+    -------
+    orm_names : frozenset
+        The ORM names (e.g. ``WFC_flt_1``).
+    """
+
+    orm_names = frozenset(
+        '{}_{}_{}'.format(detector, filetype, ext)
+        for detector, file_exts in [('WFC', WFC_FILE_EXTS),
+                                    ('HRC', HRC_FILE_EXTS),
+                                    ('SBC', SBC_FILE_EXTS)]
+        for filetype, exts in file_exts.items() for ext in exts)
+
+    return orm_names
+
+
+ORM_NAMES = _get_orm_names()
+
+
+def get_orm(class_name):
+    """Return the ORM of the header table of the given ``class_name``,
+    creating it on first use.
+
+    Header table ORMs are created lazily, so that importing this
+    module does not have to read every table definition file and build
+    every ORM.
+
+    Parameters
+    ----------
+    class_name : str
+        The name of the ORM (e.g. ``WFC_flt_1``).
+
+    Returns
+    -------
+    class : obj
+        The SQLAlchemy ORM.
+
+    Raises
+    ------
+    ValueError
+        If ``class_name`` is not the name of a header table.
+    """
+
+    if class_name not in ORM_NAMES:
+        raise ValueError('unrecognized header table: {}'.format(class_name))
+
+    if class_name not in _ORMS:
+        with _ORMS_LOCK:
+            if class_name not in _ORMS:
+                _ORMS[class_name] = orm_factory(class_name)
+
+    return _ORMS[class_name]
+
+
+def build_all_orms():
+    """Create the ORMs of all header tables that have not been created
+    yet, so that ``base.metadata`` holds every table of the database
+    (e.g. before calling ``create_all()`` or ``drop_all()``).
+
+    Returns
+    -------
+    orms : list
+        The ORMs of all header tables.
+    """
+
+    orms = [get_orm(class_name) for class_name in sorted(ORM_NAMES)]
+
+    return orms
+
+
+def __getattr__(name):
+    """Return the ``engine`` of this process (see ``get_engine()``),
+    or the ORM of the header table of the given ``name`` (e.g. for
+    ``from acsql.database.database_interface import WFC_flt_1``).
+
+    Parameters
+    ----------
+    name : str
+        The name of the attribute.
+
+    Returns
+    -------
+    attribute : obj
+        The ``engine``, or the SQLAlchemy ORM.
+
+    Raises
+    ------
+    AttributeError
+        If ``name`` is not ``engine`` or the name of a header table.
+    """
+
+    if name == 'engine':
+        return get_engine()
+
+    if name in ORM_NAMES:
+        return get_orm(name)
+
+    raise AttributeError('module {} has no attribute {}'.format(__name__,
+                                                                name))
+
+
+def __dir__():
+    """Return the names of the module, including those of the header
+    table ORMs."""
 
+    return sorted(set(globals()) | ORM_NAMES | {'engine'})
 
 if __name__ == '__main__':
 
@@ -403,5 +558,6 @@ if __name__ == '__main__':
 
     if response.lower() == 'y':
         print('Resetting table(s)')
-        base.metadata.drop_all()
-        base.metadata.create_all()
+        build_all_orms()
+        base.metadata.drop_all(get_engine())
+        base.metadata.create_all(get_engine())
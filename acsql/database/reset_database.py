@@ -21,6 +21,8 @@ Dependencies
 """
 
 from acsql.database.database_interface import base
+from acsql.database.database_interface import build_all_orms
+from acsql.database.database_interface import get_engine
 from acsql.utils.utils import SETTINGS
 
 
@@ -32,5 +34,6 @@ if __name__ == '__main__':
 
     if response.lower() == 'y':
         print('Resetting database.')
-        base.metadata.drop_all()
-        base.metadata.create_all()
+        build_all_orms()
+        base.metadata.drop_all(get_engine())
+        base.metadata.create_all(get_engine())
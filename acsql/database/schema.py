@@ -0,0 +1,197 @@
+"""Load the table definitions of the header tables of the ``acsql``
+database.
+
+The ``table_definitions/*.txt`` files list the header keywords (and
+their types) that make up each header table.  They are the single
+source of the ``acsql`` schema: the ORMs of ``database_interface``,
+and the keyword lookups that the ingestion uses to match header
+keywords to columns (see ``acsql.utils.utils``), are all built from
+the definitions loaded by this module, so they cannot disagree.
+
+The parsed definitions are kept in memory once loaded, and are also
+written to a cache file, so that later processes can load them in one
+read rather than parsing every file again.  The cache is keyed by the
+name, size, and modification time of every table definition file (and
+by ``SCHEMA_CACHE_VERSION``), so it is parsed again as soon as a file
+is added, removed, or edited (e.g. by ``update_tabledefs.py``).
+
+Authors
+-------
+    Matthew Bourque
+
+Use
+---
+    This module is intended to be imported from and used by
+    ``acsql.utils.utils`` as such:
+    ::
+
+        from acsql.database.schema import load_table_definitions
+        table_definitions = load_table_definitions(cache_file)
+"""
+
+import logging
+import os
+import pickle
+import tempfile
+
+# The version of the layout of the cache file.  Change it whenever the
+# layout of the parsed definitions changes.
+SCHEMA_CACHE_VERSION = 1
+
+TABLE_DEFINITIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                     'table_definitions')
+
+# The definitions loaded by this process
+_TABLE_DEFINITIONS = None
+
+
+def get_cache_key():
+    """Return the key that identifies the current state of the table
+    definition files.
+
+    Returns
+    -------
+    cache_key : tuple
+        The ``SCHEMA_CACHE_VERSION`` and the name, size, and
+        modification time of each table definition file.
+    """
+
+    entries = sorted(
+        [(entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+         for entry in os.scandir(TABLE_DEFINITIONS_DIR)
+         if entry.name.endswith('.txt')])
+    cache_key = (SCHEMA_CACHE_VERSION, tuple(entries))
+
+    return cache_key
+
+
+def parse_table_definitions():
+    """Return the keywords and types of each header table, as parsed
+    from the table definition files.
+
+    Returns
+    -------
+    table_definitions : dict
+        A dictionary whose keys are detector/file_type/extension
+        configurations (e.g. 'wfc_flt_0') and whose values are lists
+        of ``(keyword, type)`` pairs (e.g. ``('EXPTIME', 'Float')``)
+        for the corresponding table.
+    """
+
+    table_definitions = {}
+    for filename in sorted(os.listdir(TABLE_DEFINITIONS_DIR)):
+        if not filename.endswith('.txt'):
+            continue
+        configuration = filename.split('.txt')[0]
+        with open(os.path.join(TABLE_DEFINITIONS_DIR, filename), 'r') as f:
+            contents = [line.strip().split(',') for line in f if line.strip()]
+        table_definitions[configuration] = [
+            (item[0].strip(), item[1].strip()) for item in contents]
+
+    return table_definitions
+
+
+def _read_cache(cache_file, cache_key):
+    """Return the table definitions stored in the given ``cache_file``,
+    or ``None`` if it does not exist, cannot be read, or is out of
+    date.
+
+    Parameters
+    ----------
+    cache_file : str
+        The path to the cache file.
+    cache_key : tuple
+        The current key, as returned by ``get_cache_key()``.
+
+    Returns
+    -------
+    table_definitions : dict or None
+        The table definitions.
+    """
+
+    try:
+        with open(cache_file, 'rb') as f:
+            cache = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, pickle.PickleError, AttributeError,
+            ValueError, TypeError) as e:
+        logging.warning('Unable to read schema cache {}: {}'.format(
+            cache_file, e))
+        return None
+
+    if not isinstance(cache, dict) or cache.get('key') != cache_key:
+        return None
+
+    return cache['table_definitions']
+
+
+def _write_cache(cache_file, cache_key, table_definitions):
+    """Write the given ``table_definitions`` to the given
+    ``cache_file``.
+
+    The cache is written to a temporary file that then replaces the
+    cache file, so that processes that read the cache at the same time
+    never see a partial file.
+
+    Parameters
+    ----------
+    cache_file : str
+        The path to the cache file.
+    cache_key : tuple
+        The current key, as returned by ``get_cache_key()``.
+    table_definitions : dict
+        The table definitions to cache.
+    """
+
+    cache = {'key': cache_key, 'table_definitions': table_definitions}
+
+    try:
+        file_descriptor, temp_file = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(cache_file)),
+            prefix='.schema_cache_')
+        with os.fdopen(file_descriptor, 'wb') as f:
+            pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, cache_file)
+    except OSError as e:
+        logging.warning('Unable to write schema cache {}: {}'.format(
+            cache_file, e))
+
+
+def load_table_definitions(cache_file=None):
+    """Return the keywords and types of each header table.
+
+    The definitions are loaded once per process: from the
+    ``cache_file`` if it is up to date, and otherwise from the table
+    definition files (in which case the ``cache_file`` is written
+    again).
+
+    Parameters
+    ----------
+    cache_file : str, optional
+        The path to the cache file.  If not provided, the table
+        definition files are always parsed.
+
+    Returns
+    -------
+    table_definitions : dict
+        A dictionary whose keys are detector/file_type/extension
+        configurations (e.g. 'wfc_flt_0') and whose values are lists
+        of ``(keyword, type)`` pairs (e.g. ``('EXPTIME', 'Float')``)
+        for the corresponding table.
+    """
+
+    global _TABLE_DEFINITIONS
+
+    if _TABLE_DEFINITIONS is None:
+        table_definitions = None
+        if cache_file:
+            cache_key = get_cache_key()
+            table_definitions = _read_cache(cache_file, cache_key)
+        if table_definitions is None:
+            table_definitions = parse_table_definitions()
+            if cache_file:
+                _write_cache(cache_file, cache_key, table_definitions)
+        _TABLE_DEFINITIONS = table_definitions
+
+    return _TABLE_DEFINITIONS
@@ -0,0 +1,165 @@
+"""Determine which files of a rootname have changed since they were last
+ingested, using the file fingerprints stored in the ``fingerprints``
+table.
+
+The fingerprint of a file is its size and modification time, and
+optionally (if the ``fingerprint_checksums`` config file setting is
+``True``) the ``DATASUM`` and ``CHECKSUM`` keywords of its primary
+header.  A file whose size and modification time have not changed is
+unchanged.  Otherwise, if checksums are used, a file whose ``DATASUM``
+and ``CHECKSUM`` have not changed (e.g. because it was copied again
+without being reprocessed) is unchanged as well.  Any other file is
+changed, and is ingested again in full.
+
+Authors
+-------
+    Matthew Bourque
+
+Use
+---
+    This module is intended to be imported from and used by
+    ``acsql.ingest.ingest.py`` as such:
+    ::
+
+        from acsql.ingest.fingerprints import get_fingerprints
+        from acsql.ingest.fingerprints import is_unchanged
+        from acsql.ingest.fingerprints import make_fingerprint
+
+        stored_fingerprints = get_fingerprints(rootname)
+        fingerprint = make_fingerprint(filename)
+        stored_fingerprint = stored_fingerprints.get(basename)
+        if is_unchanged(filename, fingerprint, stored_fingerprint):
+            ...
+
+Dependencies
+------------
+    External library dependencies include:
+
+    - ``acsql``
+    - ``astropy``
+    - ``sqlalchemy``
+"""
+
+import os
+
+from astropy.io import fits
+from sqlalchemy import select
+
+from acsql.database.database_interface import get_engine
+from acsql.utils.utils import get_table
+from acsql.utils.utils import SETTINGS
+
+
+def get_fingerprints(rootname):
+    """Return the stored fingerprints of the files of the given
+    ``rootname``.
+
+    Parameters
+    ----------
+    rootname : str
+        The 8-character rootname (e.g. ``jbm110u2``).
+
+    Returns
+    -------
+    fingerprints : dict
+        A dictionary whose keys are filenames (e.g.
+        ``jbm110u2q_flt.fits``) and whose values are fingerprints.
+    """
+
+    tab = get_table('Fingerprints')
+    with get_engine().connect() as connection:
+        results = connection.execute(
+            select([tab]).where(tab.c.rootname == rootname)).fetchall()
+
+    fingerprints = {row['filename']: dict(row) for row in results}
+
+    return fingerprints
+
+
+def make_fingerprint(filename):
+    """Return the fingerprint of the given file, without its checksums
+    (see ``add_checksums()``).
+
+    Parameters
+    ----------
+    filename : str
+        The path to the file.
+
+    Returns
+    -------
+    fingerprint : dict
+        The fingerprint, in the form of a record of the
+        ``fingerprints`` table.
+    """
+
+    stat = os.stat(filename)
+    basename = os.path.basename(filename)
+    fingerprint = {'filename': basename,
+                   'rootname': basename.split('_')[0][:-1],
+                   'size': stat.st_size,
+                   'mtime': stat.st_mtime,
+                   'datasum': None,
+                   'checksum': None}
+
+    return fingerprint
+
+
+def add_checksums(fingerprint, header):
+    """Add the ``DATASUM`` and ``CHECKSUM`` of the given primary
+    ``header`` to the given ``fingerprint``, if the
+    ``fingerprint_checksums`` config file setting is ``True``.
+
+    Parameters
+    ----------
+    fingerprint : dict
+        The fingerprint, as returned by ``make_fingerprint()``.
+    header : obj
+        The ``astropy.io.fits`` ``Header`` of the primary extension of
+        the file.
+    """
+
+    if SETTINGS.get('fingerprint_checksums', False):
+        fingerprint['datasum'] = header.get('DATASUM')
+        fingerprint['checksum'] = header.get('CHECKSUM')
+
+
+def is_unchanged(filename, fingerprint, stored_fingerprint):
+    """Return ``True`` if the given file has not changed since the
+    ``stored_fingerprint`` was recorded.
+
+    The primary header of the file is only read if its size or
+    modification time have changed and checksums are used.
+
+    Parameters
+    ----------
+    filename : str
+        The path to the file.
+    fingerprint : dict
+        The current fingerprint of the file, as returned by
+        ``make_fingerprint()``.  Its checksums are added if they are
+        read.
+    stored_fingerprint : dict or None
+        The fingerprint of the file that was recorded when it was last
+        ingested, or ``None`` if it was never ingested.
+
+    Returns
+    -------
+    unchanged : bool
+        ``True`` if the file does not need to be ingested again.
+    """
+
+    if stored_fingerprint is None:
+        return False
+
+    if fingerprint['size'] == stored_fingerprint['size'] and \
+            fingerprint['mtime'] == stored_fingerprint['mtime']:
+        return True
+
+    if not stored_fingerprint['checksum'] or not stored_fingerprint['datasum']:
+        return False
+
+    add_checksums(fingerprint, fits.getheader(filename, 0))
+    unchanged = fingerprint['checksum'] == stored_fingerprint['checksum'] and \
+        fingerprint['datasum'] == stored_fingerprint['datasum']
+
+    return unchanged
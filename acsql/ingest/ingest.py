@@ -18,6 +18,18 @@ Use
         from acsql.ingest.ingest import ingest
         ingest(rootname)
 
+    Reading the files and writing to the database can also be done
+    separately (see ``acsql.ingest.pipeline``):
+    ::
+
+        from acsql.ingest.ingest import read_rootname
+        from acsql.ingest.ingest import write_records
+
+        ingest_dict = read_rootname(rootname_path, render_images=False)
+        writer = IngestWriter(journal_file)
+        writer.add(ingest_dict)
+        writer.flush()
+
 Dependencies
 ------------
     External library dependencies include:
@@ -28,36 +40,66 @@ Dependencies
 """
 
 from datetime import date
-import glob
+import fnmatch
 import logging
 import os
-import urllib.request
 
 from astropy.io import fits
 from astropy.io.fits.verify import VerifyError
-from sqlalchemy import Table
-from sqlalchemy.exc import IntegrityError
 
-from acsql.database.database_interface import Datasets
-from acsql.database.database_interface import load_connection
-from acsql.ingest.make_file_dict import get_metadata_from_test_files
+from acsql.ingest import journal
+from acsql.ingest.fingerprints import add_checksums
+from acsql.ingest.fingerprints import get_fingerprints
+from acsql.ingest.fingerprints import is_unchanged
+from acsql.ingest.fingerprints import make_fingerprint
+from acsql.ingest.make_file_dict import list_rootname_files
 from acsql.ingest.make_file_dict import make_file_dict
+from acsql.ingest.make_file_dict import make_rootname_dict
 from acsql.ingest.make_jpeg import make_jpeg
+from acsql.ingest.make_thumbnail import get_preview_dst
+from acsql.ingest.make_thumbnail import make_previews
 from acsql.ingest.make_thumbnail import make_thumbnail
+from acsql.ingest.make_tiles import get_tiles_dst
+from acsql.ingest.make_tiles import make_tiles
+from acsql.ingest.proposal_cache import resolve_proposal_type
+from acsql.utils.timing import timed
+from acsql.utils.utils import BulkInsertWriter
+from acsql.utils.utils import EXCLUDED_KEYWORDS
+from acsql.utils.utils import get_keyword_map
 from acsql.utils.utils import insert_or_update
 from acsql.utils.utils import SETTINGS
-from acsql.utils.utils import TABLE_DEFS
 from acsql.utils.utils import VALID_FILETYPES
-from acsql.utils.utils import VALID_PROPOSAL_TYPES
+
+
+class RecordList(list):
+    """A list of ``(table, data_dict)`` pairs that can be used in place
+    of a ``BulkInsertWriter``, so that records can be gathered (e.g.
+    in one process) and written later (e.g. in another process).
+    """
+
+    def add(self, table, data_dict):
+        """Append a record for the given ``table``.
+
+        Parameters
+        ----------
+        table : str
+            The name of the table to insert into (e.g. ``WFC_raw_0``).
+        data_dict : dict
+            A dictionary containing the data to insert.
+        """
+
+        self.append((table, data_dict))
 
 
 def get_proposal_type(proposid):
     """Return the ``proposal_type`` for the given ``proposid``.
 
     The ``proposal_type`` is the type of proposal (e.g. ``CAL``,
-    ``GO``, etc.).  The ``proposal_type`` is scraped from the MAST
-    proposal status webpage for the given ``proposid``.  If the
-    ``proposal_type`` cannot be determined, a ``None`` value is returned.
+    ``GO``, etc.).  The ``proposal_type`` is taken from the proposal
+    type cache, or determined by the configured resolver (e.g. scraped
+    from the MAST proposal status webpage) if it is not cached yet (see
+    ``acsql.ingest.proposal_cache``).  If the ``proposal_type`` cannot
+    be determined, a ``None`` value is returned.
 
     Parameters
     ----------
@@ -73,217 +115,670 @@ def get_proposal_type(proposid):
     if not proposid:
         proposal_type = None
     else:
-        try:
-            url = 'http://www.stsci.edu/cgi-bin/get-proposal-info?id='
-            url += '{}&submit=Go&observatory=HST'.format(proposid)
-            webpage = urllib.request.urlopen(url)
-            proposal_type = webpage.readlines()[11].split(b'prop_type">')[-1]
-            proposal_type = proposal_type.split(b'</a>')[0].decode()
-        except:
-            logging.warning('Cannot determine proposal type for {}'\
-                .format(proposid))
-            proposal_type = None
-
-    # Check for bad proposal types
-    if proposal_type not in VALID_PROPOSAL_TYPES:
+        proposal_type = resolve_proposal_type(proposid)
+
+    if proposal_type is None:
         logging.warning('Cannot determine proposal type for {}'\
             .format(proposid))
-        proposal_type = None
 
     return proposal_type
 
 
-def update_datasets_table(file_dict):
-    """Insert/update an entry for the file in the ``datasets`` table.
+def update_datasets_table(rootname, file_dicts, writer=None):
+    """Insert/update the entry for the given rootname in the
+    ``datasets`` table.
+
+    A single record holds the filenames of all of the given files.
+    Only the columns of their filetypes are written, so that the
+    filenames of other filetypes of the rootname are preserved.
 
     Parameters
     ----------
-    file_dict : dict
-        A dictionary containing various data useful for the ingestion
-        process.
+    rootname : str
+        The 8-character rootname (e.g. ``jbm110u2``).
+    file_dicts : list
+        The ``file_dict`` objects of the files of the rootname that
+        were ingested.
+    writer : obj, optional
+        A ``BulkInsertWriter`` (or ``RecordList``) to add the record
+        to.  If not provided, the record is written immediately.
     """
 
-    session, base, engine = load_connection(SETTINGS['connection_string'])
-
-    # Check to see if a record exists for the rootname
-    query = session.query(Datasets)\
-        .filter(Datasets.rootname == file_dict['rootname'])
-    query_count = query.count()
-
-    # If there are no results, then perform an insert
-    if not query_count:
+    if not file_dicts:
+        return
 
-        data_dict = {}
-        data_dict['rootname'] = file_dict['rootname']
+    data_dict = {'rootname': rootname}
+    for file_dict in file_dicts:
         data_dict[file_dict['filetype']] = file_dict['basename']
 
-        tab = Table('datasets', base.metadata, autoload=True)
-        insert_obj = tab.insert()
-        try:
-            insert_obj.execute(data_dict)
-        except IntegrityError as e:
-            logging.warning('{}: Unable to insert {} into datasets table: {}'\
-                .format(file_dict['full_rootname'], file_dict['basename'], e))
-
-    # If there are results, add the filename to the existing entry
+    if writer is not None:
+        writer.add('Datasets', data_dict)
     else:
-        data_dict = query.one().__dict__
-        del data_dict['_sa_instance_state']
-        data_dict[file_dict['filetype']] = file_dict['basename']
-        try:
-            query.update(data_dict)
-        except IntegrityError as e:
-            logging.warning('{}: Unable to update {} in datasets table: {}'\
-                .format(file_dict['full_rootname'], file_dict['basename'], e))
-
-    session.commit()
-    session.close()
-    engine.dispose()
+        insert_or_update('Datasets', data_dict)
 
-    logging.info('{}: Updated datasets table for {}.'\
-        .format(file_dict['rootname'], file_dict['filetype']))
+    logging.info('{}: Updated datasets table for {}.'.format(
+        rootname, ', '.join([item['filetype'] for item in file_dicts])))
 
 
-def update_header_table(file_dict, ext):
-    """Insert/update an entry for the file in the appropriate header
-    table (e.g. ``wfc_raw_0``).
+def get_ingestable_headers(file_dict, hdulist):
+    """Return the ingestable headers of the given ``hdulist``.
 
-    The header table that get updated depend on the detector, filetype,
-    and extension.
+    All of the headers are taken from the already-opened ``hdulist``,
+    so that the file only needs to be opened and parsed once no matter
+    how many extensions it has.  Only extensions that are listed in
+    the ``file_exts`` of the ``file_dict`` and that have an ingestable
+    ``EXTNAME`` are returned.
 
     Parameters
     ----------
     file_dict : dict
         A dictionary containing various data useful for the ingestion
         process.
-    ext : int
-        The header extension.
+    hdulist : obj
+        The ``astropy.io.fits`` ``HDUList`` object of the file.
+
+    Returns
+    -------
+    headers : dict
+        A dictionary whose keys are header extensions and whose values
+        are the corresponding ``astropy.io.fits`` ``Header`` objects.
     """
 
     # Check if header is an ingestable header before proceeding
     valid_extnames = ['PRIMARY', 'SCI', 'ERR', 'DQ', 'UDL', 'jit', 'jif',
                       'ASN', 'WHT', 'CTX']
-    ext_exists = True
-    try:
-        header = fits.getheader(file_dict['filename'], ext)
+
+    headers = {}
+    num_exts = len(hdulist)
+    for ext in file_dict['file_exts']:
+        if ext >= num_exts:
+            continue
+
+        header = hdulist[ext].header
         if ext == 0:
             extname = 'PRIMARY'
         else:
-            extname = header['EXTNAME']
-    except IndexError:
-        ext_exists = False
-        extname = None
+            extname = header.get('EXTNAME')
 
-    # Ingest the header if it is ingestable
-    if ext_exists and extname in valid_extnames:
+        if extname in valid_extnames:
+            headers[ext] = header
 
-        table = "{}_{}_{}".format(file_dict['detector'].upper(),
-                                  file_dict['filetype'].lower(),
-                                  str(ext))
+    return headers
 
-        exclude_list = ['HISTORY', 'COMMENT', 'ROOTNAME', 'FILENAME', '']
-        input_dict = {'rootname': file_dict['rootname'],
-                      'filename': file_dict['basename']}
 
-        try:
-            for key, value in header.items():
-                key = key.strip()
+def update_header_table(file_dict, ext, header, writer=None):
+    """Insert/update an entry for the file in the appropriate header
+    table (e.g. ``wfc_raw_0``).
+
+    The header table that get updated depend on the detector, filetype,
+    and extension.  Each header keyword is matched to its column, and
+    each value is converted to the type of its column, with the
+    keyword lookup of the table (see ``get_keyword_map()``).  Values that
+    cannot be converted are logged and left out, rather than causing
+    the whole record to be rejected by the database.
+
+    Parameters
+    ----------
+    file_dict : dict
+        A dictionary containing various data useful for the ingestion
+        process.
+    ext : int
+        The header extension.
+    header : obj
+        The ``astropy.io.fits`` ``Header`` object of the extension, as
+        returned by ``get_ingestable_headers``.
+    writer : obj, optional
+        A ``BulkInsertWriter`` (or ``RecordList``) to add the record
+        to.  If not provided, the record is written immediately.
+    """
+
+    table = "{}_{}_{}".format(file_dict['detector'].upper(),
+                              file_dict['filetype'].lower(),
+                              str(ext))
+
+    keyword_map = get_keyword_map(table)
+    input_dict = {'rootname': file_dict['rootname'],
+                  'filename': file_dict['basename']}
+
+    try:
+        for key, value in header.items():
+            entry = keyword_map.get(key)
 
+            if entry is None:
                 # Switch hypens to underscores
-                if '-' in key:
-                    key = key.replace('-', '_')
+                key = key.strip().replace('-', '_')
+                entry = keyword_map.get(key)
 
-                if key in exclude_list or value == "":
-                    continue
-                elif key not in TABLE_DEFS[table.lower()]:
+            if entry is None:
+                if key not in EXCLUDED_KEYWORDS:
                     logging.warning('{}: {} not in {}'\
                         .format(file_dict['full_rootname'], key, table))
-                    continue
-
-                input_dict[key.lower()] = value
-
+                continue
+            elif value == "" or isinstance(value, fits.card.Undefined):
+                continue
+
+            # Convert the value to the type of its column, leaving out
+            # values that cannot be converted
+            column, converter = entry
+            try:
+                input_dict[column] = converter(value)
+            except (TypeError, ValueError) as e:
+                logging.warning('{}: Invalid value {!r} for {} in {}: {}'\
+                    .format(file_dict['full_rootname'], value, key, table, e))
+
+        if writer is not None:
+            writer.add(table, input_dict)
+        else:
             insert_or_update(table, input_dict)
-            logging.info('{}: Updated {} table.'.format(file_dict['rootname'],
-                                                      table))
+        logging.info('{}: Updated {} table.'.format(file_dict['rootname'],
+                                                  table))
 
-        except VerifyError as e:
-            logging.warning('\tUnable to insert {} into {}: {}'.format(
-                file_dict['rootname'], table, e))
+    except VerifyError as e:
+        logging.warning('\tUnable to insert {} into {}: {}'.format(
+            file_dict['rootname'], table, e))
 
 
-def update_master_table(rootname_path):
+def update_master_table(rootname_dict, writer=None):
     """Insert/update an entry in the ``master`` table for the given
-    file.
+    rootname.
 
     Parameters
     ----------
-    rootname_path
-        The path to the rootname directory in the MAST cache.
+    rootname_dict : dict
+        A dictionary containing various data useful for the ingestion
+        process of the rootname, as returned by ``make_rootname_dict``.
+    writer : obj, optional
+        A ``BulkInsertWriter`` (or ``RecordList``) to add the record
+        to.  If not provided, the record is written immediately.
     """
 
-    rootname = os.path.basename(rootname_path)[:-1]
-    path = rootname_path[-15:]
-    proposid = get_metadata_from_test_files(rootname_path, 'proposid')
-    proposal_type = get_proposal_type(proposid)
+    # The detector is stored in upper case (e.g. ``WFC``), as the
+    # values of the detector column are
+    detector = rootname_dict['detector']
+    if detector:
+        detector = detector.upper()
 
     # Insert a record in the master table
-    data_dict = {'rootname': rootname,
-                  'path': path,
-                  'first_ingest_date': date.today().isoformat(),
-                  'last_ingest_date': date.today().isoformat(),
-                  'detector': get_metadata_from_test_files(rootname_path,
-                                                           'detector'),
-                  'proposal_type': proposal_type}
-    insert_or_update('Master', data_dict)
-    logging.info('{}: Updated master table.'.format(rootname))
-
-
-def ingest(rootname_path, filetype='all'):
-    """The main function of the ingest module.  Ingest a given rootname
-    (and its associated files) into the various tables of the ``acsql``
-    database.
+    data_dict = {'rootname': rootname_dict['rootname'],
+                  'path': rootname_dict['path'],
+                  'first_ingest_date': date.today(),
+                  'last_ingest_date': date.today(),
+                  'detector': detector,
+                  'proposal_type': rootname_dict['proposal_type']}
+    if writer is not None:
+        writer.add('Master', data_dict)
+    else:
+        insert_or_update('Master', data_dict)
+    logging.info('{}: Updated master table.'.format(rootname_dict['rootname']))
 
-    If for some reason the file is unable to be ingested, a warning is
-    logged.
+
+def images_are_current(file_dict):
+    """Return ``True`` if the JPEG, the previews, the tiles (and, for
+    ``flt`` files, the Thumbnail) of the given file exist and are newer
+    than the file.
+
+    Parameters
+    ----------
+    file_dict : dict
+        A dictionary containing various data useful for the ingestion
+        process.
+
+    Returns
+    -------
+    current : bool
+        ``True`` if the images do not need to be created again.
+    """
+
+    outputs = [file_dict['jpg_dst']]
+    outputs += [get_preview_dst(file_dict, size)
+                for size in SETTINGS.get('preview_sizes') or []]
+    if SETTINGS.get('make_tiles', False):
+        outputs.append(get_tiles_dst(file_dict))
+    if file_dict['filetype'] == 'flt':
+        outputs.append(file_dict['thumbnail_dst'])
+
+    file_mtime = os.path.getmtime(file_dict['filename'])
+    for output in outputs:
+        if not os.path.exists(output) or os.path.getmtime(output) < file_mtime:
+            return False
+
+    return True
+
+
+def make_images(file_dict, hdulist=None, force=False):
+    """Create the JPEG, the previews, the tiles (and, for ``flt`` files,
+    the Thumbnail) of the given file, if it is a ``raw``, ``flt``, or
+    ``flc`` file.  The smaller images are made from the JPEG while it
+    is still in memory.
+
+    Images that are newer than the file are not created again, unless
+    ``force`` is ``True``.
+
+    Parameters
+    ----------
+    file_dict : dict
+        A dictionary containing various data useful for the ingestion
+        process.
+    hdulist : obj, optional
+        An already-opened ``astropy.io.fits`` ``HDUList`` of the file.
+    force : bool, optional
+        If ``True``, create the images even if they are up to date.
+
+    Returns
+    -------
+    created : bool
+        ``True`` if images were created.
+    """
+
+    if file_dict['filetype'] not in ['raw', 'flt', 'flc']:
+        return False
+
+    if not force and images_are_current(file_dict):
+        logging.info('{}: Images of {} are up to date'\
+            .format(file_dict['rootname'], file_dict['basename']))
+        return False
+
+    with timed('jpeg'):
+        image = make_jpeg(file_dict, hdulist)
+    with timed('previews'):
+        make_previews(file_dict, image)
+    if SETTINGS.get('make_tiles', False):
+        with timed('tiles'):
+            make_tiles(file_dict, image)
+    if file_dict['filetype'] == 'flt':
+        with timed('thumbnail'):
+            make_thumbnail(file_dict, image)
+
+    return True
+
+
+def read_rootname(rootname_path, filetype='all', render_images=True,
+                  skip_filetypes=(), force=False):
+    """Read the files of the given rootname into database records,
+    without writing anything to the database.
+
+    Files that have not changed since they were last ingested (see
+    ``acsql.ingest.fingerprints``) are skipped, unless ``force`` is
+    ``True``.  If no file has changed, no records are returned at all.
 
     Parameters
     ----------
     rootname_path : str
         The path to the rootname directory in the MAST cache.
+    filetype : str
+        The filetype to ingest (e.g. ``flt``, or ``all``).
+    render_images : bool
+        If ``True``, JPEGs and Thumbnails are created while each file
+        is open.  If ``False``, the ``file_dict`` of each file that
+        needs images is returned instead, so that they can be created
+        later (see ``make_images()``).
+    skip_filetypes : list, optional
+        Filetypes (e.g. ``flt``) not to read, e.g. because they have
+        already been ingested.
+    force : bool, optional
+        If ``True``, read every file even if it has not changed.
+
+    Returns
+    -------
+    ingest_dict : dict
+        A dictionary containing the ``rootname`` and ``rootname_path``,
+        the ``records`` to write to the database as a ``RecordList``
+        (the ``master`` record first), the ``fingerprints`` records to
+        write once all of the ``records`` have been written, the
+        ``filetypes`` that were read (or are unchanged), the number of
+        files that were read (``num_files``), and the
+        ``image_file_dicts`` of files whose images still need to be
+        created.
     """
 
     rootname = os.path.basename(rootname_path)[:-1]
-    logging.info('{}: Begin ingestion'.format(rootname))
-
-    # Update the master table for the rootname
-    update_master_table(rootname_path)
+    records = RecordList()
+    fingerprint_records = RecordList()
+    filetypes = []
+    image_file_dicts = []
 
     if filetype == 'all':
         search = '*.fits'
     else:
         search = '*{}.fits'.format(filetype)
-    file_paths = glob.glob(os.path.join(rootname_path, search))
+    with timed('glob'):
+        all_file_paths = list_rootname_files(rootname_path)
+    file_paths = [item for item in all_file_paths
+                  if fnmatch.fnmatch(os.path.basename(item), search)]
+
+    # Only read the files that have changed since they were last ingested
+    fingerprints = {}
+    refreshed_fingerprints = []
+    dataset_file_dicts = []
+    with timed('fingerprints'):
+        if force:
+            stored_fingerprints = {}
+        else:
+            stored_fingerprints = get_fingerprints(rootname)
+        for filename in file_paths:
+            filetype = os.path.basename(filename).split('.')[0][10:]
+            if filetype not in VALID_FILETYPES or filetype in skip_filetypes:
+                continue
+
+            fingerprint = make_fingerprint(filename)
+            stored_fingerprint = stored_fingerprints.get(
+                fingerprint['filename'])
+            if not force and is_unchanged(filename, fingerprint,
+                                          stored_fingerprint):
+                filetypes.append(filetype)
+                if fingerprint['mtime'] != stored_fingerprint['mtime']:
+                    refreshed_fingerprints.append(fingerprint)
+            else:
+                fingerprints[filename] = fingerprint
+
+    if not fingerprints:
+        logging.info('{}: No changed files to ingest'.format(rootname))
+    else:
+        # Gather the information shared by all files of the rootname once
+        with timed('metadata'):
+            rootname_dict = make_rootname_dict(rootname_path, all_file_paths)
+            rootname_dict['proposal_type'] = get_proposal_type(
+                rootname_dict['proposid'])
+
+        # Update the master table for the rootname
+        update_master_table(rootname_dict, records)
+
+    # Record the new modification times of files whose contents have
+    # not changed
+    for fingerprint in refreshed_fingerprints:
+        fingerprint_records.add('Fingerprints', fingerprint)
 
-    for filename in file_paths:
+    for filename, fingerprint in fingerprints.items():
         filetype = os.path.basename(filename).split('.')[0][10:]
-        if filetype in VALID_FILETYPES:
+        filetypes.append(filetype)
 
-            # Make dictionary that holds all the information you would ever
-            # want about the file
-            file_dict = make_file_dict(filename)
+        # Make dictionary that holds all the information you would ever
+        # want about the file
+        file_dict = make_file_dict(filename, rootname_dict)
 
-            # Update header tables
-            if 'file_exts' in file_dict:
-                for ext in file_dict['file_exts']:
-                    update_header_table(file_dict, ext)
+        # Update header tables, opening the file only once
+        if 'file_exts' in file_dict:
+            with fits.open(file_dict['filename']) as hdulist:
+                with timed('header_read'):
+                    headers = get_ingestable_headers(file_dict, hdulist)
+                with timed('row_build'):
+                    for ext, header in headers.items():
+                        update_header_table(file_dict, ext, header, records)
 
-                # Update datasets table
-                update_datasets_table(file_dict)
+                dataset_file_dicts.append(file_dict)
 
                 # Make JPEGs and Thumbnails
-                if file_dict['filetype'] in ['raw', 'flt', 'flc']:
-                    make_jpeg(file_dict)
-                if file_dict['filetype'] == 'flt':
-                    make_thumbnail(file_dict)
+                if render_images:
+                    make_images(file_dict, hdulist, force=force)
+                elif file_dict['filetype'] in ['raw', 'flt', 'flc']:
+                    image_file_dicts.append(file_dict)
+
+                # Record the fingerprint once the file has been read
+                add_checksums(fingerprint, hdulist[0].header)
+                fingerprint_records.add('Fingerprints', fingerprint)
+
+    # Update the datasets table once for all of the files
+    update_datasets_table(rootname, dataset_file_dicts, records)
+
+    ingest_dict = {'rootname': rootname,
+                   'rootname_path': rootname_path,
+                   'records': records,
+                   'fingerprints': fingerprint_records,
+                   'filetypes': filetypes,
+                   'num_files': len(dataset_file_dicts),
+                   'image_file_dicts': image_file_dicts}
+
+    return ingest_dict
+
+
+def write_records(records, writer):
+    """Add the given ``records`` to the given ``writer``.
+
+    Parameters
+    ----------
+    records : list
+        A list of ``(table, data_dict)`` pairs, as returned by
+        ``read_rootname()``.
+    writer : obj
+        The ``BulkInsertWriter`` to add the records to.
+    """
+
+    for table, data_dict in records:
+        writer.add(table, data_dict)
+
+
+def _get_filetype(filename):
+    """Return the filetype of the given file.
+
+    Parameters
+    ----------
+    filename : str
+        The path to, or name of, the file (e.g.
+        ``jbm110u2q_flt.fits``).
+
+    Returns
+    -------
+    filetype : str
+        The filetype (e.g. ``flt``).
+    """
+
+    return os.path.basename(filename).split('.')[0][10:]
+
+
+class IngestWriter(object):
+    """Writes the records of many rootnames to the database in batches.
+
+    The records of each rootname (as returned by ``read_rootname()``)
+    are buffered in a ``BulkInsertWriter`` together with those of the
+    other rootnames, and are written once ``batch_size`` records have
+    been buffered, or when ``flush()`` is called.  Only once the
+    records of a rootname have been written are its fingerprints
+    written and the rootname marked as complete in the journal, so
+    that a rootname whose records could not be written is ingested
+    again by the next (or resumed) run.
+
+    Callers must call ``flush()`` once they are done adding rootnames.
+
+    Parameters
+    ----------
+    journal_file : str, optional
+        The path to the journal of the ingestion run (see
+        ``acsql.ingest.journal``).
+    batch_size : int, optional
+        The number of records to buffer before writing.  If not
+        provided, the ``batch_size`` setting of the config file is used
+        (see ``acsql.utils.utils.BulkInsertWriter``).
+    """
+
+    def __init__(self, journal_file=None, batch_size=None):
+
+        self.writer = BulkInsertWriter(batch_size)
+        self.journal_file = journal_file
+        self.pending = []
+        self.num_records = 0
+
+    def add(self, ingest_dict):
+        """Buffer the records of a rootname, writing the buffered
+        records if there are ``batch_size`` of them.
+
+        Parameters
+        ----------
+        ingest_dict : dict
+            The records of the rootname, as returned by
+            ``read_rootname()``.
+        """
+
+        try:
+            write_records(ingest_dict['records'], self.writer)
+        except Exception as e:
+            # The writer keeps track of the pending rootnames whose
+            # records were lost with the batch
+            logging.warning('{}: Unable to write records: {}'\
+                .format(ingest_dict['rootname'], e))
+            return
+
+        self.pending.append(ingest_dict)
+        self.num_records += len(ingest_dict['records'])
+        if self.num_records >= self.writer.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write everything that is buffered, then the fingerprints of
+        the pending rootnames, and mark the pending rootnames as
+        complete in the journal.
+
+        If some of the records of a rootname could not be written, only
+        the filetypes whose records were all written get fingerprints
+        and are marked as complete, and the rootname itself is not.  If
+        a record that is shared by all of the filetypes (e.g. of the
+        ``master`` table) could not be written, no filetype is.
+        """
+
+        if not self.pending and not self.writer.records:
+            return
+
+        with timed('db_write'):
+            failed = self._write_buffered()
+
+            # Only record the fingerprints of the filetypes that were
+            # written
+            try:
+                for ingest_dict in self.pending:
+                    failed_filetypes = failed.get(ingest_dict['rootname'],
+                                                  set())
+                    if None in failed_filetypes:
+                        continue
+                    for table, fingerprint in ingest_dict['fingerprints']:
+                        if _get_filetype(fingerprint['filename']) \
+                                not in failed_filetypes:
+                            self.writer.add(table, fingerprint)
+            except Exception as e:
+                # The writer keeps track of the fingerprints that were
+                # lost with the batch
+                logging.warning('Unable to write fingerprints: {}'.format(e))
+            for rootname, filetypes in self._write_buffered().items():
+                failed.setdefault(rootname, set()).update(filetypes)
+
+        for ingest_dict in self.pending:
+            failed_filetypes = failed.get(ingest_dict['rootname'])
+            if not failed_filetypes:
+                if self.journal_file:
+                    journal.mark_complete(self.journal_file,
+                                          ingest_dict['rootname_path'],
+                                          ingest_dict['filetypes'])
+                continue
+
+            logging.warning('{}: Not all records could be written'\
+                .format(ingest_dict['rootname']))
+            if self.journal_file and None not in failed_filetypes:
+                journal.mark_filetypes_complete(
+                    self.journal_file, ingest_dict['rootname_path'],
+                    [filetype for filetype in ingest_dict['filetypes']
+                     if filetype not in failed_filetypes])
+
+        self.pending = []
+        self.num_records = 0
+
+    def _write_buffered(self):
+        """Write everything that is buffered, and return the filetypes
+        whose records could not be written.
+
+        Returns
+        -------
+        failed : dict
+            A dictionary whose keys are rootnames and whose values are
+            the sets of filetypes (e.g. ``flt``) that have records that
+            could not be written.  A ``None`` filetype means that a
+            record shared by all filetypes could not be written.
+        """
+
+        try:
+            self.writer.flush()
+        except Exception as e:
+            # Everything that was buffered was written in one
+            # transaction, so none of the pending rootnames were written
+            logging.warning('Unable to write records: {}'.format(e))
+            self.writer.pop_failed()
+            return dict([(ingest_dict['rootname'], set([None]))
+                         for ingest_dict in self.pending])
+
+        failed = {}
+        for table, data_dict in self.writer.pop_failed():
+            if table == 'Fingerprints':
+                filetype = _get_filetype(data_dict['filename'])
+            elif table.count('_') == 2:
+                filetype = table.split('_')[1]
+            else:
+                filetype = None
+            failed.setdefault(data_dict['rootname'], set()).add(filetype)
+
+        return failed
+
+
+def ingest(rootname_path, filetype='all', journal_file=None, force=False,
+           writer=None):
+    """The main function of the ingest module.  Ingest a given rootname
+    (and its associated files) into the various tables of the ``acsql``
+    database.
+
+    The records of the rootname are added to the given ``writer``,
+    which writes them in batches together with those of other
+    rootnames.  If no ``writer`` is given, the records are written
+    before returning.
+
+    If for some reason the file is unable to be ingested, a warning is
+    logged.
+
+    Parameters
+    ----------
+    rootname_path : str
+        The path to the rootname directory in the MAST cache.
+    filetype : str
+        The filetype to ingest (e.g. ``flt``, or ``all``).
+    journal_file : str, optional
+        The path to the journal of the ingestion run (see
+        ``acsql.ingest.journal``).  If provided, filetypes that the
+        journal lists as already ingested are skipped, and the progress
+        of the rootname is recorded in it.
+    force : bool, optional
+        If ``True``, ingest every file of the rootname, even those that
+        have not changed since they were last ingested.
+    writer : obj, optional
+        The ``IngestWriter`` to add the records to, e.g. one that is
+        shared by all of the rootnames of a worker process.  It must be
+        for the same ``journal_file``.
+
+    Returns
+    -------
+    num_files : int
+        The number of files of the rootname that were read and ingested.
+        Files that have not changed since they were last ingested are
+        not counted.
+    """
+
+    rootname = os.path.basename(rootname_path)[:-1]
+    logging.info('{}: Begin ingestion'.format(rootname))
+
+    skip_filetypes = set()
+    if journal_file:
+        skip_filetypes = journal.get_completed_filetypes(journal_file,
+                                                         rootname_path)
+        journal.mark_started(journal_file, rootname_path)
+
+    # Images may be left to the make_images script instead
+    ingest_dict = read_rootname(
+        rootname_path, filetype,
+        render_images=not SETTINGS.get('defer_images', False),
+        skip_filetypes=skip_filetypes, force=force)
+
+    # Records are buffered and written together
+    if writer is None:
+        writer = IngestWriter(journal_file)
+        writer.add(ingest_dict)
+        writer.flush()
+    else:
+        writer.add(ingest_dict)
 
     logging.info('{}: End ingestion'.format(rootname))
+
+    return ingest_dict['num_files']
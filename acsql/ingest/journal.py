@@ -0,0 +1,286 @@
+"""Record the progress of an ingestion run in a durable journal, so that
+an interrupted run can be resumed.
+
+The journal is a ``SQLite`` file that holds the list of rootnames and
+the ``filetype`` of the run, as well as the status of each rootname and
+of each of its filetypes.  A rootname is marked as ``started`` before
+it is ingested, each of its filetypes is marked as ``complete`` once
+its records have been written to the database, and the rootname itself
+is marked as ``complete`` once all of its filetypes are.
+
+When a run is resumed, rootnames that are ``complete`` are skipped, and
+rootnames that were only partially ingested are ingested again,
+skipping the filetypes that are already ``complete``.
+
+Authors
+-------
+    Matthew Bourque
+
+Use
+---
+    This module is intended to be imported from and used by the
+    ``ingest_production`` script and ``acsql.ingest.ingest.py`` as
+    such:
+    ::
+
+        from acsql.ingest import journal
+
+        journal.create_journal(journal_file, rootname_paths, filetype)
+        rootname_paths, filetype, manifest = journal.load_journal(journal_file)
+        rootname_paths = journal.get_unfinished_rootnames(journal_file)
+
+Dependencies
+------------
+    External library dependencies include:
+
+    - ``acsql``
+"""
+
+import json
+import os
+import sqlite3
+import time
+
+# The pseudo-filetype used to record the status of the rootname as a
+# whole
+ROOTNAME_STATUS = '*'
+
+
+def _connect(journal_file):
+    """Return a connection to the given ``journal_file``, creating its
+    tables if necessary.
+
+    Parameters
+    ----------
+    journal_file : str
+        The path to the journal file.
+
+    Returns
+    -------
+    connection : obj
+        A ``sqlite3`` ``Connection`` to the journal file.
+    """
+
+    connection = sqlite3.connect(journal_file, timeout=60)
+    with connection:
+        connection.execute('CREATE TABLE IF NOT EXISTS run '
+                           '(key TEXT PRIMARY KEY, value TEXT)')
+        connection.execute('CREATE TABLE IF NOT EXISTS rootnames '
+                           '(position INTEGER PRIMARY KEY, '
+                           'rootname_path TEXT UNIQUE)')
+        connection.execute('CREATE TABLE IF NOT EXISTS progress '
+                           '(rootname_path TEXT, filetype TEXT, status TEXT, '
+                           'updated REAL, PRIMARY KEY (rootname_path, '
+                           'filetype))')
+
+    return connection
+
+
+def create_journal(journal_file, rootname_paths, filetype, manifest=None):
+    """Create a journal for a run that ingests the given rootnames.
+
+    Parameters
+    ----------
+    journal_file : str
+        The path to the journal file.
+    rootname_paths : list
+        The paths to the rootname directories that are to be ingested.
+    filetype : str
+        The filetype to ingest (e.g. ``flt``, or ``all``).
+    manifest : dict, optional
+        The scan manifest to save once the run is complete (see
+        ``acsql.ingest.scan_manifest``).
+
+    Raises
+    ------
+    FileExistsError
+        If the ``journal_file`` already exists, e.g. because it belongs
+        to another run.
+    """
+
+    # Create the file exclusively, so that two runs can never share it
+    os.close(os.open(journal_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+
+    connection = _connect(journal_file)
+    try:
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO run VALUES (?, ?)',
+                               ('filetype', filetype))
+            connection.execute('INSERT OR REPLACE INTO run VALUES (?, ?)',
+                               ('manifest', json.dumps(manifest)))
+            connection.executemany(
+                'INSERT OR IGNORE INTO rootnames (rootname_path) VALUES (?)',
+                [(rootname_path,) for rootname_path in rootname_paths])
+    finally:
+        connection.close()
+
+
+def load_journal(journal_file):
+    """Return the rootnames, ``filetype``, and scan manifest of the run
+    recorded in the given ``journal_file``.
+
+    Parameters
+    ----------
+    journal_file : str
+        The path to the journal file.
+
+    Returns
+    -------
+    rootname_paths : list
+        The paths to the rootname directories of the run.
+    filetype : str
+        The filetype of the run (e.g. ``flt``, or ``all``).
+    manifest : dict or None
+        The scan manifest to save once the run is complete.
+    """
+
+    connection = _connect(journal_file)
+    try:
+        run = dict(connection.execute('SELECT key, value FROM run').fetchall())
+        results = connection.execute('SELECT rootname_path FROM rootnames '
+                                     'ORDER BY position').fetchall()
+    finally:
+        connection.close()
+
+    rootname_paths = [item[0] for item in results]
+    manifest = json.loads(run.get('manifest', 'null'))
+
+    return rootname_paths, run['filetype'], manifest
+
+
+def get_completed_filetypes(journal_file, rootname_path):
+    """Return the filetypes of the given rootname that have already been
+    ingested.
+
+    Parameters
+    ----------
+    journal_file : str
+        The path to the journal file.
+    rootname_path : str
+        The path to the rootname directory.
+
+    Returns
+    -------
+    filetypes : set
+        The filetypes (e.g. ``flt``) that are ``complete``.
+    """
+
+    connection = _connect(journal_file)
+    try:
+        results = connection.execute(
+            'SELECT filetype FROM progress WHERE rootname_path = ? AND '
+            'status = ? AND filetype != ?',
+            (rootname_path, 'complete', ROOTNAME_STATUS)).fetchall()
+    finally:
+        connection.close()
+
+    filetypes = set([item[0] for item in results])
+
+    return filetypes
+
+
+def get_unfinished_rootnames(journal_file):
+    """Return the rootnames of the run that have not been completely
+    ingested yet.
+
+    Parameters
+    ----------
+    journal_file : str
+        The path to the journal file.
+
+    Returns
+    -------
+    rootname_paths : list
+        The paths to the rootname directories that have either not been
+        started or were only partially ingested.
+    """
+
+    connection = _connect(journal_file)
+    try:
+        results = connection.execute(
+            'SELECT rootname_path FROM rootnames WHERE rootname_path NOT IN '
+            '(SELECT rootname_path FROM progress WHERE filetype = ? AND '
+            'status = ?) ORDER BY position',
+            (ROOTNAME_STATUS, 'complete')).fetchall()
+    finally:
+        connection.close()
+
+    rootname_paths = [item[0] for item in results]
+
+    return rootname_paths
+
+
+def mark_started(journal_file, rootname_path):
+    """Record that the ingestion of the given rootname has started.
+
+    Parameters
+    ----------
+    journal_file : str
+        The path to the journal file.
+    rootname_path : str
+        The path to the rootname directory.
+    """
+
+    _mark(journal_file, rootname_path, [ROOTNAME_STATUS], 'started')
+
+
+def mark_complete(journal_file, rootname_path, filetypes):
+    """Record that the given ``filetypes`` of the given rootname, and
+    therefore the rootname itself, have been ingested.
+
+    Parameters
+    ----------
+    journal_file : str
+        The path to the journal file.
+    rootname_path : str
+        The path to the rootname directory.
+    filetypes : list
+        The filetypes (e.g. ``flt``) that have been ingested.
+    """
+
+    _mark(journal_file, rootname_path, list(filetypes) + [ROOTNAME_STATUS],
+          'complete')
+
+
+def mark_filetypes_complete(journal_file, rootname_path, filetypes):
+    """Record that the given ``filetypes`` of the given rootname have
+    been ingested, while its other filetypes have not.
+
+    Parameters
+    ----------
+    journal_file : str
+        The path to the journal file.
+    rootname_path : str
+        The path to the rootname directory.
+    filetypes : list
+        The filetypes (e.g. ``flt``) that have been ingested.
+    """
+
+    _mark(journal_file, rootname_path, filetypes, 'complete')
+
+
+def _mark(journal_file, rootname_path, filetypes, status):
+    """Set the ``status`` of the given ``filetypes`` of the given
+    rootname.
+
+    Parameters
+    ----------
+    journal_file : str
+        The path to the journal file.
+    rootname_path : str
+        The path to the rootname directory.
+    filetypes : list
+        The filetypes (e.g. ``flt``) to set the status of.
+    status : str
+        The status (e.g. ``complete``).
+    """
+
+    connection = _connect(journal_file)
+    try:
+        with connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO progress VALUES (?, ?, ?, ?)',
+                [(rootname_path, filetype, status, time.time())
+                 for filetype in filetypes])
+    finally:
+        connection.close()
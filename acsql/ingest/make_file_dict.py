@@ -6,6 +6,11 @@ The ``file_dict`` contains various information that can be used by
 be used as a data container that can be easily passed around to various
 functions.
 
+Similarly, the ``rootname_dict`` holds the information that is shared
+by every file of a rootname (e.g. the directory listing, ``detector``,
+and ``proposid``), so that it only has to be determined once per
+rootname rather than once per file.
+
 Authors
 -------
     Matthew Bourque
@@ -20,8 +25,10 @@ Use
         from ascql.ingest.make_file_dict import get_metadata_from_test_files
         from ascql.ingest.make_file_dict import get_proposid
         from acsql.ingest.make_file_dict import make_file_dict
+        from acsql.ingest.make_file_dict import make_rootname_dict
 
-        make_file_dict(filename)
+        rootname_dict = make_rootname_dict(rootname_path)
+        make_file_dict(filename, rootname_dict)
         get_detector(filename)
         get_metadata_from_test_files(rootname_path, keyword)
         get_proposid(filename)
@@ -33,7 +40,6 @@ Dependencies
     - ``astropy``
 """
 
-import glob
 import logging
 import os
 
@@ -71,7 +77,7 @@ def get_detector(filename):
     return detector
 
 
-def get_metadata_from_test_files(rootname_path, keyword):
+def get_metadata_from_test_files(rootname_path, keyword, file_paths=None):
     """Return the value of the given ``keyword`` and ``rootname_path``.
 
     The given ``rootname_path`` is checked for various filetypes that
@@ -91,6 +97,10 @@ def get_metadata_from_test_files(rootname_path, keyword):
     keyword : str
         The header keyword to determine the value of (e.g.
         ``detector``)
+    file_paths : list, optional
+        The paths to the files in ``rootname_path``.  If provided, the
+        candidate files are taken from this list instead of listing
+        the directory again.
 
     Returns
     -------
@@ -98,13 +108,13 @@ def get_metadata_from_test_files(rootname_path, keyword):
         The header keyword value.
     """
 
-    raw = glob.glob(os.path.join(rootname_path, '*raw.fits'))
-    flt = glob.glob(os.path.join(rootname_path, '*flt.fits'))
-    spt = glob.glob(os.path.join(rootname_path, '*spt.fits'))
-    drz = glob.glob(os.path.join(rootname_path, '*drz.fits'))
-    jit = glob.glob(os.path.join(rootname_path, '*jit.fits'))
+    if file_paths is None:
+        file_paths = list_rootname_files(rootname_path)
 
-    for test_files in [raw, flt, spt, drz, jit]:
+    value = None
+    for filetype in ['raw', 'flt', 'spt', 'drz', 'jit']:
+        test_files = [item for item in file_paths
+                      if item.endswith('{}.fits'.format(filetype))]
         try:
             test_file = test_files[0]
             if keyword == 'detector':
@@ -142,7 +152,29 @@ def get_proposid(filename):
     return proposid
 
 
-def make_file_dict(filename):
+def list_rootname_files(rootname_path):
+    """Return the paths to the FITS files that exist in the given
+    ``rootname_path``.
+
+    Parameters
+    ----------
+    rootname_path : str
+        The path to the rootname in the MAST cache.
+
+    Returns
+    -------
+    file_paths : list
+        The sorted paths to the FITS files in ``rootname_path``.
+    """
+
+    file_paths = [os.path.join(rootname_path, item)
+                  for item in os.listdir(rootname_path)
+                  if item.endswith('.fits')]
+
+    return sorted(file_paths)
+
+
+def make_file_dict(filename, rootname_dict=None):
     """Create a dictionary that holds information that is useful for
     the ingestion process.  This dictionary can then be passed around
     the various functions of the module.
@@ -151,6 +183,11 @@ def make_file_dict(filename):
     ----------
     filename : str
         The path to the file.
+    rootname_dict : dict, optional
+        The dictionary returned by ``make_rootname_dict`` for the
+        rootname of the file.  If provided, the ``detector`` and
+        ``proposid`` are taken from it instead of being determined
+        from the filesystem again.
 
     Returns
     -------
@@ -169,10 +206,12 @@ def make_file_dict(filename):
     file_dict['full_rootname'] = file_dict['basename'].split('_')[0]
     file_dict['filetype'] = file_dict['basename'].split('.fits')[0].split('_')[-1]
     file_dict['proposid'] = file_dict['basename'][0:4]
-    file_dict['proposid_int'] = get_metadata_from_test_files(file_dict['dirname'], 'proposid')
 
     # Metadata kewords
-    file_dict['detector'] = get_metadata_from_test_files(file_dict['dirname'], 'detector')
+    if rootname_dict is None:
+        rootname_dict = make_rootname_dict(file_dict['dirname'])
+    file_dict['proposid_int'] = rootname_dict['proposid']
+    file_dict['detector'] = rootname_dict['detector']
     if file_dict['detector']:
         file_dict['file_exts'] = getattr(utils, '{}_FILE_EXTS'.format(file_dict['detector'].upper()))[file_dict['filetype']]
 
@@ -189,3 +228,41 @@ def make_file_dict(filename):
         file_dict['thumbnail_dst'] = None
 
     return file_dict
+
+
+def make_rootname_dict(rootname_path, file_paths=None):
+    """Create a dictionary that holds information that is shared by
+    every file of the given rootname.
+
+    The directory is listed once and the ``detector`` and ``proposid``
+    are determined once, so that each ``file_dict`` of the rootname
+    can be built without touching the filesystem again.
+
+    Parameters
+    ----------
+    rootname_path : str
+        The path to the rootname directory in the MAST cache.
+    file_paths : list, optional
+        The paths to the FITS files in ``rootname_path``, if they have
+        already been listed.
+
+    Returns
+    -------
+    rootname_dict : dict
+        A dictionary containing various data useful for the ingestion
+        process of the rootname.
+    """
+
+    rootname_dict = {}
+    rootname_dict['rootname_path'] = rootname_path
+    rootname_dict['rootname'] = os.path.basename(rootname_path)[:-1]
+    rootname_dict['path'] = rootname_path[-15:]
+    if file_paths is None:
+        file_paths = list_rootname_files(rootname_path)
+    rootname_dict['file_paths'] = file_paths
+    rootname_dict['proposid'] = get_metadata_from_test_files(
+        rootname_path, 'proposid', rootname_dict['file_paths'])
+    rootname_dict['detector'] = get_metadata_from_test_files(
+        rootname_path, 'detector', rootname_dict['file_paths'])
+
+    return rootname_dict
@@ -4,6 +4,11 @@ A JPEG is created for every ``raw``, ``flt``, and ``flc`` file and is
 placed into the ``acsql`` filesystem of JPEGs.  The JPEGs are then
 used by the ``acsql`` web application to easily view ACS observaitons.
 
+To keep the memory used per image low, the FITS data are
+memory-mapped and copied into a single ``float32`` array, the clipping
+levels are estimated from a strided sample of the pixels, and the image
+is scaled in place.
+
 Authors
 -------
     Matthew Bourque
@@ -15,7 +20,14 @@ Use
     ::
 
         from acsql.ingest.make_jpeg import make_jpeg
-        make_jpeg(file_dict)
+        image = make_jpeg(file_dict)
+
+    If the file is already open (e.g. during ingestion), its
+    ``HDUList`` can be passed along so that the file is not opened
+    again:
+    ::
+
+        make_jpeg(file_dict, hdulist)
 
 Dependencies
 ------------
@@ -33,55 +45,132 @@ from astropy.io import fits
 import numpy as np
 from PIL import Image
 
+# The approximate number of pixels sampled to determine the clipping
+# levels of an image
+SAMPLE_SIZE = 1000000
+
+
+def get_clip_levels(data):
+    """Return the 1st and 99th percentiles of the given ``data``,
+    estimated from a strided sample of its pixels.
+
+    Parameters
+    ----------
+    data : obj
+        The 2D ``numpy`` array of the image.
+
+    Returns
+    -------
+    bottom : float
+        The estimated 1st percentile.
+    top : float
+        The estimated 99th percentile.
+    """
+
+    step = max(1, int(np.sqrt(data.size / SAMPLE_SIZE)))
+    sample = data[::step, ::step]
+    bottom, top = np.percentile(sample, [1, 99])
+
+    return bottom, top
+
+
+def read_image(hdulist):
+    """Return the science data of the given ``hdulist`` as a single
+    ``float32`` array.
+
+    The science extensions are copied straight into one preallocated
+    array, so that the full-frame WFC chips are combined without any
+    intermediate full-size arrays.
+
+    Parameters
+    ----------
+    hdulist : obj
+        The ``astropy.io.fits`` ``HDUList`` of the file.
+
+    Returns
+    -------
+    data : obj
+        The 2D ``float32`` ``numpy`` array of the image.
+    """
+
+    extensions = [1]
+
+    # If the image is full-frame WFC, add on the other extension
+    if len(hdulist) > 4 and hdulist[0].header['detector'] == 'WFC':
+        if hdulist[4].header['EXTNAME'] == 'SCI':
+            extensions.append(4)
+
+    shapes = [hdulist[ext].data.shape for ext in extensions]
+    height = sum([shape[0] for shape in shapes])
+    data = np.empty((height, shapes[0][1]), dtype=np.float32)
 
-def make_jpeg(file_dict):
+    row = 0
+    for ext, shape in zip(extensions, shapes):
+        np.copyto(data[row:row + shape[0], :], hdulist[ext].data,
+                  casting='unsafe')
+        row += shape[0]
+
+    return data
+
+
+def make_jpeg(file_dict, hdulist=None):
     """Creates a JPEG for the given file.
 
+    The file is memory-mapped, and the image is clipped at its 1st and
+    99th percentiles and scaled in place, to keep the memory used per
+    image low.
+
     Parameters
     ----------
     file_dict : dict
         A dictionary containing various data useful for the ingestion
         process.
+    hdulist : obj, optional
+        An already-opened ``astropy.io.fits`` ``HDUList`` of the file.
+        If not provided, the file is opened (and closed) here.
+
+    Returns
+    -------
+    image : obj
+        The ``PIL`` ``Image`` of the JPEG, from which smaller images
+        can be made (see ``acsql.ingest.make_thumbnail``).
     """
 
     logging.info('{}: Creating JPEG'.format(file_dict['rootname']))
 
-    hdulist = fits.open(file_dict['filename'], mode='readonly')
-    data = hdulist[1].data
-
-    # If the image is full-frame WFC, add on the other extension
-    if len(hdulist) > 4 and hdulist[0].header['detector'] == 'WFC':
-        if hdulist[4].header['EXTNAME'] == 'SCI':
-            data2 = hdulist[4].data
-            height = data.shape[0] + data2.shape[0]
-            width = data.shape[1]
-            new_array = np.zeros((height, width))
-            new_array[0:int(height/2), :] = data
-            new_array[int(height/2):height, :] = data2
-            data = new_array
+    close_hdulist = hdulist is None
+    if close_hdulist:
+        hdulist = fits.open(file_dict['filename'], mode='readonly',
+                            memmap=True)
+    try:
+        data = read_image(hdulist)
+    finally:
+        # Close the hdulist if it was opened here
+        if close_hdulist:
+            hdulist.close()
 
     # Clip the top and bottom 1% of pixels.
-    top = np.percentile(data, 99)
-    data[data > top] = top
-    bottom = np.percentile(data, 1)
-    data[data < bottom] = bottom
+    bottom, top = get_clip_levels(data)
+    np.clip(data, bottom, top, out=data)
 
     # Scale the data.
-    data = data - data.min()
-    data = (data / data.max()) * 255.
-    data = np.flipud(data)
-    data = np.uint8(data)
+    data -= bottom
+    if top > bottom:
+        data *= 255. / (top - bottom)
+    data = np.flipud(data).astype(np.uint8)
 
     # Create parent JPEG directory if necessary
     jpg_dir = os.path.dirname(file_dict['jpg_dst'])
     if not os.path.exists(jpg_dir):
-        os.makedirs(jpg_dir)
-        logging.info('{}: Created directory {}'\
-            .format(file_dict['rootname'], jpg_dir))
+        try:
+            os.makedirs(jpg_dir)
+            logging.info('{}: Created directory {}'\
+                .format(file_dict['rootname'], jpg_dir))
+        except FileExistsError:
+            pass
 
     # Write the image to a JPEG
     image = Image.fromarray(data)
     image.save(file_dict['jpg_dst'])
 
-    # Close the hdulist
-    hdulist.close()
+    return image
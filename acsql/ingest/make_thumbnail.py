@@ -1,11 +1,20 @@
-"""Create a "Quicklook" Thumbail for the given observation.
+"""Create a "Quicklook" Thumbail (and optional preview images) for the
+given observation.
 
-A Thumbail image is created from a given JPEG file (see module
+A Thumbail image is created from a given JPEG image (see module
 documentation for ``make_jpeg.py`` for further details). A
 thumbnail is a JPEG image reduced to 128 x 128 pixel size.  The
 thumbails are used by the ``acsql`` web application for quickly viewing
 many JPEGs.
 
+Preview images of intermediate sizes can also be created by listing
+their (maximum) sizes in pixels in the ``preview_sizes`` config file
+setting.  Previews are written to ``<size>/`` subdirectories of the
+proposal directory of the JPEG.
+
+The thumbnail and previews are made from the in-memory image that
+``make_jpeg`` returns, so that the JPEG does not have to be read again.
+
 Authors
 -------
     Matthew Bourque
@@ -17,7 +26,7 @@ Use
     ::
 
         from acsql.ingest.make_thumbnail import make_thumbnail
-        make_thumbnail(file_dict)
+        make_thumbnail(file_dict, image)
 
 Dependencies
 ------------
@@ -28,37 +37,133 @@ Dependencies
 
 import logging
 import os
-import shutil
 
 from PIL import Image
 
+from acsql.utils.utils import SETTINGS
+
+# The maximum width and height of a Thumbnail
+THUMBNAIL_SIZE = 128
 
-def make_thumbnail(file_dict):
-    """Creates a 128 x 128 pixel 'thumbnail' JPEG for the given file.
+
+def _make_directory(file_dict, dst):
+    """Create the parent directory of the given ``dst`` if necessary.
 
     Parameters
     ----------
     file_dict : dict
         A dictionary containing various data useful for the ingestion
         process.
+    dst : str
+        The path to the image that will be written.
     """
 
-    logging.info('{}: Creating Thumbnail'.format(file_dict['rootname']))
-
-    # Create parent Thumbnail directory if necessary
-    thumb_dir = os.path.dirname(file_dict['thumbnail_dst'])
-    if not os.path.exists(thumb_dir):
+    directory = os.path.dirname(dst)
+    if not os.path.exists(directory):
         try:
-            os.makedirs(thumb_dir)
+            os.makedirs(directory)
             logging.info('{}: Created directory {}'\
-                .format(file_dict['rootname'], thumb_dir))
+                .format(file_dict['rootname'], directory))
         except FileExistsError:
             pass
 
-    # Make a copy of the JPEG in the thumbnail directory
-    shutil.copyfile(file_dict['jpg_dst'], file_dict['thumbnail_dst'])
 
-    # Open the copied JPEG and reduce its size
-    image = Image.open(file_dict['thumbnail_dst'])
-    image.thumbnail((128, 128), Image.ANTIALIAS)
-    image.save(file_dict['thumbnail_dst'], 'JPEG')
+def _reduce(file_dict, image, size):
+    """Return a copy of the given ``image`` reduced to fit within
+    ``size`` x ``size`` pixels.
+
+    Parameters
+    ----------
+    file_dict : dict
+        A dictionary containing various data useful for the ingestion
+        process.
+    image : obj or None
+        The ``PIL`` ``Image`` of the JPEG.  If ``None``, the JPEG is
+        read from ``jpg_dst``, letting the JPEG decoder do most of the
+        reduction.
+    size : int
+        The maximum width and height of the reduced image.
+
+    Returns
+    -------
+    reduced : obj
+        The reduced ``PIL`` ``Image``.
+    """
+
+    if image is None:
+        reduced = Image.open(file_dict['jpg_dst'])
+        reduced.draft(reduced.mode, (size, size))
+    else:
+        reduced = image.copy()
+    reduced.thumbnail((size, size), Image.LANCZOS)
+
+    return reduced
+
+
+def get_preview_dst(file_dict, size):
+    """Return the path to the preview image of the given ``size`` of
+    the given file.
+
+    Parameters
+    ----------
+    file_dict : dict
+        A dictionary containing various data useful for the ingestion
+        process.
+    size : int
+        The maximum width and height of the preview.
+
+    Returns
+    -------
+    preview_dst : str
+        The path to the preview image.
+    """
+
+    preview_dst = os.path.join(os.path.dirname(file_dict['jpg_dst']),
+                               str(size), file_dict['jpg_filename'])
+
+    return preview_dst
+
+
+def make_previews(file_dict, image=None):
+    """Creates a preview JPEG of each of the ``preview_sizes`` for the
+    given file.
+
+    Parameters
+    ----------
+    file_dict : dict
+        A dictionary containing various data useful for the ingestion
+        process.
+    image : obj, optional
+        The ``PIL`` ``Image`` of the JPEG, as returned by
+        ``make_jpeg``.  If not provided, the JPEG is read from disk.
+    """
+
+    for size in SETTINGS.get('preview_sizes') or []:
+        logging.info('{}: Creating {} pixel preview'\
+            .format(file_dict['rootname'], size))
+        preview_dst = get_preview_dst(file_dict, size)
+        _make_directory(file_dict, preview_dst)
+        _reduce(file_dict, image, size).save(preview_dst, 'JPEG')
+
+
+def make_thumbnail(file_dict, image=None):
+    """Creates a 128 x 128 pixel 'thumbnail' JPEG for the given file.
+
+    Parameters
+    ----------
+    file_dict : dict
+        A dictionary containing various data useful for the ingestion
+        process.
+    image : obj, optional
+        The ``PIL`` ``Image`` of the JPEG, as returned by
+        ``make_jpeg``.  If not provided, the JPEG is read from disk.
+    """
+
+    logging.info('{}: Creating Thumbnail'.format(file_dict['rootname']))
+
+    # Create parent Thumbnail directory if necessary
+    _make_directory(file_dict, file_dict['thumbnail_dst'])
+
+    # Reduce the size of the JPEG
+    thumbnail = _reduce(file_dict, image, THUMBNAIL_SIZE)
+    thumbnail.save(file_dict['thumbnail_dst'], 'JPEG')
@@ -0,0 +1,148 @@
+"""Create a multi-resolution tiled image pyramid for the given
+observation.
+
+A Deep Zoom Image (DZI) pyramid is created from a given JPEG image
+(see module documentation for ``make_jpeg.py`` for further details),
+so that the ``view_image`` page of the ``acsql`` web application only
+needs to load the tiles of the region and zoom level that are in view,
+rather than the full-resolution JPEG.
+
+The pyramid of ``<jpeg_dir>/<proposid>/<filename>.jpg`` is written to
+``<jpeg_dir>/<proposid>/tiles/``, as a ``<filename>.dzi`` descriptor
+and a ``<filename>_files/<level>/<column>_<row>.jpg`` tile layout.
+Level 0 is a single pixel and the highest level is the full-resolution
+image; each level is half the size of the next.
+
+Tiles are only created if the ``make_tiles`` config file setting is
+``True``.  The size of the tiles is set by the ``tile_size`` config
+file setting (default 254).
+
+Authors
+-------
+    Matthew Bourque
+
+Use
+---
+    This module is inteneded to be imported and used by
+    ``acsql.ingest.ingest.py`` as such:
+    ::
+
+        from acsql.ingest.make_tiles import make_tiles
+        make_tiles(file_dict, image)
+
+Dependencies
+------------
+    External library dependencies include:
+
+    - ``PIL``
+"""
+
+import logging
+import math
+import os
+
+from PIL import Image
+
+from acsql.utils.utils import SETTINGS
+
+# The default width and height of a tile, and the number of pixels that
+# neighbouring tiles overlap by
+DEFAULT_TILE_SIZE = 254
+TILE_OVERLAP = 1
+
+DZI_TEMPLATE = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" '
+                'Format="jpg" Overlap="{overlap}" TileSize="{tile_size}">\n'
+                '    <Size Width="{width}" Height="{height}"/>\n'
+                '</Image>\n')
+
+
+def get_tiles_dst(file_dict):
+    """Return the path to the DZI descriptor of the given file.
+
+    Parameters
+    ----------
+    file_dict : dict
+        A dictionary containing various data useful for the ingestion
+        process.
+
+    Returns
+    -------
+    tiles_dst : str
+        The path to the ``.dzi`` file.
+    """
+
+    tiles_dst = os.path.join(os.path.dirname(file_dict['jpg_dst']), 'tiles',
+                             file_dict['jpg_filename'].replace('.jpg', '.dzi'))
+
+    return tiles_dst
+
+
+def _save_level(image, level_dir, tile_size):
+    """Cut the given ``image`` into tiles and write them to the given
+    ``level_dir``.
+
+    Parameters
+    ----------
+    image : obj
+        The ``PIL`` ``Image`` of the level.
+    level_dir : str
+        The directory to write the tiles to.
+    tile_size : int
+        The width and height of a tile, not counting the overlap.
+    """
+
+    os.makedirs(level_dir, exist_ok=True)
+
+    width, height = image.size
+    for column in range(int(math.ceil(width / tile_size))):
+        for row in range(int(math.ceil(height / tile_size))):
+            left = max(column * tile_size - TILE_OVERLAP, 0)
+            top = max(row * tile_size - TILE_OVERLAP, 0)
+            right = min((column + 1) * tile_size + TILE_OVERLAP, width)
+            bottom = min((row + 1) * tile_size + TILE_OVERLAP, height)
+
+            tile = image.crop((left, top, right, bottom))
+            tile.save(os.path.join(level_dir, '{}_{}.jpg'.format(column, row)),
+                      'JPEG')
+
+
+def make_tiles(file_dict, image=None):
+    """Creates a Deep Zoom tile pyramid for the given file.
+
+    Parameters
+    ----------
+    file_dict : dict
+        A dictionary containing various data useful for the ingestion
+        process.
+    image : obj, optional
+        The ``PIL`` ``Image`` of the JPEG, as returned by
+        ``make_jpeg``.  If not provided, the JPEG is read from disk.
+    """
+
+    logging.info('{}: Creating tiles'.format(file_dict['rootname']))
+
+    if image is None:
+        image = Image.open(file_dict['jpg_dst'])
+
+    tile_size = SETTINGS.get('tile_size', DEFAULT_TILE_SIZE)
+    tiles_dst = get_tiles_dst(file_dict)
+    tiles_dir = tiles_dst.replace('.dzi', '_files')
+
+    # Write each level, halving the image from the full resolution down
+    # to a single pixel
+    width, height = image.size
+    max_level = int(math.ceil(math.log(max(width, height), 2)))
+    level_image = image
+    for level in range(max_level, -1, -1):
+        _save_level(level_image, os.path.join(tiles_dir, str(level)),
+                    tile_size)
+        level_size = (max(1, int(math.ceil(level_image.size[0] / 2.))),
+                      max(1, int(math.ceil(level_image.size[1] / 2.))))
+        level_image = level_image.resize(level_size, Image.BOX)
+
+    # Write the descriptor last, so that it only exists once all of the
+    # tiles do
+    with open(tiles_dst, 'w') as f:
+        f.write(DZI_TEMPLATE.format(overlap=TILE_OVERLAP, tile_size=tile_size,
+                                    width=width, height=height))
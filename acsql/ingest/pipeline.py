@@ -0,0 +1,401 @@
+"""Ingests many rootnames into the ``acsql`` database and filesystem
+using a staged producer/consumer pipeline.
+
+The ingestion is split into three stages that run in separate
+processes and are connected by bounded queues:
+
+    1. ``reader`` processes read the FITS files of each rootname and
+       parse their headers into plain database records (see
+       ``acsql.ingest.ingest.read_rootname``).
+    2. ``writer`` processes write the records to the database in
+       batches (see ``acsql.ingest.ingest.IngestWriter``).
+    3. ``image`` processes create the JPEGs and Thumbnails.
+
+This allows all processors to be used for parsing without opening as
+many simultaneous database connections, and keeps slow JPEG creation
+from delaying the availability of metadata in the database.
+
+The number of processes of each stage and the size of the queues are
+set by the ``nreaders`` (default ``ncores``), ``nwriters`` (default
+1), ``nimagers`` (default 1), and ``queue_size`` (default 100)
+config file settings.  If the ``defer_images`` setting is ``True``, no
+image processes are started, and the images are left to the
+``make_images`` script.
+
+If every process of a stage exits early (e.g. because it was killed),
+the pipeline is stopped rather than left waiting for it forever.  The
+rootnames that were not written are left unfinished in the journal, so
+that they are ingested when the run is resumed.
+
+Authors
+-------
+    Matthew Bourque
+
+Use
+---
+    This module is intended to be imported from and used by the
+    ``ingest_production`` script as such:
+    ::
+
+        from acsql.ingest.pipeline import run_pipeline
+        run_pipeline(rootname_paths, filetype)
+
+Dependencies
+------------
+    External library dependencies include:
+
+    - ``acsql``
+"""
+
+import logging
+import multiprocessing
+import queue
+
+from acsql.ingest import journal
+from acsql.ingest.ingest import IngestWriter
+from acsql.ingest.ingest import make_images
+from acsql.ingest.ingest import read_rootname
+from acsql.utils.timing import collect_timings
+from acsql.utils.timing import merge_timings
+from acsql.utils.utils import SETTINGS
+
+# The number of seconds a writer waits for new records before writing
+# what it has buffered so far
+WRITER_IDLE_TIMEOUT = 5
+
+
+def _check_stages(stages):
+    """Raise an exception if every process of any of the given
+    ``stages`` has exited.
+
+    Parameters
+    ----------
+    stages : dict
+        The ``multiprocessing.Process`` objects of each stage, keyed by
+        the name of the stage (e.g. ``writer``).
+
+    Raises
+    ------
+    RuntimeError
+        If a stage has no running process left.
+    """
+
+    for stage, processes in stages.items():
+        if processes and not any([process.is_alive() for process in processes]):
+            raise RuntimeError('Every {} process has exited'.format(stage))
+
+
+def _put(target_queue, item, stages=None, stop_event=None):
+    """Put the given ``item`` in the given ``target_queue``, waiting
+    for space only as long as each of the given ``stages`` is running
+    and the ``stop_event`` is not set.
+
+    Only the main process can tell whether the processes of a stage are
+    running, so the other stages rely on the ``stop_event``, which the
+    main process sets when it stops the pipeline.
+
+    Parameters
+    ----------
+    target_queue : obj
+        The ``multiprocessing.Queue`` to put the ``item`` in.
+    item : obj
+        The item to put in the queue.
+    stages : dict, optional
+        The ``multiprocessing.Process`` objects of each stage that must
+        be running for the ``item`` to be consumed, keyed by the name of
+        the stage.
+    stop_event : obj, optional
+        The ``multiprocessing.Event`` that is set when the pipeline is
+        stopped.
+
+    Raises
+    ------
+    RuntimeError
+        If a stage has no running process left, or the pipeline was
+        stopped.
+    """
+
+    while True:
+        try:
+            target_queue.put(item, timeout=WRITER_IDLE_TIMEOUT)
+            return
+        except queue.Full:
+            if stop_event is not None and stop_event.is_set():
+                raise RuntimeError('The pipeline was stopped')
+            _check_stages(stages or {})
+
+
+def _image_stage(image_queue, timing_queue):
+    """Create the JPEGs and Thumbnails of the ``file_dict`` objects in
+    the ``image_queue`` until a ``None`` is received.
+
+    Parameters
+    ----------
+    image_queue : obj
+        The ``multiprocessing.Queue`` of ``file_dict`` objects.
+    timing_queue : obj
+        The ``multiprocessing.Queue`` to put the timings of the stage
+        in once it is done (see ``acsql.utils.timing``).
+    """
+
+    while True:
+        file_dict = image_queue.get()
+        if file_dict is None:
+            break
+
+        try:
+            make_images(file_dict)
+        except Exception as e:
+            logging.warning('{}: Unable to create images for {}: {}'\
+                .format(file_dict['rootname'], file_dict['basename'], e))
+
+    timing_queue.put(collect_timings())
+
+
+def _receive_timings(timing_queue, processes, timings, stages=None):
+    """Receive the timings that each of the given ``processes`` sends
+    when it is done, and add them to the given ``timings``.
+
+    Processes that exit without sending their timings (e.g. because
+    they were killed) are given up on.
+
+    Parameters
+    ----------
+    timing_queue : obj
+        The ``multiprocessing.Queue`` that the processes put their
+        timings in.
+    processes : list
+        The ``multiprocessing.Process`` objects of the stage.
+    timings : dict
+        The timings to add to (see ``acsql.utils.timing``).
+    stages : dict, optional
+        The ``multiprocessing.Process`` objects of each stage that the
+        ``processes`` depend on, keyed by the name of the stage (see
+        ``_check_stages()``).
+    """
+
+    received = 0
+    while received < len(processes):
+        alive = any([process.is_alive() for process in processes])
+        try:
+            new_timings = timing_queue.get(timeout=WRITER_IDLE_TIMEOUT)
+        except queue.Empty:
+            if not alive:
+                logging.warning('{} processes exited without sending their '
+                                'timings'.format(len(processes) - received))
+                break
+            _check_stages(stages or {})
+            continue
+        merge_timings(timings, new_timings)
+        received += 1
+
+
+def _reader_stage(task_queue, record_queue, image_queue, timing_queue,
+                  stop_event, filetype, journal_file=None, force=False):
+    """Read the rootnames in the ``task_queue`` into database records
+    until a ``None`` is received.
+
+    Parameters
+    ----------
+    task_queue : obj
+        The ``multiprocessing.Queue`` of rootname paths to read.
+    record_queue : obj
+        The ``multiprocessing.Queue`` to put the records of each
+        rootname in.
+    image_queue : obj
+        The ``multiprocessing.Queue`` to put the ``file_dict`` objects
+        that need images in.
+    timing_queue : obj
+        The ``multiprocessing.Queue`` to put the timings of the stage
+        in once it is done (see ``acsql.utils.timing``).
+    stop_event : obj
+        The ``multiprocessing.Event`` that is set when the pipeline is
+        stopped, e.g. because the writers have exited.
+    filetype : str
+        The filetype to ingest (e.g. ``flt``, or ``all``).
+    journal_file : str, optional
+        The path to the journal of the ingestion run (see
+        ``acsql.ingest.journal``).
+    force : bool, optional
+        If ``True``, read every file even if it has not changed since
+        it was last ingested.
+    """
+
+    while True:
+        rootname_path = task_queue.get()
+        if rootname_path is None:
+            break
+
+        try:
+            skip_filetypes = set()
+            if journal_file:
+                skip_filetypes = journal.get_completed_filetypes(
+                    journal_file, rootname_path)
+                journal.mark_started(journal_file, rootname_path)
+            ingest_dict = read_rootname(rootname_path, filetype,
+                                        render_images=False,
+                                        skip_filetypes=skip_filetypes,
+                                        force=force)
+        except Exception as e:
+            logging.warning('Unable to read {}: {}'.format(rootname_path, e))
+            continue
+
+        # Images may be left to the make_images script instead
+        image_file_dicts = ingest_dict.pop('image_file_dicts')
+        try:
+            if not SETTINGS.get('defer_images', False):
+                for file_dict in image_file_dicts:
+                    _put(image_queue, file_dict, stop_event=stop_event)
+            _put(record_queue, ingest_dict, stop_event=stop_event)
+        except RuntimeError as e:
+            logging.warning('Stopping reader: {}'.format(e))
+            break
+
+    timing_queue.put(collect_timings())
+
+
+def _writer_stage(record_queue, timing_queue, journal_file=None):
+    """Write the records in the ``record_queue`` to the database until
+    a ``None`` is received.
+
+    Records are written in batches (see
+    ``acsql.ingest.ingest.IngestWriter``).  Whatever is buffered is
+    also written whenever no new records arrive for
+    ``WRITER_IDLE_TIMEOUT`` seconds.
+
+    Parameters
+    ----------
+    record_queue : obj
+        The ``multiprocessing.Queue`` of ``ingest_dict`` objects (see
+        ``acsql.ingest.ingest.read_rootname``) to write.
+    timing_queue : obj
+        The ``multiprocessing.Queue`` to put the timings of the stage
+        in once it is done (see ``acsql.utils.timing``).
+    journal_file : str, optional
+        The path to the journal of the ingestion run (see
+        ``acsql.ingest.journal``).  Rootnames are marked as complete
+        once all of their records have been written.
+    """
+
+    writer = IngestWriter(journal_file)
+
+    while True:
+        try:
+            ingest_dict = record_queue.get(timeout=WRITER_IDLE_TIMEOUT)
+        except queue.Empty:
+            writer.flush()
+            continue
+
+        if ingest_dict is None:
+            break
+
+        writer.add(ingest_dict)
+
+    writer.flush()
+    timing_queue.put(collect_timings())
+
+
+def run_pipeline(rootname_paths, filetype='all', journal_file=None,
+                 force=False):
+    """Ingest the given rootnames using the reader, writer, and image
+    stages.
+
+    Parameters
+    ----------
+    rootname_paths : list
+        The paths to the rootname directories in the MAST cache.
+    filetype : str
+        The filetype to ingest (e.g. ``flt``, or ``all``).
+    journal_file : str, optional
+        The path to the journal of the ingestion run (see
+        ``acsql.ingest.journal``).
+    force : bool, optional
+        If ``True``, ingest every file even if it has not changed since
+        it was last ingested.
+
+    Returns
+    -------
+    timings : dict
+        The timings of the stages of all of the processes (see
+        ``acsql.utils.timing``).
+
+    Raises
+    ------
+    RuntimeError
+        If every process of a stage exits before the pipeline is done.
+    """
+
+    nreaders = SETTINGS.get('nreaders') or SETTINGS['ncores']
+    nwriters = SETTINGS.get('nwriters', 1)
+    if SETTINGS.get('defer_images', False):
+        nimagers = 0
+    else:
+        nimagers = SETTINGS.get('nimagers', 1)
+    queue_size = SETTINGS.get('queue_size', 100)
+
+    task_queue = multiprocessing.Queue(queue_size)
+    record_queue = multiprocessing.Queue(queue_size)
+    image_queue = multiprocessing.Queue(queue_size)
+    timing_queue = multiprocessing.Queue()
+    stop_event = multiprocessing.Event()
+
+    readers = [multiprocessing.Process(
+        target=_reader_stage,
+        args=(task_queue, record_queue, image_queue, timing_queue, stop_event,
+              filetype, journal_file, force))
+        for i in range(nreaders)]
+    writers = [multiprocessing.Process(target=_writer_stage,
+                                       args=(record_queue, timing_queue,
+                                             journal_file))
+               for i in range(nwriters)]
+    imagers = [multiprocessing.Process(target=_image_stage,
+                                       args=(image_queue, timing_queue))
+               for i in range(nimagers)]
+
+    logging.info('Starting pipeline with {} readers, {} writers, and {} '
+                 'image processes'.format(nreaders, nwriters, nimagers))
+    for process in readers + writers + imagers:
+        process.start()
+
+    # The readers wait on the writers and image processes, so all of
+    # them must be running while the readers are fed
+    stages = {'reader': readers, 'writer': writers, 'image': imagers}
+    consumers = {'writer': writers, 'image': imagers}
+
+    try:
+        # Feed the readers, then tell each stage to finish once the
+        # stage before it is done
+        for rootname_path in rootname_paths:
+            _put(task_queue, rootname_path, stages)
+        for process in readers:
+            _put(task_queue, None, stages)
+
+        # Each process sends its timings just before it exits, and these
+        # must be received before the process can be joined
+        timings = {}
+        _receive_timings(timing_queue, readers, timings, consumers)
+        for process in readers:
+            process.join()
+
+        for process in writers:
+            _put(record_queue, None, {'writer': writers})
+        for process in imagers:
+            _put(image_queue, None, {'image': imagers})
+        _receive_timings(timing_queue, writers + imagers, timings)
+        for process in writers + imagers:
+            process.join()
+    except RuntimeError as e:
+        logging.error('Stopping pipeline: {}'.format(e))
+
+        # Give the readers the chance to notice, then stop everything
+        stop_event.set()
+        for process in readers:
+            process.join(2 * WRITER_IDLE_TIMEOUT)
+        for process in readers + writers + imagers:
+            process.terminate()
+            process.join()
+        raise
+
+    logging.info('Pipeline complete')
+
+    return timings
@@ -0,0 +1,282 @@
+"""Determine the proposal type (e.g. ``GO``, ``CAL/ACS``) of a given
+proposal ID, with a persistent on-disk cache.
+
+Many rootnames share the same handful of proposal IDs, so each proposal
+type is only resolved once and then stored in a ``SQLite`` cache file
+keyed by proposal ID.  Cached proposal types expire after
+``proposal_cache_ttl`` days.  Proposal IDs that the resolver does not
+know (or whose proposal type is not valid) are cached as well (negative
+caching), but expire after ``proposal_cache_negative_ttl`` days so that
+they are retried sooner.  Lookups that fail (e.g. because the MAST
+webpage cannot be reached) are not cached at all, and misconfigured
+resolvers (e.g. a missing ``proposal_type_file``) raise an exception.
+
+The proposal type itself is determined by a resolver, chosen with the
+``proposal_resolver`` config file setting:
+
+    - ``web`` (default): Scrape the MAST proposal status webpage, with a
+      timeout of ``proposal_timeout`` seconds.
+    - ``file``: Read the proposal type from the local
+      ``proposal_type_file``, which holds one ``<proposid>, <type>``
+      pair per line.  This allows ingestion on network-isolated nodes.
+
+Additional resolvers can be registered by adding a function that takes
+a proposal ID and returns a proposal type to ``RESOLVERS``.  Resolvers
+return ``None`` if the proposal ID is not known, and raise a
+``ResolverError`` if the lookup itself failed.
+
+Authors
+-------
+    Matthew Bourque
+
+Use
+---
+    This module is intended to be imported from and used by
+    ``acsql.ingest.ingest.py`` as such:
+    ::
+
+        from acsql.ingest.proposal_cache import resolve_proposal_type
+        proposal_type = resolve_proposal_type(proposid)
+
+Dependencies
+------------
+    External library dependencies include:
+
+    - ``acsql``
+"""
+
+import http.client
+import logging
+import os
+import sqlite3
+import time
+import urllib.request
+
+from acsql.utils.utils import SETTINGS
+from acsql.utils.utils import VALID_PROPOSAL_TYPES
+
+# Default cache expiration times (in days) and web request timeout (in
+# seconds)
+DEFAULT_TTL = 30
+DEFAULT_NEGATIVE_TTL = 1
+DEFAULT_TIMEOUT = 10
+
+# Proposal types that have already been looked up by this process
+_MEMORY_CACHE = {}
+
+# Contents of the proposal_type_file, read on first use
+_FILE_CACHE = {}
+
+
+class ResolverError(Exception):
+    """Raised by a resolver when the proposal type could not be looked
+    up (e.g. the MAST webpage could not be reached), as opposed to the
+    proposal ID not being known.
+    """
+
+
+def _connect_to_cache():
+    """Return a connection to the proposal type cache file, creating
+    the cache table if necessary.
+
+    The cache file is set by the ``proposal_cache`` config file
+    setting, and defaults to ``proposal_types.db`` in the ``log_dir``.
+
+    Returns
+    -------
+    connection : obj
+        A ``sqlite3`` ``Connection`` to the cache file.
+    """
+
+    cache_file = SETTINGS.get('proposal_cache') or \
+        os.path.join(SETTINGS['log_dir'], 'proposal_types.db')
+
+    connection = sqlite3.connect(cache_file, timeout=60)
+    connection.execute('CREATE TABLE IF NOT EXISTS proposal_types '
+                       '(proposid TEXT PRIMARY KEY, proposal_type TEXT, '
+                       'retrieved REAL)')
+
+    return connection
+
+
+def get_cached_proposal_type(proposid):
+    """Return the cached proposal type of the given ``proposid``.
+
+    Parameters
+    ----------
+    proposid : str
+        The proposal ID (e.g. ``12345``).
+
+    Returns
+    -------
+    found : bool
+        ``True`` if an unexpired cache entry exists for the
+        ``proposid``.
+    proposal_type : str or None
+        The cached proposal type.  ``None`` if no cache entry exists,
+        or if the proposal type is known to be undeterminable.
+    """
+
+    if proposid in _MEMORY_CACHE:
+        return True, _MEMORY_CACHE[proposid]
+
+    ttl = SETTINGS.get('proposal_cache_ttl', DEFAULT_TTL)
+    negative_ttl = SETTINGS.get('proposal_cache_negative_ttl',
+                                DEFAULT_NEGATIVE_TTL)
+
+    connection = _connect_to_cache()
+    try:
+        result = connection.execute(
+            'SELECT proposal_type, retrieved FROM proposal_types '
+            'WHERE proposid = ?', (proposid,)).fetchone()
+    finally:
+        connection.close()
+
+    if result is None:
+        return False, None
+
+    proposal_type, retrieved = result
+    age = (time.time() - retrieved) / 86400.
+    if (proposal_type and age > ttl) or (not proposal_type and age > negative_ttl):
+        return False, None
+
+    _MEMORY_CACHE[proposid] = proposal_type
+
+    return True, proposal_type
+
+
+def cache_proposal_type(proposid, proposal_type):
+    """Store the ``proposal_type`` of the given ``proposid`` in the
+    cache.
+
+    Parameters
+    ----------
+    proposid : str
+        The proposal ID (e.g. ``12345``).
+    proposal_type : str or None
+        The proposal type (e.g. ``CAL/ACS``), or ``None`` if it could
+        not be determined.
+    """
+
+    _MEMORY_CACHE[proposid] = proposal_type
+
+    connection = _connect_to_cache()
+    try:
+        with connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO proposal_types '
+                '(proposid, proposal_type, retrieved) VALUES (?, ?, ?)',
+                (proposid, proposal_type, time.time()))
+    finally:
+        connection.close()
+
+
+def resolve_from_file(proposid):
+    """Return the proposal type of the given ``proposid`` as listed in
+    the ``proposal_type_file``.
+
+    Parameters
+    ----------
+    proposid : str
+        The proposal ID (e.g. ``12345``).
+
+    Returns
+    -------
+    proposal_type : str or None
+        The proposal type (e.g. ``CAL/ACS``), or ``None`` if the
+        ``proposid`` is not listed.
+    """
+
+    if not _FILE_CACHE:
+        with open(SETTINGS['proposal_type_file'], 'r') as f:
+            contents = f.readlines()
+        contents = [item.strip().split(',') for item in contents
+                    if item.strip() and not item.startswith('#')]
+        for item in contents:
+            _FILE_CACHE[item[0].strip()] = item[1].strip()
+
+    proposal_type = _FILE_CACHE.get(proposid)
+
+    return proposal_type
+
+
+def resolve_from_web(proposid):
+    """Return the proposal type of the given ``proposid`` as scraped
+    from the MAST proposal status webpage.
+
+    Parameters
+    ----------
+    proposid : str
+        The proposal ID (e.g. ``12345``).
+
+    Returns
+    -------
+    proposal_type : str
+        The proposal type (e.g. ``CAL/ACS``).
+
+    Raises
+    ------
+    ResolverError
+        If the webpage cannot be retrieved or parsed.
+    """
+
+    timeout = SETTINGS.get('proposal_timeout', DEFAULT_TIMEOUT)
+
+    url = 'http://www.stsci.edu/cgi-bin/get-proposal-info?id='
+    url += '{}&submit=Go&observatory=HST'.format(proposid)
+    try:
+        webpage = urllib.request.urlopen(url, timeout=timeout)
+        proposal_type = webpage.readlines()[11].split(b'prop_type">')[-1]
+        proposal_type = proposal_type.split(b'</a>')[0].decode()
+    except (OSError, http.client.HTTPException, IndexError,
+            ValueError) as e:
+        raise ResolverError(e)
+
+    return proposal_type
+
+
+RESOLVERS = {'file': resolve_from_file,
+             'web': resolve_from_web}
+
+
+def resolve_proposal_type(proposid):
+    """Return the proposal type of the given ``proposid``, using the
+    cache if possible and the configured resolver otherwise.
+
+    Parameters
+    ----------
+    proposid : str
+        The proposal ID (e.g. ``12345``).
+
+    Returns
+    -------
+    proposal_type : str or None
+        The proposal type (e.g. ``CAL/ACS``), or ``None`` if it cannot
+        be determined.
+    """
+
+    found, proposal_type = get_cached_proposal_type(proposid)
+    if found:
+        return proposal_type
+
+    try:
+        resolver = RESOLVERS[SETTINGS.get('proposal_resolver', 'web')]
+        proposal_type = resolver(proposid)
+    except ResolverError as e:
+        # The lookup failed, so try again for the next rootname rather
+        # than caching the failure
+        logging.warning('Unable to resolve proposal type for {}: {}'\
+            .format(proposid, e))
+        return None
+    except Exception as e:
+        logging.error('Unable to resolve proposal type for {}: {}'\
+            .format(proposid, e))
+        raise
+
+    # Check for bad proposal types
+    if proposal_type not in VALID_PROPOSAL_TYPES:
+        proposal_type = None
+
+    cache_proposal_type(proposid, proposal_type)
+
+    return proposal_type
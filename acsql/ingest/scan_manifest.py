@@ -0,0 +1,233 @@
+"""Incrementally scan the MAST cache for new, changed, and vanished
+rootnames using a persistent scan manifest.
+
+The scan manifest is a JSON file that records the modification time of
+each proposal directory (e.g. ``jbm1/``) of the ``filesystem`` and of
+each rootname directory (e.g. ``jbm1/jbm110u2q/``) within it.  On each
+scan, only the proposal directories whose modification time has
+changed since the previous scan are listed again, so that the cost of
+a scan grows with the amount of new data rather than with the size of
+the archive.
+
+Within a changed proposal directory, rootname directories that did not
+exist before are reported as new, rootname directories whose
+modification time has changed (i.e. files were added or removed) are
+reported as changed, and rootname directories that no longer exist are
+reported as vanished.  Note that files that are added to a rootname
+directory of an otherwise unchanged proposal directory are not
+detected, since that would require listing every proposal directory.
+
+The manifest file is set by the ``scan_manifest`` config file setting,
+and defaults to ``scan_manifest.json`` in the ``log_dir``.
+
+Authors
+-------
+    Matthew Bourque
+
+Use
+---
+    This module is intended to be imported from and used by the
+    ``ingest_production`` script as such:
+    ::
+
+        from acsql.ingest.scan_manifest import load_manifest
+        from acsql.ingest.scan_manifest import save_manifest
+        from acsql.ingest.scan_manifest import scan_filesystem
+
+        manifest = load_manifest()
+        scan_dict, manifest = scan_filesystem(manifest)
+        save_manifest(manifest)
+
+Dependencies
+------------
+    External library dependencies include:
+
+    - ``acsql``
+"""
+
+import json
+import logging
+import os
+
+from acsql.utils.utils import SETTINGS
+
+# Incremented whenever the layout of the manifest changes, so that old
+# manifests are ignored
+MANIFEST_VERSION = 1
+
+
+def get_manifest_file():
+    """Return the path to the scan manifest file.
+
+    Returns
+    -------
+    manifest_file : str
+        The path to the scan manifest file.
+    """
+
+    manifest_file = SETTINGS.get('scan_manifest') or \
+        os.path.join(SETTINGS['log_dir'], 'scan_manifest.json')
+
+    return manifest_file
+
+
+def load_manifest():
+    """Return the scan manifest, or ``None`` if no (usable) scan
+    manifest exists yet.
+
+    Returns
+    -------
+    manifest : dict or None
+        The scan manifest.
+    """
+
+    manifest_file = get_manifest_file()
+    if not os.path.exists(manifest_file):
+        return None
+
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+
+    if manifest.get('version') != MANIFEST_VERSION or \
+            manifest.get('filesystem') != SETTINGS['filesystem']:
+        logging.warning('Ignoring outdated scan manifest {}'\
+            .format(manifest_file))
+        return None
+
+    return manifest
+
+
+def save_manifest(manifest):
+    """Write the given scan ``manifest`` to the scan manifest file.
+
+    The manifest is first written to a temporary file which then
+    replaces the manifest file, so that an interrupted write cannot
+    corrupt it.
+
+    Parameters
+    ----------
+    manifest : dict
+        The scan manifest, as returned by ``scan_filesystem()``.
+    """
+
+    manifest_file = get_manifest_file()
+    temp_file = '{}.tmp'.format(manifest_file)
+    with open(temp_file, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(temp_file, manifest_file)
+
+    logging.info('Saved scan manifest {}'.format(manifest_file))
+
+
+def forget_rootnames(manifest, rootname_paths):
+    """Remove the given rootnames from the given scan ``manifest``, so
+    that the next scan reports them as new (e.g. because they could not
+    be ingested).
+
+    The modification times of their proposal directories are cleared
+    as well, so that the next scan descends into them again.
+
+    Parameters
+    ----------
+    manifest : dict
+        The scan manifest, as returned by ``scan_filesystem()``.
+    rootname_paths : list
+        The paths to the rootname directories to remove.
+    """
+
+    for rootname_path in rootname_paths:
+        proposal = os.path.basename(os.path.dirname(rootname_path))
+        proposal_dict = manifest['proposals'].get(proposal)
+        if proposal_dict is None:
+            continue
+        proposal_dict['rootnames'].pop(os.path.basename(rootname_path), None)
+        proposal_dict['mtime'] = None
+
+
+def scan_filesystem(manifest=None):
+    """Scan the ``filesystem`` for rootname directories, descending
+    only into the proposal directories that have changed since the
+    given ``manifest`` was made.
+
+    Parameters
+    ----------
+    manifest : dict, optional
+        The scan manifest of the previous scan.  If not provided, every
+        proposal directory is scanned and every rootname is reported as
+        new.
+
+    Returns
+    -------
+    scan_dict : dict
+        A dictionary whose ``new``, ``changed``, and ``vanished`` keys
+        hold lists of paths to the corresponding rootname directories.
+    manifest : dict
+        The updated scan manifest.
+    """
+
+    if manifest is None:
+        old_proposals = {}
+    else:
+        old_proposals = manifest['proposals']
+
+    scan_dict = {'new': [], 'changed': [], 'vanished': []}
+    proposals = {}
+    num_scanned = 0
+
+    for proposal_entry in os.scandir(SETTINGS['filesystem']):
+        if not proposal_entry.name.startswith('j') or \
+                not proposal_entry.is_dir():
+            continue
+
+        mtime = proposal_entry.stat().st_mtime
+        old_proposal = old_proposals.get(proposal_entry.name)
+
+        # Skip proposal directories that have not changed
+        if old_proposal and old_proposal['mtime'] == mtime:
+            proposals[proposal_entry.name] = old_proposal
+            continue
+
+        num_scanned += 1
+        if old_proposal:
+            old_rootnames = old_proposal['rootnames']
+        else:
+            old_rootnames = {}
+
+        rootnames = {}
+        for rootname_entry in os.scandir(proposal_entry.path):
+            if not rootname_entry.is_dir():
+                continue
+
+            rootname_mtime = rootname_entry.stat().st_mtime
+            rootnames[rootname_entry.name] = rootname_mtime
+
+            if rootname_entry.name not in old_rootnames:
+                scan_dict['new'].append(rootname_entry.path)
+            elif old_rootnames[rootname_entry.name] != rootname_mtime:
+                scan_dict['changed'].append(rootname_entry.path)
+
+        scan_dict['vanished'].extend(
+            [os.path.join(proposal_entry.path, rootname)
+             for rootname in old_rootnames if rootname not in rootnames])
+
+        proposals[proposal_entry.name] = {'mtime': mtime,
+                                          'rootnames': rootnames}
+
+    # Proposal directories that no longer exist at all
+    for proposal, old_proposal in old_proposals.items():
+        if proposal not in proposals:
+            scan_dict['vanished'].extend(
+                [os.path.join(SETTINGS['filesystem'], proposal, rootname)
+                 for rootname in old_proposal['rootnames']])
+
+    manifest = {'version': MANIFEST_VERSION,
+                'filesystem': SETTINGS['filesystem'],
+                'proposals': proposals}
+
+    logging.info('Scanned {} of {} proposal directories'\
+        .format(num_scanned, len(proposals)))
+    logging.info('{} new, {} changed, and {} vanished rootnames'.format(
+        len(scan_dict['new']), len(scan_dict['changed']),
+        len(scan_dict['vanished'])))
+
+    return scan_dict, manifest
@@ -6,8 +6,8 @@ filesystem.
 This script is a wapper around ``acsql.ingest.ingest.py`` to ingest
 multiple rootnames into the system.  The user may supply a list of
 individual rootnames to ingest, or (by default) ingest whichever
-rootnames exist in the MAST cache but yet to exist in the ``acsql``
-database.
+rootnames are new or have changed in the MAST cache since the previous
+run (see ``acsql.ingest.scan_manifest``).
 
 See ``acsql.ingest.ingest.py`` module docstrings for further
 information on the ingestion process.
@@ -23,73 +23,180 @@ Use
     ::
 
         python ingest_production.py [-i|--ingest_filelist]
-            ['-f|--filetype']
+            ['-f|--filetype'] ['-p|--pipeline'] ['-r|--resume']
+            [--force] [-t|--timing_file]
 
     Parameters:
     (Optional) [-i|--ingest_filelist] - A text file containing
         individual rootnames to be ingested.  If not supplied, this
         module will determine which rootnames are to be ingested by
-        comparing the MAST cache against what already exists in the
-        ``acsql`` database.
+        scanning the MAST cache for changes since the previous run.
     (Optional) [-f|--filetype] - The type of file to ingest.  May be
         an indivual filetype (e.g. ``flt``) or ``all`` to ingest all
         filetypes.  ``all`` is the default value.
+    (Optional) [-p|--pipeline] - Ingest using separate reader, writer,
+        and image processes (see ``acsql.ingest.pipeline``) instead
+        of ingesting each rootname in a single process.
+    (Optional) [-r|--resume] - The journal file of an interrupted run
+        (written to the ``log_dir``) to resume.  Rootnames that the
+        run finished are skipped, and rootnames that it only partially
+        ingested are ingested again.
+    (Optional) [--force] - Ingest every file, even those that have not
+        changed since they were last ingested (see
+        ``acsql.ingest.fingerprints``).
+    (Optional) [-t|--timing_file] - A JSON file to write the summary
+        of the time taken by each stage of the ingestion to.  The
+        summary is always written to the log file.
 """
 
 import argparse
-import glob
+import datetime
 import logging
 import multiprocessing
+from multiprocessing.util import Finalize
 import os
 
-from astropy.io import fits
-
-from acsql.database.database_interface import Master, session
+from acsql.database.database_interface import Master, reset_engines, session
+from acsql.ingest import journal
 from acsql.ingest.ingest import ingest
+from acsql.ingest.ingest import IngestWriter
+from acsql.ingest.pipeline import run_pipeline
+from acsql.ingest.scan_manifest import forget_rootnames
+from acsql.ingest.scan_manifest import load_manifest
+from acsql.ingest.scan_manifest import save_manifest
+from acsql.ingest.scan_manifest import scan_filesystem
+from acsql.utils.timing import collect_timings
+from acsql.utils.timing import merge_timings
+from acsql.utils.timing import report_timings
+from acsql.utils.timing import timed
+from acsql.utils.utils import ProgressReport
 from acsql.utils.utils import SETTINGS, setup_logging, VALID_FILETYPES
 
 
 def get_rootnames_to_ingest():
     """Return a list of paths to rootnames in the filesystem that need
-    to be ingested (i.e. do not already exist in the ``acsql``
-    database).
+    to be ingested (i.e. are new or have changed since the previous
+    scan of the filesystem).
+
+    The filesystem is scanned incrementally using the scan manifest
+    (see ``acsql.ingest.scan_manifest``).  If there is no scan manifest
+    yet, the whole filesystem is scanned and the rootnames that do not
+    already exist in the ``acsql`` database are ingested.
 
     Returns
     -------
     rootnames_to_ingest : list
-        A list of full paths to rootnames that exist in the filesystem
-        but not in the ``acsql`` database.
+        A list of full paths to rootnames that are new or have changed
+        in the filesystem.
+    manifest : dict
+        The updated scan manifest, to be saved once the rootnames have
+        been ingested.
     """
 
     logging.info('Gathering files to ingest')
 
-    # Query the database to determine which rootnames already exist
-    results = session.query(Master.rootname).all()
-    db_rootnames = set([item[0] for item in results])
+    manifest = load_manifest()
+    scan_dict, new_manifest = scan_filesystem(manifest)
 
-    # Gather list of rootnames that exist in the filesystem
-    fsys_paths = glob.glob(os.path.join(SETTINGS['filesystem'], 'j*', '*'))
-    fsys_rootnames = set([os.path.basename(item)[:-1] for item in fsys_paths])
+    if manifest is None:
 
-    # Determine new rootnames to ingest
-    new_rootnames = fsys_rootnames - db_rootnames
+        # Query the database to determine which rootnames already exist
+        results = session.query(Master.rootname).all()
+        db_rootnames = set([item[0] for item in results])
+        logging.info('{} rootnames in database'.format(len(db_rootnames)))
 
-    # Re-retreive the full paths
-    rootnames_to_ingest = [item for item in fsys_paths if
-                           os.path.basename(item)[:-1] in new_rootnames]
+        rootnames_to_ingest = [item for item in scan_dict['new'] if
+                               os.path.basename(item)[:-1] not in db_rootnames]
+    else:
+        rootnames_to_ingest = scan_dict['new'] + scan_dict['changed']
+
+    for rootname_path in scan_dict['vanished']:
+        logging.warning('{} no longer exists in the filesystem'\
+            .format(rootname_path))
 
-    logging.info('{} rootnames in database'.format(len(db_rootnames)))
-    logging.info('{} rootnames in filesystem'.format(len(fsys_rootnames)))
     logging.info('{} rootnames to ingest'.format(len(rootnames_to_ingest)))
 
-    return rootnames_to_ingest
+    return rootnames_to_ingest, new_manifest
+
+
+# The writer shared by the rootnames of a worker process of the pool
+_WRITER = None
+
+
+def init_worker(journal_file):
+    """Initialize a worker process of the multiprocessing pool.
+
+    Each worker creates its own database connection pool, and a single
+    ``IngestWriter`` that buffers the records of all of the rootnames
+    that the worker ingests.  The writer is flushed once more when the
+    worker exits.
+
+    Parameters
+    ----------
+    journal_file : str
+        The path to the journal of the ingestion run (see
+        ``acsql.ingest.journal``).
+    """
+
+    global _WRITER
+
+    reset_engines()
+    _WRITER = IngestWriter(journal_file)
+
+    # Finalizers with an exit priority are run when a worker exits,
+    # whether after maxtasksperchild rootnames or when the pool closes.
+    # The timings of this last flush are not reported.
+    Finalize(None, _WRITER.flush, exitpriority=10)
+
+
+def ingest_rootname(args):
+    """Ingest a single rootname, as a task of the multiprocessing pool.
+
+    Errors are logged rather than raised, so that a single bad rootname
+    does not stop the run.  The rootname is left unfinished in the
+    journal, so that it is retried when the run is resumed.  The records
+    of the rootname are added to the writer of the worker (see
+    ``init_worker()``), so they may only be written (and the rootname
+    marked as complete) after this function returns.
+
+    Parameters
+    ----------
+    args : tuple
+        The ``rootname_path``, ``filetype``, ``journal_file``, and
+        ``force`` arguments of ``acsql.ingest.ingest.ingest()``.
+
+    Returns
+    -------
+    num_files : int
+        The number of files of the rootname that were ingested.
+    timings : dict
+        The timings of the stages of the ingestion of the rootname (see
+        ``acsql.utils.timing``).
+    """
+
+    try:
+        with timed('rootname'):
+            num_files = ingest(*args, writer=_WRITER)
+    except Exception as e:
+        logging.error('{}: Unable to ingest: {}'.format(args[0], e))
+        num_files = 0
+
+    return num_files, collect_timings()
 
 
-def ingest_production(filetype, ingest_filelist):
+def ingest_production(filetype, ingest_filelist, pipeline=False,
+                      resume=None, force=False, timing_file=None):
     """Perform ingestion on the given filelist of rootnames (or if not
-    provided, any new rootnames that exist in the MAST filesystem but
-    not in the ``acsql`` database) for the given ``filetype`` (or all
-    filetypes if ``filetype`` == `all`).
+    provided, any rootnames that are new or have changed in the MAST
+    filesystem) for the given ``filetype`` (or all filetypes if
+    ``filetype`` == `all`).
+
+    The progress of the run is recorded in a journal file in the
+    ``log_dir`` (see ``acsql.ingest.journal``), so that the run can be
+    resumed if it is interrupted.  The number of rootnames ingested,
+    the throughput, and the estimated time remaining are logged
+    periodically, and a summary of the time taken by each stage of the
+    ingestion is logged at the end (see ``acsql.utils.timing``).
 
     Parameters
     ----------
@@ -97,22 +204,81 @@ def ingest_production(filetype, ingest_filelist):
         The filetype to ingest (e.g. ``flt``, or ``all``)
     ingest_filelist : str or None
         The path to a file that contains rootnames to ingest.  If
-        ``None``, then the acsql database and MAST filesystem are
-        used to determine new rootnames to ingest.
+        ``None``, then the MAST filesystem is scanned to determine
+        new rootnames to ingest.
+    pipeline : bool
+        If ``True``, ingest using the staged reader/writer/image
+        pipeline of ``acsql.ingest.pipeline``.
+    resume : str or None
+        The path to the journal file of an interrupted run to resume.
+        If provided, the rootnames and ``filetype`` of that run are
+        used, and only the work that it did not finish is done.
+    force : bool
+        If ``True``, ingest every file, even those that have not changed
+        since they were last ingested.
+    timing_file : str or None
+        The path to a JSON file to also write the timing summary to.
     """
 
-    if ingest_filelist:
-        with open(ingest_filelist) as f:
-            rootnames = f.readlines()
-        rootnames = [rootname.strip().lower() for rootname in rootnames]
-        rootnames = [os.path.join(SETTINGS['filesystem'], rootname[0:4], rootname) for rootname in rootnames]
+    if resume:
+        journal_file = resume
+        rootnames, filetype, manifest = journal.load_journal(journal_file)
+        rootnames = journal.get_unfinished_rootnames(journal_file)
+        logging.info('Resuming {}: {} rootnames left to ingest'\
+            .format(journal_file, len(rootnames)))
     else:
-        rootnames = get_rootnames_to_ingest()
-
-    pool = multiprocessing.Pool(processes=SETTINGS['ncores'])
-    filetypes = [filetype for item in rootnames]
-    mp_args = [(rootname, filetype) for rootname, filetype in zip(rootnames, filetypes)]
-    pool.starmap(ingest, mp_args)
+        manifest = None
+        if ingest_filelist:
+            with open(ingest_filelist) as f:
+                rootnames = f.readlines()
+            rootnames = [rootname.strip().lower() for rootname in rootnames]
+            rootnames = [os.path.join(SETTINGS['filesystem'], rootname[0:4], rootname) for rootname in rootnames]
+        else:
+            rootnames, manifest = get_rootnames_to_ingest()
+
+        timestamp = datetime.datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
+        journal_file = os.path.join(SETTINGS['log_dir'],
+            'ingest_production_{}_{}.journal'.format(timestamp, os.getpid()))
+        journal.create_journal(journal_file, rootnames, filetype, manifest)
+        logging.info('Recording progress in {}'.format(journal_file))
+
+    if pipeline:
+        timings = run_pipeline(rootnames, filetype, journal_file, force)
+    else:
+        # Each worker writes the records of its rootnames in batches,
+        # and is replaced after maxtasksperchild rootnames to release
+        # memory
+        pool = multiprocessing.Pool(
+            processes=SETTINGS['ncores'], initializer=init_worker,
+            initargs=(journal_file,),
+            maxtasksperchild=SETTINGS.get('maxtasksperchild') or None)
+
+        # Rootnames are handed out lazily, and the results are consumed
+        # as soon as they finish, in whichever order that happens
+        mp_args = ((rootname, filetype, journal_file, force)
+                   for rootname in rootnames)
+        progress = ProgressReport(len(rootnames))
+        timings = {}
+        for num_files, rootname_timings in pool.imap_unordered(
+                ingest_rootname, mp_args,
+                chunksize=SETTINGS.get('chunksize', 1)):
+            progress.update(num_files)
+            merge_timings(timings, rootname_timings)
+        pool.close()
+        pool.join()
+        progress.finish()
+
+    report_timings(timings, timing_file)
+
+    # Only record the scan once its rootnames have been ingested, and
+    # leave out the rootnames that failed so that they are retried
+    if manifest is not None:
+        unfinished = journal.get_unfinished_rootnames(journal_file)
+        if unfinished:
+            logging.warning('{} rootnames could not be ingested, and will '
+                            'be scanned again'.format(len(unfinished)))
+            forget_rootnames(manifest, unfinished)
+        save_manifest(manifest)
 
     logging.info('Process Complete.')
 
@@ -137,6 +303,15 @@ def parse_args():
     ingest_filelist_help = 'A file containing a list of rootnames to ingest. '
     ingest_filelist_help += 'If not provided, then the acsql database is used '
     ingest_filelist_help += 'to determine which files get ingested.'
+    pipeline_help = 'Ingest using separate reader, writer, and image '
+    pipeline_help += 'processes.'
+    resume_help = 'The journal file of an interrupted run to resume. The '
+    resume_help += 'rootnames and filetype of that run are used, and only '
+    resume_help += 'the rootnames that it did not finish are ingested.'
+    force_help = 'Ingest every file, even those that have not changed since '
+    force_help += 'they were last ingested.'
+    timing_file_help = 'A JSON file to write the summary of the time taken '
+    timing_file_help += 'by each stage of the ingestion to.'
 
     # Add arguments
     parser = argparse.ArgumentParser()
@@ -152,6 +327,28 @@ def parse_args():
                         required=False,
                         default=None,
                         help=ingest_filelist_help)
+    parser.add_argument('-p', '--pipeline',
+                        dest='pipeline',
+                        action='store_true',
+                        required=False,
+                        help=pipeline_help)
+    parser.add_argument('-r', '--resume',
+                        dest='resume',
+                        action='store',
+                        required=False,
+                        default=None,
+                        help=resume_help)
+    parser.add_argument('--force',
+                        dest='force',
+                        action='store_true',
+                        required=False,
+                        help=force_help)
+    parser.add_argument('-t', '--timing_file',
+                        dest='timing_file',
+                        action='store',
+                        required=False,
+                        default=None,
+                        help=timing_file_help)
 
     # Parse args
     args = parser.parse_args()
@@ -186,6 +383,11 @@ def test_args(args):
         assert os.path.exists(args.ingest_filelist),\
             '{} does not exist.'.format(args.ingest_filelist)
 
+    # Ensure that the journal to resume exists
+    if args.resume:
+        assert os.path.exists(args.resume),\
+            '{} does not exist.'.format(args.resume)
+
 
 if __name__ == '__main__':
 
@@ -193,4 +395,5 @@ if __name__ == '__main__':
     setup_logging(module)
 
     args = parse_args()
-    ingest_production(args.filetype, args.ingest_filelist)
+    ingest_production(args.filetype, args.ingest_filelist, args.pipeline,
+                      args.resume, args.force, args.timing_file)
@@ -0,0 +1,284 @@
+#! /usr/bin/env python
+
+"""Creates the JPEGs and Thumbnails of ingested HST/ACS data.
+
+This script renders the images of ``raw``, ``flt``, and ``flc`` files
+separately from the ingestion of their headers, so that metadata can
+be made available in the ``acsql`` database quickly and the (much
+slower) images can catch up on their own, e.g. at a lower priority or
+on other nodes.  It is meant to be used together with the
+``defer_images`` config file setting, which stops
+``ingest_production`` from rendering images itself.
+
+The images that are pending are determined from the ``datasets`` and
+``master`` tables of the ``acsql`` database.  Images that already
+exist and are newer than their FITS file are skipped.
+
+See ``acsql.ingest.make_jpeg.py`` and
+``acsql.ingest.make_thumbnail.py`` module docstrings for further
+information on the images themselves.
+
+Authors
+-------
+    Matthew Bourque
+
+Use
+---
+    This script is inteneded to be executed from the command line as
+    such:
+    ::
+
+        python make_images.py [-i|--ingest_filelist] [-n|--nice]
+            [-p|--part] [--force]
+
+    Parameters:
+    (Optional) [-i|--ingest_filelist] - A text file containing
+        individual rootnames to create images for.  If not supplied,
+        images are created for every rootname in the database.
+    (Optional) [-n|--nice] - The amount by which to lower the priority
+        of the processes that create the images.  0 is the default
+        value.
+    (Optional) [-p|--part] - Only create images for one part of the
+        rootnames, given as ``<index>/<number of parts>`` (e.g.
+        ``0/4``), so that the work can be split across several nodes.
+    (Optional) [--force] - Create images even if they are up to date.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+
+from acsql.database.database_interface import Datasets, Master, session
+from acsql.ingest.ingest import make_images
+from acsql.ingest.make_file_dict import make_file_dict
+from acsql.ingest.make_file_dict import make_rootname_dict
+from acsql.utils.timing import collect_timings
+from acsql.utils.timing import merge_timings
+from acsql.utils.timing import report_timings
+from acsql.utils.utils import ProgressReport
+from acsql.utils.utils import SETTINGS, setup_logging
+
+
+def get_pending_images(rootnames=None, part=None):
+    """Return the files that have been ingested and may need images,
+    grouped by rootname.
+
+    Parameters
+    ----------
+    rootnames : list, optional
+        The rootnames to return the files of.  If not provided, the
+        files of every rootname in the database are returned.
+    part : tuple, optional
+        An ``(index, number of parts)`` pair.  If provided, only every
+        ``number of parts``-th rootname, starting at ``index``, is
+        returned.
+
+    Returns
+    -------
+    pending_images : list
+        A list of ``(rootname_path, basenames)`` pairs, where
+        ``basenames`` are the ``raw``, ``flt``, and ``flc`` files of
+        the rootname.
+    """
+
+    query = session.query(Master.rootname, Master.path, Datasets.raw,
+                          Datasets.flt, Datasets.flc)\
+        .join(Datasets, Master.rootname == Datasets.rootname)\
+        .order_by(Master.rootname)
+    if rootnames:
+        query = query.filter(Master.rootname.in_(rootnames))
+    results = query.all()
+
+    if part:
+        index, num_parts = part
+        results = results[index::num_parts]
+
+    pending_images = []
+    for rootname, path, raw, flt, flc in results:
+        rootname_path = os.path.join(SETTINGS['filesystem'], path.strip('/'))
+        basenames = [item for item in (raw, flt, flc) if item]
+        if basenames:
+            pending_images.append((rootname_path, basenames))
+
+    logging.info('{} rootnames with images to check'\
+        .format(len(pending_images)))
+
+    return pending_images
+
+
+def make_rootname_images(args):
+    """Create the images of the given files of a single rootname, as a
+    task of the multiprocessing pool.
+
+    Errors are logged rather than raised, so that a single bad file
+    does not stop the run.
+
+    Parameters
+    ----------
+    args : tuple
+        The ``rootname_path``, the ``basenames`` of the files to create
+        images for, and whether to ``force`` their creation.
+
+    Returns
+    -------
+    num_images : int
+        The number of files whose images were created.
+    timings : dict
+        The timings of the creation of the images (see
+        ``acsql.utils.timing``).
+    """
+
+    rootname_path, basenames, force = args
+
+    num_images = 0
+    try:
+        rootname_dict = make_rootname_dict(rootname_path)
+        for basename in basenames:
+            filename = os.path.join(rootname_path, basename)
+            file_dict = make_file_dict(filename, rootname_dict)
+            if make_images(file_dict, force=force):
+                num_images += 1
+    except Exception as e:
+        logging.error('{}: Unable to create images: {}'\
+            .format(rootname_path, e))
+
+    return num_images, collect_timings()
+
+
+def make_all_images(ingest_filelist=None, nice=0, part=None, force=False):
+    """Create the images of every ingested file (or of the rootnames in
+    the given ``ingest_filelist``) that are not up to date.
+
+    Parameters
+    ----------
+    ingest_filelist : str, optional
+        The path to a file that contains rootnames to create images
+        for.
+    nice : int, optional
+        The amount by which to lower the priority of the processes
+        that create the images.
+    part : tuple, optional
+        An ``(index, number of parts)`` pair, to only create the images
+        of one part of the rootnames.
+    force : bool, optional
+        If ``True``, create images even if they are up to date.
+    """
+
+    rootnames = None
+    if ingest_filelist:
+        with open(ingest_filelist) as f:
+            rootnames = f.readlines()
+        rootnames = [rootname.strip().lower()[:8] for rootname in rootnames]
+
+    pending_images = get_pending_images(rootnames, part)
+
+    pool = multiprocessing.Pool(
+        processes=SETTINGS['ncores'], initializer=os.nice, initargs=(nice,),
+        maxtasksperchild=SETTINGS.get('maxtasksperchild') or None)
+    mp_args = ((rootname_path, basenames, force)
+               for rootname_path, basenames in pending_images)
+    progress = ProgressReport(len(pending_images))
+    timings = {}
+    for num_images, rootname_timings in pool.imap_unordered(
+            make_rootname_images, mp_args,
+            chunksize=SETTINGS.get('chunksize', 1)):
+        progress.update(num_images)
+        merge_timings(timings, rootname_timings)
+    pool.close()
+    pool.join()
+    progress.finish()
+    report_timings(timings)
+
+    logging.info('Process Complete.')
+
+
+def parse_args():
+    """Parse command line arguments. Returns ``args`` object
+
+    Returns
+    -------
+    args : obj
+        An argparse object containing all of the arguments
+    """
+
+    # Create help strings
+    ingest_filelist_help = 'A file containing a list of rootnames to create '
+    ingest_filelist_help += 'images for. If not provided, then images are '
+    ingest_filelist_help += 'created for every rootname in the database.'
+    nice_help = 'The amount by which to lower the priority of the processes '
+    nice_help += 'that create the images.'
+    part_help = 'Only create images for one part of the rootnames, given as '
+    part_help += '<index>/<number of parts> (e.g. 0/4).'
+    force_help = 'Create images even if they are up to date.'
+
+    # Add arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--ingest_filelist',
+                        dest='ingest_filelist',
+                        action='store',
+                        required=False,
+                        default=None,
+                        help=ingest_filelist_help)
+    parser.add_argument('-n', '--nice',
+                        dest='nice',
+                        action='store',
+                        type=int,
+                        required=False,
+                        default=0,
+                        help=nice_help)
+    parser.add_argument('-p', '--part',
+                        dest='part',
+                        action='store',
+                        required=False,
+                        default=None,
+                        help=part_help)
+    parser.add_argument('--force',
+                        dest='force',
+                        action='store_true',
+                        required=False,
+                        help=force_help)
+
+    # Parse args
+    args = parser.parse_args()
+
+    # Test the args
+    test_args(args)
+
+    return args
+
+
+def test_args(args):
+    """Test the command line arguments to ensure that they are valid.
+
+    Parameters
+    ----------
+    args : obj
+        An argparse objects containing all of the arguments.
+
+    Raises
+    ------
+    AssertionError
+        If any of the argument conditions fail.
+    """
+
+    # Ensure that the ingest_filelist exists
+    if args.ingest_filelist:
+        assert os.path.exists(args.ingest_filelist),\
+            '{} does not exist.'.format(args.ingest_filelist)
+
+    # Ensure that the part is of the form <index>/<number of parts>
+    if args.part:
+        index, num_parts = [int(item) for item in args.part.split('/')]
+        assert 0 <= index < num_parts,\
+            '{} is not a valid part.'.format(args.part)
+        args.part = (index, num_parts)
+
+
+if __name__ == '__main__':
+
+    module = os.path.basename(__file__).strip('.py')
+    setup_logging(module)
+
+    args = parse_args()
+    make_all_images(args.ingest_filelist, args.nice, args.part, args.force)
@@ -0,0 +1,111 @@
+"""Fixtures that are shared by the ``acsql`` tests.
+
+The tests run against a ``SQLite`` database and a synthetic archive
+(see ``acsql.benchmarks.make_synthetic_archive``) in a temporary
+directory, so that neither a ``MySQL`` server nor the MAST cache nor
+network access is needed.
+
+Authors
+-------
+    Matthew Bourque
+
+Use
+---
+
+    The fixtures are found by ``pytest`` when the tests are run from
+    the repository, as such:
+    ::
+
+        python -m pytest -q
+
+Dependencies
+------------
+    External library dependencies include:
+
+    - ``acsql``
+    - ``pytest``
+"""
+
+import os
+
+import pytest
+
+from acsql.benchmarks.make_synthetic_archive import make_synthetic_archive
+from acsql.database.database_interface import base
+from acsql.database.database_interface import build_all_orms
+from acsql.database.database_interface import get_engine
+from acsql.ingest import proposal_cache
+from acsql.utils.utils import SETTINGS
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    """Point the config file settings at a temporary directory.
+
+    Returns
+    -------
+    settings : dict
+        The ``SETTINGS`` of ``acsql.utils.utils``, which are restored
+        once the test is complete.
+    """
+
+    filesystem = str(tmp_path / 'filesystem')
+    os.makedirs(filesystem)
+
+    values = {
+        'connection_string': 'sqlite:///{}'.format(tmp_path / 'acsql.db'),
+        'filesystem': filesystem,
+        'log_dir': str(tmp_path),
+        'jpeg_dir': str(tmp_path / 'jpegs'),
+        'thumbnail_dir': str(tmp_path / 'thumbnails'),
+        'preview_sizes': [],
+        'make_tiles': False,
+        'batch_size': 500,
+        'fingerprint_checksums': False,
+        'proposal_resolver': 'file',
+        'proposal_type_file': os.path.join(filesystem, 'proposal_types.txt'),
+        'proposal_cache': str(tmp_path / 'proposal_types.db')}
+    for key, value in values.items():
+        monkeypatch.setitem(SETTINGS, key, value)
+
+    monkeypatch.setattr(proposal_cache, '_MEMORY_CACHE', {})
+    monkeypatch.setattr(proposal_cache, '_FILE_CACHE', {})
+
+    return SETTINGS
+
+
+@pytest.fixture
+def database(settings):
+    """Create all of the tables of the ``acsql`` database in a
+    temporary ``SQLite`` database.
+
+    Returns
+    -------
+    engine : engine object
+        The ``engine`` of the temporary database.
+    """
+
+    build_all_orms()
+    engine = get_engine()
+    base.metadata.create_all(engine)
+
+    yield engine
+
+    engine.dispose()
+
+
+@pytest.fixture
+def archive(settings):
+    """Create a synthetic archive of a single rootname in the
+    ``filesystem`` directory.
+
+    Returns
+    -------
+    rootname_path : str
+        The path to the rootname directory.
+    """
+
+    rootname_paths = make_synthetic_archive(settings['filesystem'], 1,
+                                            image_size=64)
+
+    return rootname_paths[0]
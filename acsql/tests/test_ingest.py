@@ -0,0 +1,133 @@
+"""Tests for the ``acsql.ingest.ingest`` module.
+
+Authors
+-------
+    Matthew Bourque
+
+Use
+---
+
+    These tests are intended to be run with ``pytest``, as such:
+    ::
+
+        python -m pytest -q acsql/tests/test_ingest.py
+
+Dependencies
+------------
+    External library dependencies include:
+
+    - ``acsql``
+    - ``astropy``
+    - ``pytest``
+"""
+
+import os
+
+from astropy.io import fits
+
+from acsql.ingest import journal
+from acsql.ingest.fingerprints import get_fingerprints
+from acsql.ingest.ingest import ingest
+from acsql.utils.utils import get_table
+
+
+def _list_files(rootname_path):
+    """Return the paths to the files of the given rootname."""
+
+    return sorted([entry.path for entry in os.scandir(rootname_path)])
+
+
+def _touch(filename):
+    """Move the modification time of the given file a minute ahead."""
+
+    mtime = os.stat(filename).st_mtime + 60
+    os.utime(filename, (mtime, mtime))
+
+    return mtime
+
+
+def test_ingest(database, archive):
+    """All of the files of a rootname are ingested into the master,
+    datasets, fingerprints, and header tables."""
+
+    rootname = os.path.basename(archive)[:-1]
+    file_paths = _list_files(archive)
+
+    assert ingest(archive) == len(file_paths)
+
+    with database.connect() as connection:
+        master = connection.execute(get_table('Master').select()).fetchall()
+        datasets = connection.execute(
+            get_table('Datasets').select()).fetchall()
+        headers = connection.execute(
+            get_table('WFC_flt_0').select()).fetchall()
+
+    assert [row['rootname'] for row in master] == [rootname]
+    assert datasets[0]['flt'] == '{}q_flt.fits'.format(rootname)
+    assert [row['filename'] for row in headers] == \
+        ['{}q_flt.fits'.format(rootname)]
+    assert sorted(get_fingerprints(rootname)) == \
+        [os.path.basename(item) for item in file_paths]
+
+
+def test_fingerprints_skip_unchanged_files(database, archive):
+    """Files are only read again once they have changed, or when the
+    ingestion is forced."""
+
+    rootname = os.path.basename(archive)[:-1]
+    file_paths = _list_files(archive)
+    flt_file = os.path.join(archive, '{}q_flt.fits'.format(rootname))
+
+    assert ingest(archive) == len(file_paths)
+    assert ingest(archive) == 0
+
+    mtime = _touch(flt_file)
+    assert ingest(archive) == 1
+    assert get_fingerprints(rootname)['{}q_flt.fits'.format(rootname)][
+        'mtime'] == mtime
+    assert ingest(archive) == 0
+
+    assert ingest(archive, force=True) == len(file_paths)
+
+
+def test_fingerprints_refresh_copied_files(database, archive, settings):
+    """Files whose checksums have not changed are not read again, but
+    their new modification time is recorded."""
+
+    settings['fingerprint_checksums'] = True
+    rootname = os.path.basename(archive)[:-1]
+    basename = '{}q_flt.fits'.format(rootname)
+    flt_file = os.path.join(archive, basename)
+    with fits.open(flt_file) as hdulist:
+        hdulist.writeto(flt_file, overwrite=True, checksum=True)
+
+    ingest(archive)
+    stored_fingerprint = get_fingerprints(rootname)[basename]
+    assert stored_fingerprint['checksum']
+
+    mtime = _touch(flt_file)
+    assert ingest(archive) == 0
+
+    refreshed_fingerprint = get_fingerprints(rootname)[basename]
+    assert refreshed_fingerprint['mtime'] == mtime
+    assert refreshed_fingerprint['checksum'] == stored_fingerprint['checksum']
+    assert ingest(archive) == 0
+
+
+def test_ingest_resumes_from_journal(database, archive, tmp_path):
+    """Filetypes that the journal records as complete are not read
+    again, and the rootname is complete once the rest are written."""
+
+    rootname = os.path.basename(archive)[:-1]
+    file_paths = _list_files(archive)
+    journal_file = str(tmp_path / 'ingest.journal')
+    journal.create_journal(journal_file, [archive], 'all')
+    journal.mark_started(journal_file, archive)
+    journal.mark_filetypes_complete(journal_file, archive, ['raw', 'spt'])
+
+    assert ingest(archive, journal_file=journal_file) == len(file_paths) - 2
+
+    assert journal.get_unfinished_rootnames(journal_file) == []
+    fingerprints = get_fingerprints(rootname)
+    assert '{}q_flt.fits'.format(rootname) in fingerprints
+    assert '{}q_raw.fits'.format(rootname) not in fingerprints
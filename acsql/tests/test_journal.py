@@ -0,0 +1,103 @@
+"""Tests for the ``acsql.ingest.journal`` module.
+
+Authors
+-------
+    Matthew Bourque
+
+Use
+---
+
+    These tests are intended to be run with ``pytest``, as such:
+    ::
+
+        python -m pytest -q acsql/tests/test_journal.py
+
+Dependencies
+------------
+    External library dependencies include:
+
+    - ``acsql``
+    - ``pytest``
+"""
+
+import pytest
+
+from acsql.ingest import journal
+
+
+ROOTNAME_PATHS = ['/filesystem/jabc/jabc01abq', '/filesystem/jabc/jabc02abq',
+                  '/filesystem/jabc/jabc03abq']
+
+
+@pytest.fixture
+def journal_file(tmp_path):
+    """Create a journal of a run that ingests ``ROOTNAME_PATHS``.
+
+    Returns
+    -------
+    journal_file : str
+        The path to the journal file.
+    """
+
+    journal_file = str(tmp_path / 'ingest.journal')
+    journal.create_journal(journal_file, ROOTNAME_PATHS, 'all',
+                           manifest={'proposals': {}})
+
+    return journal_file
+
+
+def test_load_journal(journal_file):
+    """The rootnames, filetype, and manifest of the run are kept in
+    order."""
+
+    rootname_paths, filetype, manifest = journal.load_journal(journal_file)
+
+    assert rootname_paths == ROOTNAME_PATHS
+    assert filetype == 'all'
+    assert manifest == {'proposals': {}}
+
+
+def test_create_journal_refuses_existing_file(journal_file):
+    """A journal cannot be created over that of another run."""
+
+    with pytest.raises(FileExistsError):
+        journal.create_journal(journal_file, ROOTNAME_PATHS[:1], 'flt')
+
+    assert journal.load_journal(journal_file)[0] == ROOTNAME_PATHS
+
+
+def test_resume_round_trip(journal_file):
+    """Rootnames are unfinished until they are marked complete, and the
+    filetypes that were completed are remembered for the resume."""
+
+    assert journal.get_unfinished_rootnames(journal_file) == ROOTNAME_PATHS
+
+    # The first rootname is ingested completely
+    journal.mark_started(journal_file, ROOTNAME_PATHS[0])
+    journal.mark_complete(journal_file, ROOTNAME_PATHS[0], ['raw', 'flt'])
+
+    # Only some of the filetypes of the second rootname are written
+    journal.mark_started(journal_file, ROOTNAME_PATHS[1])
+    journal.mark_filetypes_complete(journal_file, ROOTNAME_PATHS[1], ['raw'])
+
+    # The third rootname is started, but nothing is written
+    journal.mark_started(journal_file, ROOTNAME_PATHS[2])
+
+    assert journal.get_unfinished_rootnames(journal_file) == \
+        ROOTNAME_PATHS[1:]
+    assert journal.get_completed_filetypes(journal_file,
+                                           ROOTNAME_PATHS[0]) == {'raw', 'flt'}
+    assert journal.get_completed_filetypes(journal_file,
+                                           ROOTNAME_PATHS[1]) == {'raw'}
+    assert journal.get_completed_filetypes(journal_file,
+                                           ROOTNAME_PATHS[2]) == set()
+
+    # Resuming the second rootname does not forget its raw file
+    journal.mark_started(journal_file, ROOTNAME_PATHS[1])
+    assert journal.get_completed_filetypes(journal_file,
+                                           ROOTNAME_PATHS[1]) == {'raw'}
+
+    journal.mark_complete(journal_file, ROOTNAME_PATHS[1], ['flt'])
+    journal.mark_complete(journal_file, ROOTNAME_PATHS[2], ['raw', 'flt'])
+
+    assert journal.get_unfinished_rootnames(journal_file) == []
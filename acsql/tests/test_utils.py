@@ -0,0 +1,186 @@
+"""Tests for the ``acsql.utils.utils`` module.
+
+Authors
+-------
+    Matthew Bourque
+
+Use
+---
+
+    These tests are intended to be run with ``pytest``, as such:
+    ::
+
+        python -m pytest -q acsql/tests/test_utils.py
+
+Dependencies
+------------
+    External library dependencies include:
+
+    - ``acsql``
+    - ``numpy``
+    - ``pytest``
+"""
+
+import datetime
+
+import numpy
+import pytest
+
+from acsql.utils.utils import BulkInsertWriter
+from acsql.utils.utils import get_converter
+from acsql.utils.utils import get_keyword_map
+from acsql.utils.utils import get_table
+
+
+def _master_record(rootname, path=None):
+    """Return a ``Master`` record for the given ``rootname``."""
+
+    today = datetime.date.today()
+    record = {'rootname': rootname,
+              'path': path or '{}/{}'.format(rootname[:4], rootname),
+              'first_ingest_date': today,
+              'last_ingest_date': today,
+              'detector': 'WFC',
+              'proposal_type': 'GO'}
+
+    return record
+
+
+def _fingerprint_record(rootname):
+    """Return a ``Fingerprints`` record for the flt file of the given
+    ``rootname``."""
+
+    record = {'filename': '{}q_flt.fits'.format(rootname),
+              'rootname': rootname,
+              'size': 2880,
+              'mtime': 1.0}
+
+    return record
+
+
+def _select(engine, table):
+    """Return the rows of the given ``table``."""
+
+    with engine.connect() as connection:
+        rows = connection.execute(get_table(table).select()).fetchall()
+
+    return [dict(row) for row in rows]
+
+
+def test_writer_flushes_full_batch(database):
+    """A table's records are written once ``batch_size`` of them have
+    been added."""
+
+    writer = BulkInsertWriter(batch_size=2)
+    writer.add('Master', _master_record('jabc01ab'))
+    assert _select(database, 'Master') == []
+
+    writer.add('Master', _master_record('jabc01ac'))
+    assert len(_select(database, 'Master')) == 2
+    assert writer.records == {}
+    assert writer.pop_failed() == []
+
+
+def test_writer_flushes_master_first(database):
+    """The master table is written before the tables that refer to
+    it."""
+
+    writer = BulkInsertWriter(batch_size=10)
+    writer.add('Fingerprints', _fingerprint_record('jabc01ab'))
+    writer.add('Master', _master_record('jabc01ab'))
+    writer.flush()
+
+    assert len(_select(database, 'Master')) == 1
+    assert len(_select(database, 'Fingerprints')) == 1
+    assert writer.pop_failed() == []
+
+
+def test_writer_updates_existing_records(database):
+    """Records that are already in the database are updated."""
+
+    writer = BulkInsertWriter(batch_size=10)
+    writer.add('Master', _master_record('jabc01ab'))
+    writer.flush()
+    writer.add('Master', _master_record('jabc01ab', path='jabc/moved'))
+    writer.flush()
+
+    rows = _select(database, 'Master')
+    assert [row['path'] for row in rows] == ['jabc/moved']
+
+
+def test_writer_falls_back_to_single_records(database):
+    """If a batch is rejected, its records are written one at a time,
+    and only those that are still rejected are failed."""
+
+    bad_record = _fingerprint_record('jxyz01ab')
+    writer = BulkInsertWriter(batch_size=10)
+    writer.add('Master', _master_record('jabc01ab'))
+    writer.add('Fingerprints', _fingerprint_record('jabc01ab'))
+    writer.add('Fingerprints', bad_record)
+    writer.flush()
+
+    assert [row['rootname'] for row in _select(database, 'Master')] == \
+        ['jabc01ab']
+    assert [row['rootname'] for row in _select(database, 'Fingerprints')] == \
+        ['jabc01ab']
+    assert writer.pop_failed() == [('Fingerprints', bad_record)]
+    assert writer.pop_failed() == []
+
+
+@pytest.mark.parametrize('keyword, column_type, value, expected', [
+    ('SUBARRAY', 'Bool', True, True),
+    ('SUBARRAY', 'Bool', numpy.bool_(False), False),
+    ('SUBARRAY', 'Bool', 'T', True),
+    ('SUBARRAY', 'Bool', ' false ', False),
+    ('SUBARRAY', 'Bool', 1, True),
+    ('NCOMBINE', 'Integer', 3, 3),
+    ('NCOMBINE', 'Integer', ' 3 ', 3),
+    ('NCOMBINE', 'Integer', 3.0, 3),
+    ('NCOMBINE', 'Integer', numpy.int16(3), 3),
+    ('EXPTIME', 'Float', 1.5, 1.5),
+    ('EXPTIME', 'Float', '1.5', 1.5),
+    ('EXPTIME', 'Float', 2, 2.0),
+    ('TARGNAME', 'String', 'NGC104', 'NGC104'),
+    ('TARGNAME', 'String', 12, '12'),
+    ('TARGNAME', 'String', 'X' * 60, 'X' * 50),
+    ('PROPTTL1', 'String', 'X' * 60, 'X' * 60),
+    ('FW2ERROR', 'Bool', True, '1'),
+    ('FW2ERROR', 'Bool', 'F', '0'),
+    ('FW1ERROR', 'Bool', 'T', True),
+    ('DATE-OBS', 'Date', '2017-01-01', '2017-01-01')])
+def test_converters(keyword, column_type, value, expected):
+    """Header values are converted to the type of their column."""
+
+    result = get_converter(keyword, column_type)(value)
+
+    assert result == expected
+    assert type(result) is type(expected)
+
+
+@pytest.mark.parametrize('column_type, value', [
+    ('Bool', 'maybe'),
+    ('Bool', 2),
+    ('Integer', 1.5),
+    ('Integer', 'three'),
+    ('Integer', 2**31),
+    ('Float', 'nan'),
+    ('Float', float('inf')),
+    ('Float', 'fast')])
+def test_converters_reject_bad_values(column_type, value):
+    """Header values that do not fit their column are rejected."""
+
+    with pytest.raises(ValueError):
+        get_converter('KEYWORD', column_type)(value)
+
+
+def test_keyword_map():
+    """Header keywords, with either hyphens or underscores, are mapped
+    to their column and converter."""
+
+    keyword_map = get_keyword_map('WFC_raw_0')
+
+    assert keyword_map['DATE-OBS'] == keyword_map['DATE_OBS']
+    column, converter = keyword_map['EXPTIME']
+    assert column == 'exptime'
+    assert converter('10') == 10.0
+    assert get_keyword_map('wfc_raw_0') is keyword_map
@@ -0,0 +1,253 @@
+"""Time the stages of the ingestion process and report on them.
+
+Each stage of the ingestion (e.g. reading the headers of a file, or
+writing the records of a rootname to the database) is timed with the
+``timed()`` context manager.  Rather than every duration, only
+running aggregates are kept for each stage (the number of calls, the
+total and maximum time, and a histogram over ``HISTOGRAM_EDGES``), so
+that the memory used does not grow with the number of files ingested.
+The timings are collected per process and can be gathered with
+``collect_timings()`` and combined across processes with
+``merge_timings()``.  ``report_timings()`` then logs a summary of each
+stage (number of calls, total and mean time, percentiles estimated
+from the histogram, and the histogram itself), and optionally writes
+it to a JSON file.
+
+Authors
+-------
+    Matthew Bourque
+
+Use
+---
+    This module is intended to be imported from and used by various
+    ``acsql`` modules and scripts as such:
+    ::
+
+        from acsql.utils.timing import collect_timings
+        from acsql.utils.timing import merge_timings
+        from acsql.utils.timing import report_timings
+        from acsql.utils.timing import timed
+
+        with timed('jpeg'):
+            make_jpeg(file_dict)
+
+        timings = merge_timings(timings, collect_timings())
+        report_timings(timings, 'timings.json')
+"""
+
+import bisect
+from contextlib import contextmanager
+import json
+import logging
+import time
+
+# The upper edges (in seconds) of the bins of the timing histograms
+HISTOGRAM_EDGES = [0.001, 0.01, 0.1, 1, 10, 100, float('inf')]
+HISTOGRAM_LABELS = ['<1ms', '1-10ms', '10-100ms', '0.1-1s', '1-10s',
+                    '10-100s', '>100s']
+
+# The aggregated durations of each stage timed by this process
+_TIMINGS = {}
+
+
+def _new_stats():
+    """Return the aggregates of a stage that has not been timed yet.
+
+    Returns
+    -------
+    stats : dict
+        A dictionary holding the ``count`` of calls, the ``total`` and
+        ``max`` durations in seconds, and the ``bins`` of the
+        histogram of the durations over ``HISTOGRAM_EDGES``.
+    """
+
+    return {'count': 0, 'total': 0., 'max': 0.,
+            'bins': [0] * len(HISTOGRAM_EDGES)}
+
+
+@contextmanager
+def timed(stage):
+    """Time the enclosed block of code as the given ``stage``.
+
+    Parameters
+    ----------
+    stage : str
+        The name of the stage (e.g. ``jpeg``).
+    """
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        stats = _TIMINGS.get(stage)
+        if stats is None:
+            stats = _TIMINGS[stage] = _new_stats()
+        stats['count'] += 1
+        stats['total'] += duration
+        stats['max'] = max(stats['max'], duration)
+        index = bisect.bisect_right(HISTOGRAM_EDGES, duration)
+        stats['bins'][min(index, len(HISTOGRAM_EDGES) - 1)] += 1
+
+
+def collect_timings():
+    """Return the timings recorded by this process so far, and start
+    recording anew.
+
+    Returns
+    -------
+    timings : dict
+        A dictionary whose keys are stages and whose values are the
+        aggregated durations of the stage (see ``_new_stats()``).
+    """
+
+    timings = dict(_TIMINGS)
+    _TIMINGS.clear()
+
+    return timings
+
+
+def merge_timings(timings, new_timings):
+    """Add the given ``new_timings`` to the given ``timings``.
+
+    Parameters
+    ----------
+    timings : dict
+        The timings to add to.  They are modified in place.
+    new_timings : dict
+        The timings to add, e.g. as returned by ``collect_timings()``
+        in another process.
+
+    Returns
+    -------
+    timings : dict
+        The combined timings.
+    """
+
+    for stage, new_stats in new_timings.items():
+        stats = timings.setdefault(stage, _new_stats())
+        stats['count'] += new_stats['count']
+        stats['total'] += new_stats['total']
+        stats['max'] = max(stats['max'], new_stats['max'])
+        stats['bins'] = [count + new_count for count, new_count
+                         in zip(stats['bins'], new_stats['bins'])]
+
+    return timings
+
+
+def estimate_percentile(stats, percentile):
+    """Return an estimate of the given ``percentile`` of the durations
+    of a stage, from the histogram of its durations.
+
+    The estimate is interpolated within the histogram bin that holds
+    the percentile, on a logarithmic scale since the bins are one
+    decade wide, so it is only as precise as the bins allow.
+
+    Parameters
+    ----------
+    stats : dict
+        The aggregated durations of the stage (see ``_new_stats()``).
+    percentile : float
+        The percentile to estimate (e.g. ``90``).
+
+    Returns
+    -------
+    duration : float
+        The estimated duration in seconds.
+    """
+
+    rank = stats['count'] * percentile / 100.
+    cumulative = 0
+    for index, count in enumerate(stats['bins']):
+        if count and cumulative + count >= rank:
+            lower = HISTOGRAM_EDGES[index - 1] if index else 0.
+            upper = min(HISTOGRAM_EDGES[index], stats['max'])
+            lower = min(lower, upper)
+            fraction = (rank - cumulative) / count
+            if lower:
+                return lower * (upper / lower) ** fraction
+            return upper * fraction
+        cumulative += count
+
+    return stats['max']
+
+
+def summarize_timings(timings):
+    """Return summary statistics of the given ``timings``.
+
+    Parameters
+    ----------
+    timings : dict
+        A dictionary whose keys are stages and whose values are the
+        aggregated durations of the stage (see ``_new_stats()``).
+
+    Returns
+    -------
+    summary : dict
+        A dictionary whose keys are stages and whose values are
+        dictionaries holding the ``count``, ``total``, ``mean``,
+        ``p50``, ``p90``, ``p99`` (estimated, see
+        ``estimate_percentile()``), and ``max`` durations in seconds,
+        and the ``histogram`` of the durations.
+    """
+
+    summary = {}
+    for stage, stats in timings.items():
+        if not stats['count']:
+            continue
+        summary[stage] = {
+            'count': stats['count'],
+            'total': stats['total'],
+            'mean': stats['total'] / stats['count'],
+            'p50': estimate_percentile(stats, 50),
+            'p90': estimate_percentile(stats, 90),
+            'p99': estimate_percentile(stats, 99),
+            'max': stats['max'],
+            'histogram': dict(zip(HISTOGRAM_LABELS, stats['bins']))}
+
+    return summary
+
+
+def report_timings(timings, timing_file=None):
+    """Log a summary of the given ``timings``, and optionally write it
+    to a JSON file.
+
+    Parameters
+    ----------
+    timings : dict
+        A dictionary whose keys are stages and whose values are the
+        aggregated durations of the stage (see ``_new_stats()``).
+    timing_file : str, optional
+        The path to a JSON file to write the summary to.
+
+    Returns
+    -------
+    summary : dict
+        The summary, as returned by ``summarize_timings()``.
+    """
+
+    summary = summarize_timings(timings)
+
+    # List the stages that took the most time first
+    stages = sorted(summary, key=lambda stage: summary[stage]['total'],
+                    reverse=True)
+
+    logging.info('Timing summary:')
+    logging.info('{:<16}{:>9}{:>12}{:>10}{:>10}{:>10}{:>10}'.format(
+        'stage', 'count', 'total (s)', 'mean', 'p50', 'p90', 'max'))
+    for stage in stages:
+        stats = summary[stage]
+        logging.info('{:<16}{:>9}{:>12.1f}{:>10.4f}{:>10.4f}{:>10.4f}'
+                     '{:>10.4f}'.format(stage, stats['count'], stats['total'],
+                                        stats['mean'], stats['p50'],
+                                        stats['p90'], stats['max']))
+        logging.info('    {}'.format(', '.join(
+            ['{}: {}'.format(label, count)
+             for label, count in stats['histogram'].items() if count])))
+
+    if timing_file:
+        with open(timing_file, 'w') as f:
+            json.dump(summary, f, indent=4)
+        logging.info('Wrote timing summary to {}'.format(timing_file))
+
+    return summary
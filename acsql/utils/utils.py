@@ -13,9 +13,14 @@ Use
     various acsql modules and scripts, as such:
     ::
 
+        from acsql.utils.utils import BulkInsertWriter
+        from acsql.utils.utils import get_keyword_map
+        from acsql.utils.utils import get_table
         from acsql.utils.utils import insert_or_update
+        from acsql.utils.utils import ProgressReport
         from acsql.utils.utils import SETTINGS
         from acsql.utils.utils import setup_logging
+        from acsql.utils.utils import upsert
 
     There also exists static importable data:
     ::
@@ -34,23 +39,38 @@ Dependencies
 """
 
 import datetime
+from functools import partial
 import getpass
-import glob
 import logging
+import math
 import os
 import socket
 import sys
+import time
+from types import MappingProxyType
 import yaml
 
 import astropy
 import numpy
 import sqlalchemy
-from sqlalchemy import Table
+from sqlalchemy import and_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.exc import DataError
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.exc import InternalError
+try:
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+except ImportError:
+    sqlite_insert = None
 
 import acsql
+from acsql.database.schema import load_table_definitions
+
+# The default number of rows to buffer per table before writing
+DEFAULT_BATCH_SIZE = 500
+
+# The default number of seconds between progress reports
+DEFAULT_PROGRESS_INTERVAL = 60
 
 __config__ = os.path.realpath(os.path.join(os.getcwd(),
                                            os.path.dirname(__file__)))
@@ -96,6 +116,20 @@ VALID_PROPOSAL_TYPES = ['CAL/ACS', 'CAL/OTA', 'CAL/STIS', 'CAL/WFC3',
                         'SM4/COS', 'SM4/ERO', 'SNAP']
 
 
+# Header keywords that are not ingested into the header tables
+EXCLUDED_KEYWORDS = frozenset(['HISTORY', 'COMMENT', 'ROOTNAME', 'FILENAME',
+                               ''])
+
+# The lengths of the String columns of the header tables
+DEFAULT_STRING_LENGTH = 50
+SPECIAL_STRING_LENGTHS = {'RULEFILE': 500, 'PROPTTL1': 500, 'TARDESCR': 500,
+                          'QUALCOM2': 500, 'FWERROR': 100, 'FW2ERROR': 100}
+
+# The range of the Integer columns of the header tables
+MIN_INTEGER = -2**31
+MAX_INTEGER = 2**31 - 1
+
+
 def get_settings():
     """Returns the settings that are located in the acsql config file.
 
@@ -106,7 +140,7 @@ def get_settings():
     """
 
     with open(os.path.join(__config__, 'config.yaml'), 'r') as f:
-        settings = yaml.load(f)
+        settings = yaml.safe_load(f)
 
     return settings
 
@@ -151,10 +185,256 @@ def setup_logging(module):
     logging.info('SQLAlchemy Path: {0}'.format(sqlalchemy.__path__[0]))
 
 
-def get_table_defs():
+def convert_bool(value):
+    """Convert the given header value for a ``Bool`` column.
+
+    Parameters
+    ----------
+    value : obj
+        The header value (e.g. ``True`` or ``'T'``).
+
+    Returns
+    -------
+    result : bool
+        The converted value.
+
+    Raises
+    ------
+    ValueError
+        If the value cannot be converted.
+    """
+
+    if isinstance(value, (bool, numpy.bool_)):
+        return bool(value)
+    if isinstance(value, str) and value.strip().upper() in ['T', 'TRUE']:
+        return True
+    if isinstance(value, str) and value.strip().upper() in ['F', 'FALSE']:
+        return False
+    if isinstance(value, (int, numpy.integer)) and value in [0, 1]:
+        return bool(value)
+
+    raise ValueError('not a boolean')
+
+
+def convert_integer(value):
+    """Convert the given header value for an ``Integer`` column.
+
+    Parameters
+    ----------
+    value : obj
+        The header value (e.g. ``3`` or ``'3'``).
+
+    Returns
+    -------
+    result : int
+        The converted value.
+
+    Raises
+    ------
+    ValueError
+        If the value cannot be converted, or is out of range.
+    """
+
+    if isinstance(value, (float, numpy.floating)):
+        if not float(value).is_integer():
+            raise ValueError('not an integer')
+        result = int(value)
+    elif isinstance(value, str):
+        result = int(value.strip())
+    else:
+        result = int(value)
+
+    if not MIN_INTEGER <= result <= MAX_INTEGER:
+        raise ValueError('out of range')
+
+    return result
+
+
+def convert_float(value):
+    """Convert the given header value for a ``Float`` column.
+
+    Parameters
+    ----------
+    value : obj
+        The header value (e.g. ``1.5`` or ``'1.5'``).
+
+    Returns
+    -------
+    result : float
+        The converted value.
+
+    Raises
+    ------
+    ValueError
+        If the value cannot be converted, or is not finite.
+    """
+
+    if isinstance(value, str):
+        value = value.strip()
+    result = float(value)
+
+    if not math.isfinite(result):
+        raise ValueError('not finite')
+
+    return result
+
+
+def convert_string(value, length=DEFAULT_STRING_LENGTH):
+    """Convert the given header value for a ``String`` column.
+
+    Values that are longer than the column are truncated, and a
+    warning is logged.
+
+    Parameters
+    ----------
+    value : obj
+        The header value.
+    length : int, optional
+        The length of the column.
+
+    Returns
+    -------
+    result : str
+        The converted value.
+    """
+
+    result = str(value)
+    if len(result) > length:
+        logging.warning('\tTruncating {!r} to {} characters'.format(
+            result, length))
+        result = result[:length]
+
+    return result
+
+
+def convert_special(value, converter, length):
+    """Convert the given header value for the ``String`` column of one
+    of the ``SPECIAL_STRING_LENGTHS`` keywords, whose declared type is
+    not ``String``.
+
+    The value is first converted by its declared type.  ``Bool`` values
+    are stored as ``'1'`` and ``'0'``, as they have always been stored
+    in these columns.
+
+    Parameters
+    ----------
+    value : obj
+        The header value.
+    converter : obj
+        The converter of the declared type of the keyword (e.g.
+        ``convert_bool``).
+    length : int
+        The length of the column.
+
+    Returns
+    -------
+    result : str
+        The converted value.
+    """
+
+    result = converter(value)
+    if isinstance(result, bool):
+        result = int(result)
+
+    return convert_string(result, length)
+
+
+def convert_unknown(value):
+    """Return the given header value unchanged, for column types that
+    have no converter.
+
+    Parameters
+    ----------
+    value : obj
+        The header value.
+
+    Returns
+    -------
+    value : obj
+        The header value.
+    """
+
+    return value
+
+
+CONVERTERS = {'Bool': convert_bool,
+              'Integer': convert_integer,
+              'Float': convert_float,
+              'String': convert_string}
+
+
+def get_converter(keyword, column_type):
+    """Return the function that converts header values of the given
+    ``keyword`` to values of its column.
+
+    Parameters
+    ----------
+    keyword : str
+        The header keyword (e.g. ``EXPTIME``).
+    column_type : str
+        The type of the column, as given in the table_definition files
+        (e.g. ``Float``).
+
+    Returns
+    -------
+    converter : obj
+        The function that takes a header value and returns the
+        converted value, or raises a ``ValueError`` or ``TypeError``
+        if the value cannot be converted.
+    """
+
+    converter = CONVERTERS.get(column_type, convert_unknown)
+
+    # The special keywords have longer String columns, whatever their
+    # declared type
+    if keyword in SPECIAL_STRING_LENGTHS:
+        length = SPECIAL_STRING_LENGTHS[keyword]
+        if column_type == 'String':
+            converter = partial(convert_string, length=length)
+        else:
+            converter = partial(convert_special, converter=converter,
+                                length=length)
+
+    return converter
+
+
+def read_table_definitions():
+    """Return the keywords and types of each database table, as taken
+    from the table_definition text files.
+
+    The definitions are loaded once per process by
+    ``acsql.database.schema``, through the schema cache file set by the
+    ``schema_cache`` config file setting (by default
+    ``schema_cache.pickle`` in the ``log_dir``).
+
+    Returns
+    -------
+    table_definitions : dict
+        A dictionary whose keys are detector/file_type/extension
+        configurations (e.g. 'wfc_flt_0') and whose values are lists
+        of ``(keyword, type)`` pairs (e.g. ``('EXPTIME', 'Float')``)
+        for the corresponding table.
+    """
+
+    cache_file = SETTINGS.get('schema_cache')
+    if not cache_file and SETTINGS.get('log_dir'):
+        cache_file = os.path.join(SETTINGS['log_dir'], 'schema_cache.pickle')
+
+    table_definitions = load_table_definitions(cache_file)
+
+    return table_definitions
+
+
+def get_table_defs(table_definitions=None):
     """Return a dictionary containing the columns for each database
     table, as taken from the table_definition text files.
 
+    Parameters
+    ----------
+    table_definitions : dict, optional
+        The table definitions, as returned by
+        ``read_table_definitions()``.  If not provided, they are read.
+
     Returns
     -------
     table_defs : dict
@@ -163,26 +443,341 @@ def get_table_defs():
         of column names for the corresponding table.
     """
 
-    # Get table definition files
-    table_def_directory = os.path.realpath(os.path.join(os.getcwd(),
-                                           os.path.dirname(__file__)))
-    table_def_directory = table_def_directory.replace('utils', 'database/table_definitions/')
-    table_def_files = glob.glob(os.path.join(table_def_directory, '*.txt'))
+    if table_definitions is None:
+        table_definitions = read_table_definitions()
 
     table_defs = {}
+    for configuration, keywords in table_definitions.items():
+        table_defs[configuration] = [item[0] for item in keywords]
 
-    for table_def_file in table_def_files:
+    return table_defs
 
-        configuration = os.path.basename(table_def_file).split('.txt')[0]
-        with open(table_def_file, 'r') as f:
-            contents = f.readlines()
-        contents = [item.strip() for item in contents]
-        columns = [item.split(',')[0] for item in contents]
-        table_defs[configuration] = columns
 
-    return table_defs
+def get_keyword_map(table):
+    """Return a lookup of header keyword to database column for the
+    given header table.
 
-TABLE_DEFS = get_table_defs()
+    The lookup maps the header keyword as it appears in a FITS header
+    (e.g. ``DATE-OBS``) to the name of its column (e.g. ``date_obs``)
+    and the function that converts header values to the type of the
+    column (see ``get_converter()``), so that each header card can be
+    matched to its column with a single dictionary lookup.  Keywords in
+    ``EXCLUDED_KEYWORDS`` are left out.  Each lookup is built the first
+    time it is needed, and kept for the rest of the process.
+
+    Parameters
+    ----------
+    table : str
+        The detector/file_type/extension configuration of the table
+        (e.g. 'wfc_flt_0').
+
+    Returns
+    -------
+    keyword_map : obj
+        A read-only dictionary that maps header keywords to
+        ``(column, converter)`` pairs.
+
+    Raises
+    ------
+    KeyError
+        If ``table`` is not the configuration of a header table.
+    """
+
+    table = table.lower()
+
+    if table not in _KEYWORD_MAPS:
+        keyword_map = {}
+        for keyword, column_type in read_table_definitions()[table]:
+            if keyword in EXCLUDED_KEYWORDS:
+                continue
+            entry = (keyword.lower(), get_converter(keyword, column_type))
+
+            # Hyphens in header keywords are underscores in the columns
+            keyword_map[keyword.replace('_', '-')] = entry
+            keyword_map[keyword] = entry
+
+        _KEYWORD_MAPS[table] = MappingProxyType(keyword_map)
+
+    return _KEYWORD_MAPS[table]
+
+
+_KEYWORD_MAPS = {}
+_TABLE_DEFS = None
+
+
+def __getattr__(name):
+    """Return ``TABLE_DEFS`` (see ``get_table_defs()``), which is built
+    the first time it is imported rather than when this module is
+    imported.
+
+    Parameters
+    ----------
+    name : str
+        The name of the attribute.
+
+    Returns
+    -------
+    attribute : obj
+        The ``TABLE_DEFS`` dictionary.
+
+    Raises
+    ------
+    AttributeError
+        If ``name`` is not ``TABLE_DEFS``.
+    """
+
+    global _TABLE_DEFS
+
+    if name == 'TABLE_DEFS':
+        if _TABLE_DEFS is None:
+            _TABLE_DEFS = get_table_defs()
+        return _TABLE_DEFS
+
+    raise AttributeError('module {} has no attribute {}'.format(
+        __name__, name))
+
+
+class BulkInsertWriter(object):
+    """Buffers records for the header tables and writes them to the
+    database in batches.
+
+    Records are collected per table and written with a single
+    multi-row ``executemany`` upsert (see ``upsert()``) per table once
+    ``batch_size`` records have been collected for a table, or when
+    ``flush()`` is called.  ``flush()`` writes all of the tables within
+    a single transaction.  If a batch cannot be written, its records
+    are written one at a time with ``insert_or_update`` so that a
+    single bad record does not lose the others.  Records that cannot be
+    written at all are collected in ``failed``, so that callers can
+    tell which rootnames were only partly written (see
+    ``pop_failed()``).
+
+    The ``master`` table is always written before the other tables, so
+    that the records of the other tables can refer to it.
+
+    Callers must call ``flush()`` once they are done adding records.
+
+    Parameters
+    ----------
+    batch_size : int, optional
+        The number of records to buffer per table before writing.  If
+        not provided, the ``batch_size`` setting of the config file is
+        used (or ``DEFAULT_BATCH_SIZE`` if it is not set).
+    """
+
+    def __init__(self, batch_size=None):
+
+        if batch_size is None:
+            batch_size = SETTINGS.get('batch_size', DEFAULT_BATCH_SIZE)
+        self.batch_size = batch_size
+        self.records = {}
+        self.failed = []
+
+    def add(self, table, data_dict):
+        """Buffer a record for the given ``table``, writing the
+        table's buffer if it is full.
+
+        Parameters
+        ----------
+        table : str
+            The name of the table to insert into (e.g. ``WFC_raw_0``).
+        data_dict : dict
+            A dictionary containing the data to insert.
+        """
+
+        self.records.setdefault(table, []).append(data_dict)
+        if len(self.records[table]) >= self.batch_size:
+            self.flush(table)
+
+    def flush(self, table=None):
+        """Write the buffered records to the database, within a single
+        transaction.
+
+        Parameters
+        ----------
+        table : str, optional
+            The name of the table to write.  If not provided, the
+            buffers of all tables are written.
+        """
+
+        if table is None:
+            tables = list(self.records)
+        else:
+            tables = [table]
+
+        # Other tables refer to the master table, so write it first
+        if 'Master' in self.records:
+            tables = ['Master'] + [item for item in tables if item != 'Master']
+
+        batches = []
+        for table in tables:
+            records = self.records.pop(table, [])
+            if records:
+                batches.append((table, records))
+
+        if batches:
+            self._write(batches)
+
+    def pop_failed(self):
+        """Return the records that could not be written, and forget
+        about them.
+
+        Returns
+        -------
+        failed : list
+            A list of ``(table, data_dict)`` pairs of the records that
+            could not be written since the previous call.
+        """
+
+        failed = self.failed
+        self.failed = []
+
+        return failed
+
+    def _write(self, batches):
+        """Write the given ``batches`` of records within a single
+        transaction.
+
+        If the transaction fails because of the data, the records are
+        written one at a time instead, and those that still fail are
+        added to ``failed``.  If it fails for any other reason (e.g. a
+        lost connection), all of the records are added to ``failed``
+        and the exception is raised.
+
+        Parameters
+        ----------
+        batches : list
+            A list of ``(table, records)`` pairs, where ``table`` is the
+            name of the table to insert into and ``records`` is a list
+            of dictionaries containing the data to insert.
+        """
+
+        engine = acsql.database.database_interface.get_engine()
+
+        try:
+            try:
+                with engine.begin() as connection:
+                    for table, records in batches:
+                        upsert(connection, get_table(table), records)
+                for table, records in batches:
+                    logging.info('Wrote {} records to {} table.'.format(
+                        len(records), table))
+            except (DataError, IntegrityError, InternalError) as e:
+                logging.warning('\tUnable to bulk insert into {}, retrying '
+                                'individually: {}'.format(
+                                    ', '.join([item[0] for item in batches]),
+                                    e))
+                failed = []
+                for table, records in batches:
+                    failed.extend([(table, record) for record in records
+                                   if not insert_or_update(table, record)])
+                self.failed.extend(failed)
+        except Exception:
+            # Some of the records may not have been written
+            for table, records in batches:
+                self.failed.extend([(table, record) for record in records])
+            raise
+
+
+class ProgressReport(object):
+    """Logs the progress, throughput, and estimated time remaining of
+    a long-running task that processes a known number of rootnames.
+
+    A report is logged at most every ``interval`` seconds as rootnames
+    are completed, and once more by ``finish()``.
+
+    Parameters
+    ----------
+    total : int
+        The total number of rootnames to process.
+    interval : float, optional
+        The minimum number of seconds between reports.  If not
+        provided, the ``progress_interval`` setting of the config file
+        is used (or ``DEFAULT_PROGRESS_INTERVAL`` if it is not set).
+    """
+
+    def __init__(self, total, interval=None):
+
+        if interval is None:
+            interval = SETTINGS.get('progress_interval',
+                                    DEFAULT_PROGRESS_INTERVAL)
+        self.total = total
+        self.interval = interval
+        self.num_rootnames = 0
+        self.num_files = 0
+        self.start_time = time.time()
+        self.last_report = self.start_time
+
+    def update(self, num_files=0):
+        """Record that a rootname has been completed, and log a report if
+        ``interval`` seconds have passed since the previous one.
+
+        Parameters
+        ----------
+        num_files : int, optional
+            The number of files that were processed for the rootname.
+        """
+
+        self.num_rootnames += 1
+        self.num_files += num_files
+
+        now = time.time()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def report(self):
+        """Log the number of rootnames completed, the rate of rootnames
+        and files per second, and the estimated time remaining."""
+
+        elapsed = max(time.time() - self.start_time, 1e-6)
+        rootname_rate = self.num_rootnames / elapsed
+        file_rate = self.num_files / elapsed
+
+        if rootname_rate:
+            eta = (self.total - self.num_rootnames) / rootname_rate
+            eta = str(datetime.timedelta(seconds=int(eta)))
+        else:
+            eta = 'unknown'
+
+        logging.info('Progress: {}/{} rootnames ({:.1f}%), {:.2f} rootnames/s, '
+                     '{:.2f} files/s, ETA {}'.format(
+                         self.num_rootnames, self.total,
+                         100. * self.num_rootnames / max(self.total, 1),
+                         rootname_rate, file_rate, eta))
+
+    def finish(self):
+        """Log a final report."""
+
+        self.report()
+        logging.info('Processed {} rootnames ({} files) in {}'.format(
+            self.num_rootnames, self.num_files,
+            datetime.timedelta(seconds=int(time.time() - self.start_time))))
+
+
+def get_table(table):
+    """Return the ``sqlalchemy`` ``Table`` object of the given
+    ``table``.
+
+    The ``Table`` is taken from the ORM of ``database_interface``,
+    which already holds the full column definitions, so that no schema
+    reflection queries are needed to write to the table.
+
+    Parameters
+    ----------
+    table : str
+        The name of the ORM of the table (e.g. ``WFC_raw_0`` or
+        ``Master``).
+
+    Returns
+    -------
+    table_obj : obj
+        The ``sqlalchemy`` ``Table`` object of the table.
+    """
+
+    table_obj = getattr(acsql.database.database_interface, table).__table__
+
+    return table_obj
 
 
 def insert_or_update(table, data_dict):
@@ -191,7 +786,8 @@ def insert_or_update(table, data_dict):
 
     A record is inserted if the primary key of the record does not
     already exist in the ``table``.  A record is updated if it does
-    already exist.
+    already exist.  Both cases are handled by a single statement (see
+    ``upsert()``).
 
     Parameters
     ----------
@@ -199,30 +795,82 @@ def insert_or_update(table, data_dict):
         The name of the table to insert/update into.
     data_dict : dict
         A dictionary containing the data to insert/update.
+
+    Returns
+    -------
+    success : bool
+        ``True`` if the record was written, ``False`` if it could not
+        be.
     """
 
-    table_obj = getattr(acsql.database.database_interface, table)
-    session, base, engine = acsql.database.database_interface.\
-        load_connection(SETTINGS['connection_string'])
+    engine = acsql.database.database_interface.get_engine()
+    tab = get_table(table)
 
-    # Check to see if a record exists for the rootname
-    query = session.query(table_obj)\
-        .filter(getattr(table_obj, 'rootname') == data_dict['rootname'])
-    query_count = query.count()
+    try:
+        with engine.begin() as connection:
+            upsert(connection, tab, [data_dict])
+    except (DataError, IntegrityError, InternalError) as e:
+        logging.warning('\tUnable to insert {} into {}: {}'.format(
+                        data_dict['rootname'], table, e))
+        return False
 
-    # If there are no results, then perform an insert
-    if not query_count:
-        tab = Table(table.lower(), base.metadata, autoload=True)
-        insert_obj = tab.insert()
-        try:
-            insert_obj.execute(data_dict)
-        except (DataError, IntegrityError, InternalError) as e:
-            logging.warning('\tUnable to insert {} into {}: {}'.format(
-                            data_dict['rootname'], table, e))
+    return True
 
-    else:
-        query.update(data_dict)
 
-    session.commit()
-    session.close()
-    engine.dispose()
+def upsert(connection, table_obj, records):
+    """Insert or update the given ``records`` in the given
+    ``table_obj`` using the native upsert of the database dialect.
+
+    For ``MySQL``, ``INSERT ... ON DUPLICATE KEY UPDATE`` is used, and
+    for ``SQLite``, ``INSERT ... ON CONFLICT DO UPDATE`` is used (when
+    supported by the installed ``sqlalchemy``), so that each record
+    costs a single statement and concurrent writers of the same
+    rootname cannot race each other.  Only the columns that are present
+    in a record are updated.  Other dialects fall back to an
+    ``UPDATE`` followed by an ``INSERT`` if no record was updated.
+
+    Records that share the same columns are written together with a
+    single ``executemany``.
+
+    Parameters
+    ----------
+    connection : obj
+        The ``sqlalchemy`` ``Connection`` to write with.  The caller is
+        responsible for committing the transaction.
+    table_obj : obj
+        The ``sqlalchemy`` ``Table`` object to write to.
+    records : list
+        A list of dictionaries containing the data to insert/update.
+    """
+
+    dialect = connection.dialect.name
+    primary_keys = [column.key for column in table_obj.primary_key.columns]
+
+    # executemany requires each statement to share the same columns
+    groups = {}
+    for record in records:
+        groups.setdefault(tuple(sorted(record)), []).append(record)
+
+    for columns, group in groups.items():
+        update_columns = [col for col in columns if col not in primary_keys]
+
+        if dialect == 'mysql' and update_columns:
+            statement = mysql_insert(table_obj)
+            statement = statement.on_duplicate_key_update(
+                {col: statement.inserted[col] for col in update_columns})
+            connection.execute(statement, group)
+
+        elif dialect == 'sqlite' and sqlite_insert and update_columns:
+            statement = sqlite_insert(table_obj)
+            statement = statement.on_conflict_do_update(
+                index_elements=primary_keys,
+                set_={col: statement.excluded[col] for col in update_columns})
+            connection.execute(statement, group)
+
+        else:
+            for record in group:
+                where = [table_obj.c[key] == record[key] for key in primary_keys]
+                result = connection.execute(
+                    table_obj.update().where(and_(*where)).values(record))
+                if not result.rowcount:
+                    connection.execute(table_obj.insert(), record)
@@ -291,6 +291,14 @@ def get_view_image_dict(proposal, filename, fits_type='flt'):
     else:
         image_dict['image'] = None
 
+    # Determine path to the tile pyramid, if one was made
+    tiles_path = '/static/img/jpegs/{}/tiles/{}_{}.dzi'.format(image_dict['proposal_id'], image_dict['filename'], fits_type)
+    tiles_path_abs = os.path.join(SETTINGS['jpeg_dir'], image_dict['proposal_id'], 'tiles', '{}_{}.dzi'.format(image_dict['filename'], fits_type))
+    if image_dict['image'] and os.path.exists(tiles_path_abs):
+        image_dict['tiles'] = tiles_path
+    else:
+        image_dict['tiles'] = None
+
     # Determine next and previous images, if possible
     if not image_dict['last']:
         image_dict['next'] = {'proposal': image_dict['proposal_id'], 'filename': image_dict['filenames'][image_dict['index'] + 1], 'fits_type': fits_type}
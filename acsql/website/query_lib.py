@@ -31,16 +31,14 @@ Dependencies
     - ``sqlalchemy``
 """
 
-from sqlalchemy import create_engine
 from sqlalchemy import literal_column
 from sqlalchemy import or_
-from sqlalchemy.orm import sessionmaker
 
+from acsql.database.database_interface import get_session
 from acsql.database.database_interface import Master
 from acsql.database.database_interface import WFC_raw_0
 from acsql.database.database_interface import HRC_raw_0
 from acsql.database.database_interface import SBC_raw_0
-from acsql.utils.utils import SETTINGS
 
 
 def _apply_query_filter(table, key, values, query):
@@ -141,12 +139,12 @@ def _build_queries(output_columns):
                 and not hasattr(HRC_raw_0, col)]
 
     # Combine columns amongst tables
-    master_wfc = master_cols + wfc_cols + [literal_column('"--"').label(col) for col in hrc_only] + \
-                 [literal_column('"--"').label(col) for col in sbc_only]
-    master_hrc = master_cols + hrc_cols + [literal_column('"--"').label(col) for col in wfc_only] + \
-                 [literal_column('"--"').label(col) for col in sbc_only]
-    master_sbc = master_cols + sbc_cols + [literal_column('"--"').label(col) for col in wfc_only] + \
-                 [literal_column('"--"').label(col) for col in hrc_only]
+    master_wfc = master_cols + wfc_cols + [literal_column("'--'").label(col) for col in hrc_only] + \
+                 [literal_column("'--'").label(col) for col in sbc_only]
+    master_hrc = master_cols + hrc_cols + [literal_column("'--'").label(col) for col in wfc_only] + \
+                 [literal_column("'--'").label(col) for col in sbc_only]
+    master_sbc = master_cols + sbc_cols + [literal_column("'--'").label(col) for col in wfc_only] + \
+                 [literal_column("'--'").label(col) for col in hrc_only]
 
     if len(master_cols) == 0:
 
@@ -327,9 +325,7 @@ def _get_session():
         connection to the ``acsql`` database.
     """
 
-    engine = create_engine(SETTINGS['connection_string'], echo=False, pool_timeout=100000)
-    Session = sessionmaker(bind=engine)
-    session = Session()
+    session = get_session()
 
     return session
 